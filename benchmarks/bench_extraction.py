@@ -0,0 +1,245 @@
+"""Runs end-to-end extractions against a local Zendesk API simulator.
+
+Each scenario starts a `ZendeskSimulator`, runs the real extraction engine
+against it in a fresh process and working directory, and reports:
+
+*   tickets per second over the whole run,
+*   HTTP requests per ticket, and how many of them were rate limited,
+*   the peak resident memory of the extraction process,
+*   the time spent in each stage, summed over all workers, and per call.
+
+Scenarios:
+
+*   `cold`: a first run over every ticket.
+*   `incremental`: a run after a few tickets changed since a backfill. The
+    backfill is not measured.
+*   `outliers`: a first run where a few tickets have thousands of comments,
+    which take many pages each.
+
+The output settings are read from the environment as usual, so
+`ZENDESK_OUTPUT_MODE=shards python -m benchmarks.bench_extraction` measures
+sharded output, and `ZENDESK_PROCESS_WORKERS=4` moves saving tickets to worker
+processes. Stages that run in worker processes are not timed.
+
+Usage:
+    python -m benchmarks.bench_extraction [--scenario NAME ...] [--engine sync|async] [--workers N]
+        [--tickets N] [--latency MS] [--rate-limit N] [--rate-window SECONDS] [--json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Optional
+from unittest.mock import patch
+from benchmarks.zendesk_simulator import ZendeskSimulator
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+@dataclass
+class Scenario:
+    """The data served by the simulator for one scenario."""
+    tickets: int
+    comments: int
+    huge_tickets: int = 0
+    huge_comments: int = 2000
+    updated: int = 0
+
+SCENARIOS = {
+    "cold": Scenario(tickets=2000, comments=5),
+    "incremental": Scenario(tickets=2000, comments=5, updated=100),
+    "outliers": Scenario(tickets=500, comments=3, huge_tickets=5, huge_comments=2000),
+}
+
+
+class StageTimer:
+    """Adds up the time spent in the wrapped functions, from any thread."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage: str, function: Callable) -> Callable:
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self._record(stage, time.perf_counter() - start)
+        return timed
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {"seconds": round(seconds, 3), "calls": self.calls[stage], "ms_per_call": round(seconds * 1000 / self.calls[stage], 3)}
+            for stage, seconds in self.seconds.items()
+        }
+
+
+def peak_rss_mib() -> Optional[float]:
+    """Returns the peak resident memory of the current process in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_extraction(base_url: str, engine: str, workers: int, directory: str, log_level: str) -> Dict[str, Any]:
+    """Runs one extraction against the simulator. Meant to run in a child process."""
+    from zendesk_extractor.core import main as sync_main, async_main
+    from zendesk_extractor.core.progress import Progress
+
+    logging.getLogger().setLevel(log_level)
+    os.chdir(directory)
+    timer = StageTimer()
+
+    def get_session(pool_size: int = 10, account=None):
+        session = real_get_session(pool_size=pool_size, account=account)
+        session.base_url = base_url
+        session.mount("http://", session.get_adapter("https://"))
+        return session
+
+    def get_async_session(max_connections: int = 10, account=None):
+        client = real_get_async_session(max_connections=max_connections, account=account)
+        client.base_url = base_url
+        return client
+
+    real_get_session = sync_main.get_zendesk_session
+    real_get_async_session = async_main.get_async_zendesk_session
+    credentials = {"ZENDESK_DOMAIN": "simulator", "ZENDESK_EMAIL": "bench@example.com", "ZENDESK_API_TOKEN": "token"}
+    stages = {"transform": "transform_to_structured_json", "save_json": "save_as_json", "to_xml": "convert_to_xml", "save_xml": "save_as_xml"}
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.dict(os.environ, credentials))
+        stack.enter_context(patch.object(sync_main, "get_zendesk_session", get_session))
+        stack.enter_context(patch.object(async_main, "get_async_zendesk_session", get_async_session))
+        stack.enter_context(patch.object(sync_main, "fetch_ticket_comments", timer.wrap("fetch_comments", sync_main.fetch_ticket_comments)))
+        stack.enter_context(patch.object(async_main, "fetch_ticket_comments_async", timer.wrap_async("fetch_comments", async_main.fetch_ticket_comments_async)))
+        for stage, name in stages.items():
+            stack.enter_context(patch.object(sync_main, name, timer.wrap(stage, getattr(sync_main, name))))
+
+        progress = Progress()
+        start = time.perf_counter()
+        if engine == "async":
+            asyncio.run(async_main.main_async(max_concurrency=workers, progress=progress))
+        else:
+            sync_main.main(max_workers=workers, progress=progress)
+        seconds = time.perf_counter() - start
+
+    return {
+        "seconds": seconds,
+        "processed": progress.processed,
+        "failed": progress.failed,
+        "error": progress.error,
+        "peak_rss_mib": peak_rss_mib(),
+        "stages": timer.report(),
+    }
+
+
+def run_in_new_process(context: Any, extraction: tuple) -> Dict[str, Any]:
+    """Runs `run_extraction` in a new process and returns its measurements."""
+    # Unlike the workers of multiprocessing.Pool, these processes are not
+    # daemonic, so the extraction can start worker processes of its own.
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(run_extraction, *extraction).result()
+
+
+def run_scenario(name: str, scenario: Scenario, args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs a scenario and returns its measurements."""
+    # A fresh interpreter per run, so the peak memory is that of the run alone.
+    context = multiprocessing.get_context("spawn")
+    simulator = ZendeskSimulator(
+        tickets=scenario.tickets, comments=scenario.comments, huge_tickets=scenario.huge_tickets, huge_comments=scenario.huge_comments,
+        body_size=args.body_size, latency=args.latency / 1000, rate_limit=args.rate_limit, rate_window=args.rate_window,
+    )
+    with tempfile.TemporaryDirectory() as directory, simulator:
+        extraction = (simulator.base_url, args.engine, args.workers, directory, args.log_level)
+        if scenario.updated:
+            run_in_new_process(context, extraction)
+            simulator.touch(scenario.updated)
+            simulator.reset_stats()
+        result = run_in_new_process(context, extraction)
+        requests = dict(simulator.requests)
+
+    tickets = result["processed"] + result["failed"]
+    total_requests = sum(requests.values())
+    return {
+        "scenario": name,
+        "engine": args.engine,
+        "workers": args.workers,
+        "config": asdict(scenario),
+        "tickets": tickets,
+        "seconds": round(result["seconds"], 3),
+        "tickets_per_second": round(tickets / result["seconds"], 1) if result["seconds"] else None,
+        "requests": requests,
+        "requests_per_ticket": round(total_requests / tickets, 2) if tickets else None,
+        "failed": result["failed"],
+        "error": result["error"],
+        "peak_rss_mib": result["peak_rss_mib"],
+        "stages": result["stages"],
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"{result['scenario']} ({result['engine']}, {result['workers']} workers): {result['tickets']} tickets in {result['seconds']:.2f} s")
+    print(f"  {result['tickets_per_second']} tickets/s, {result['requests_per_ticket']} requests/ticket, "
+          f"{result['requests'].get('rate_limited', 0)} rate limited, peak RSS {result['peak_rss_mib']} MiB")
+    if result["failed"] or result["error"]:
+        print(f"  {result['failed']} failed tickets, error: {result['error']}")
+    for stage, timing in result["stages"].items():
+        print(f"  {stage:<15} {timing['seconds']:8.3f} s {timing['calls']:7d} calls {timing['ms_per_call']:9.3f} ms/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync", help="extraction engine")
+    parser.add_argument("--workers", type=int, default=8, help="tickets processed concurrently")
+    parser.add_argument("--tickets", type=int, help="override the number of tickets of every scenario")
+    parser.add_argument("--body-size", type=int, default=500, help="characters per comment body")
+    parser.add_argument("--latency", type=float, default=20.0, help="milliseconds per simulated request")
+    parser.add_argument("--rate-limit", type=int, default=2000, help="requests allowed per rate-limit window")
+    parser.add_argument("--rate-window", type=float, default=10.0, help="length of the rate-limit window in seconds")
+    parser.add_argument("--log-level", default="WARNING", help="log level of the extraction")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON lines")
+    args = parser.parse_args()
+
+    for name in args.scenario or list(SCENARIOS):
+        scenario = SCENARIOS[name]
+        if args.tickets:
+            scenario = Scenario(**{**asdict(scenario), "tickets": args.tickets})
+        result = run_scenario(name, scenario, args)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_result(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Compares the JSON backends and layouts used for the saved ticket files.
+
+Measures the time to encode one ticket and the size of the result with the
+standard library `json` module and with orjson (if installed), indented and
+compact.
+
+Usage:
+    python -m benchmarks.bench_json [--comments N] [--body-size BYTES] [--repeat N]
+"""
+import argparse
+import timeit
+from unittest.mock import patch
+from benchmarks.bench_xml import make_ticket
+from zendesk_extractor.core import serializers
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=200, help="comments per ticket")
+    parser.add_argument("--body-size", type=int, default=2000, help="characters per comment body")
+    parser.add_argument("--repeat", type=int, default=50, help="encodings per measurement")
+    args = parser.parse_args()
+
+    data = make_ticket(args.comments, args.body_size).to_dict()
+    backends = ["json"] + (["orjson"] if serializers.orjson is not None else [])
+
+    print(f"Ticket with {args.comments} comments of {args.body_size} characters:")
+    for backend in backends:
+        with patch.object(serializers, "orjson", serializers.orjson if backend == "orjson" else None):
+            for compact in (False, True):
+                encode = lambda: serializers.dumps(data, compact=compact)
+                seconds = min(timeit.repeat(encode, number=args.repeat, repeat=3)) / args.repeat
+                layout = "compact" if compact else "indented"
+                print(f"  {backend:<7} {layout:<9} {seconds * 1000:8.3f} ms/ticket {len(encode()) / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
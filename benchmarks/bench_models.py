@@ -0,0 +1,71 @@
+"""Compares `dataclasses.asdict` with the models' hand-written `to_dict`.
+
+Measures the time and the memory allocated to turn one ticket into JSON
+the way `save_as_json` does, with both conversion paths, and the memory
+taken by slotted `Comment` instances compared with a plain dataclass.
+
+Usage:
+    python -m benchmarks.bench_models [--comments N] [--body-size BYTES] [--repeat N]
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass
+from benchmarks.bench_xml import make_ticket
+from zendesk_extractor.core.models import Comment, Person
+
+@dataclass
+class PlainComment:
+    """`Comment` without slots, for comparison."""
+    comment_id: int
+    author_id: int
+    body: str
+    created_at: str
+
+def allocated(function) -> int:
+    """Returns the peak number of bytes allocated while running `function`."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=200, help="comments per ticket")
+    parser.add_argument("--body-size", type=int, default=2000, help="characters per comment body")
+    parser.add_argument("--repeat", type=int, default=50, help="conversions per measurement")
+    args = parser.parse_args()
+
+    ticket = make_ticket(args.comments, args.body_size)
+    # With every person attached, `asdict` and `to_dict` have the same keys.
+    ticket.requester = Person(user_id=ticket.requester_id, name="Requester", email="requester@example.com")
+    ticket.assignee = Person(user_id=ticket.assignee_id, name="Agent", email="agent@example.com", organization_id=1, organization="Support")
+    for comment in ticket.conversation:
+        comment.author = ticket.requester
+    paths = {
+        "asdict": lambda: json.dumps(asdict(ticket), indent=2),
+        "to_dict": lambda: json.dumps(ticket.to_dict(), indent=2),
+        "asdict only": lambda: asdict(ticket),
+        "to_dict only": lambda: ticket.to_dict(),
+    }
+    if paths["asdict"]() != ticket.to_json():
+        raise SystemExit("Outputs differ")
+
+    print(f"Ticket with {args.comments} comments of {args.body_size} characters:")
+    for name, convert in paths.items():
+        seconds = min(timeit.repeat(convert, number=args.repeat, repeat=3)) / args.repeat
+        print(f"  {name:<13} {seconds * 1000:8.3f} ms/ticket {allocated(convert) / 1024:10.1f} KiB peak")
+
+    count = 10000
+    print(f"{count} comment instances:")
+    for name, model in (("dataclass", PlainComment), ("slotted", Comment)):
+        size = allocated(lambda: [model(i, i, "body", "2023-10-27T10:35:00Z") for i in range(count)])
+        print(f"  {name:<13} {size / count:8.1f} bytes/comment")
+
+
+if __name__ == "__main__":
+    main()
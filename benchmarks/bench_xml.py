@@ -0,0 +1,60 @@
+"""Compares the single-pass XML writer with the original minidom round trip.
+
+Usage:
+    python -m benchmarks.bench_xml [--comments N] [--body-size BYTES] [--repeat N]
+"""
+import argparse
+import random
+import string
+import timeit
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.transformation import convert_to_xml, _convert_to_xml_dom
+
+def make_ticket(comments: int, body_size: int, seed: int = 0) -> Ticket:
+    """Builds a ticket with a long conversation of random comment bodies."""
+    rng = random.Random(seed)
+    # Mostly prose, with the occasional character that needs escaping.
+    alphabet = string.ascii_letters * 4 + string.digits + " " * 40 + ".,\n" + "<>&\"'"
+    return Ticket(
+        ticket_id=1,
+        created_at="2023-10-27T10:30:00Z",
+        updated_at="2023-10-27T12:00:00Z",
+        subject="Issue with billing & invoices",
+        status="open",
+        requester_id=98765,
+        assignee_id=54321,
+        tags=["billing", "invoice", "priority"],
+        conversation=[
+            Comment(
+                comment_id=i,
+                author_id=rng.choice([98765, 54321]),
+                body="".join(rng.choice(alphabet) for _ in range(body_size)),
+                created_at="2023-10-27T10:35:00Z",
+            )
+            for i in range(comments)
+        ],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=200, help="comments per ticket")
+    parser.add_argument("--body-size", type=int, default=2000, help="characters per comment body")
+    parser.add_argument("--repeat", type=int, default=20, help="conversions per measurement")
+    args = parser.parse_args()
+
+    ticket = make_ticket(args.comments, args.body_size)
+    if convert_to_xml(ticket) != _convert_to_xml_dom(ticket):
+        raise SystemExit("Outputs differ")
+
+    print(f"Ticket with {args.comments} comments of {args.body_size} characters, {args.repeat} conversions each:")
+    results = {}
+    for name, convert in (("minidom", _convert_to_xml_dom), ("single-pass", convert_to_xml)):
+        seconds = min(timeit.repeat(lambda: convert(ticket), number=args.repeat, repeat=3)) / args.repeat
+        results[name] = seconds
+        print(f"  {name:<12} {seconds * 1000:8.2f} ms/ticket")
+    print(f"  speedup      {results['minidom'] / results['single-pass']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
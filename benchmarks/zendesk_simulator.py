@@ -0,0 +1,260 @@
+"""A local HTTP server that imitates the parts of the Zendesk API the extractor uses.
+
+The simulator serves the cursor-based Incremental Ticket Export and the ticket
+comments endpoint from generated data, with the same pagination as Zendesk,
+a fixed latency per request, and a per-window request budget reported in the
+`ratelimit-*` headers. Requests over the budget get a 429 with Retry-After.
+Other endpoints, including the ticket event export used for bulk comments,
+answer 404.
+
+The server runs in a background thread:
+
+    with ZendeskSimulator(tickets=1000, comments=5) as simulator:
+        ...  # point a session at simulator.base_url
+"""
+import json
+import bisect
+import math
+import random
+import string
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+COMMENTS_PAGE_SIZE = 100
+EXPORT_PAGE_SIZE = 1000
+COMMENT_ID_STRIDE = 1_000_000
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ZendeskSimulator:
+    """Generated tickets served over HTTP on localhost.
+
+    Ticket `i` (starting at 1) has `comments` comments, except the first
+    `huge_tickets` tickets, which have `huge_comments` each. Tickets are
+    exported in the order they were last updated; `touch` updates tickets so
+    that the next export from a checkpointed cursor returns just those.
+    """
+
+    def __init__(self, tickets: int = 1000, comments: int = 5, huge_tickets: int = 0, huge_comments: int = 2000, body_size: int = 500,
+                 latency: float = 0.02, rate_limit: int = 700, rate_window: float = 60.0, seed: int = 0):
+        """Generates the tickets.
+
+        Args:
+            tickets: The number of tickets.
+            comments: The number of comments of a regular ticket.
+            huge_tickets: The number of tickets with `huge_comments` comments.
+            huge_comments: The number of comments of a huge ticket.
+            body_size: The number of characters of a comment body.
+            latency: The seconds every request takes before it is answered.
+            rate_limit: The number of requests allowed per window.
+            rate_window: The length of the rate-limit window in seconds.
+            seed: The seed of the generated comment bodies.
+        """
+        rng = random.Random(seed)
+        alphabet = string.ascii_letters + " " * 10 + ".,\n"
+        # Bodies are slices of one random text, so generating huge tickets is cheap.
+        self._text = "".join(rng.choice(alphabet) for _ in range(body_size * 16))
+        self.body_size = body_size
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.requests = Counter()
+
+        start = datetime.now(timezone.utc) - timedelta(days=1)
+        self._tickets = {}
+        self._comment_counts = {}
+        for ticket_id in range(1, tickets + 1):
+            created = start + timedelta(seconds=ticket_id)
+            self._tickets[ticket_id] = {
+                "id": ticket_id,
+                "created_at": _timestamp(created),
+                "updated_at": _timestamp(created),
+                "subject": f"Simulated ticket {ticket_id}",
+                "status": rng.choice(["new", "open", "pending", "solved"]),
+                "requester_id": 1000 + ticket_id % 97,
+                "assignee_id": 2000 + ticket_id % 13,
+                "tags": rng.sample(["billing", "login", "bug", "vip", "refund"], 2),
+            }
+            self._comment_counts[ticket_id] = huge_comments if ticket_id <= huge_tickets else comments
+        # Tickets in export order as (version, ticket_id). Every update gets
+        # a new, higher version, and cursors point just past a version.
+        self._order = [(ticket_id, ticket_id) for ticket_id in self._tickets]
+        self._version = tickets
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """The URL the API paths are relative to, like `https://<domain>.zendesk.com/api/v2`."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v2"
+
+    def start(self) -> "ZendeskSimulator":
+        """Starts serving on a free port of 127.0.0.1."""
+        handler = type("Handler", (_Handler,), {"simulator": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "ZendeskSimulator":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        """Clears the request counters and starts a new rate-limit window."""
+        with self._lock:
+            self.requests.clear()
+            self._window_start = time.monotonic()
+            self._window_requests = 0
+
+    def count(self, kind: str) -> None:
+        """Counts a request of the given kind."""
+        with self._lock:
+            self.requests[kind] += 1
+
+    def touch(self, count: int) -> List[int]:
+        """Updates `count` random tickets and adds a comment to each.
+
+        Returns:
+            The IDs of the updated tickets.
+        """
+        with self._lock:
+            ticket_ids = random.Random(count).sample(sorted(self._tickets), min(count, len(self._tickets)))
+            now = datetime.now(timezone.utc)
+            for ticket_id in ticket_ids:
+                self._tickets[ticket_id]["updated_at"] = _timestamp(now)
+                self._comment_counts[ticket_id] += 1
+                self._version += 1
+                self._order = [entry for entry in self._order if entry[1] != ticket_id]
+                self._order.append((self._version, ticket_id))
+            return ticket_ids
+
+    def _admit(self) -> Tuple[bool, Dict[str, str]]:
+        """Counts a request against the window and returns whether it is allowed, and the rate-limit headers."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.rate_window:
+                self._window_start = now
+                self._window_requests = 0
+            reset = max(1, math.ceil(self._window_start + self.rate_window - now))
+            allowed = self._window_requests < self.rate_limit
+            if allowed:
+                self._window_requests += 1
+            headers = {
+                "ratelimit-limit": str(self.rate_limit),
+                "ratelimit-remaining": str(self.rate_limit - self._window_requests),
+                "ratelimit-reset": str(reset),
+            }
+            if not allowed:
+                headers["Retry-After"] = str(reset)
+            return allowed, headers
+
+    def _comment(self, ticket_id: int, position: int) -> Dict[str, Any]:
+        ticket = self._tickets[ticket_id]
+        offset = (ticket_id * 7919 + position * 104729) % (len(self._text) - self.body_size + 1)
+        return {
+            "id": ticket_id * COMMENT_ID_STRIDE + position,
+            "author_id": ticket["requester_id"] if position % 2 == 0 else ticket["assignee_id"],
+            "body": self._text[offset:offset + self.body_size],
+            "created_at": ticket["created_at"],
+        }
+
+    def export_page(self, query: Dict[str, str]) -> Dict[str, Any]:
+        """Answers `/incremental/tickets/cursor.json`."""
+        per_page = min(int(query.get("per_page", EXPORT_PAGE_SIZE)), EXPORT_PAGE_SIZE)
+        with self._lock:
+            if "cursor" in query:
+                position = bisect.bisect_right(self._order, (int(query["cursor"]), float("inf")))
+            else:
+                start = _timestamp(datetime.fromtimestamp(int(query.get("start_time", 0)), timezone.utc))
+                position = next((i for i, (_, ticket_id) in enumerate(self._order) if self._tickets[ticket_id]["updated_at"] >= start), len(self._order))
+            entries = self._order[position:position + per_page]
+            tickets = [dict(self._tickets[ticket_id]) for _, ticket_id in entries]
+            after = entries[-1][0] if entries else (self._order[position - 1][0] if position else 0)
+            end_of_stream = position + len(entries) >= len(self._order)
+        return {
+            "tickets": tickets,
+            "after_cursor": str(after),
+            "after_url": f"{self.base_url}/incremental/tickets/cursor.json?{urlencode({'cursor': after, 'per_page': per_page})}",
+            "end_of_stream": end_of_stream,
+        }
+
+    def comments_page(self, ticket_id: int, query: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Answers `/tickets/{ticket_id}/comments.json`, or returns None if the ticket does not exist."""
+        with self._lock:
+            count = self._comment_counts.get(ticket_id)
+        if count is None:
+            return None
+        page = int(query.get("page", 1))
+        descending = query.get("sort_order") == "desc"
+        positions = range(count - 1, -1, -1) if descending else range(count)
+        selected = positions[(page - 1) * COMMENTS_PAGE_SIZE:page * COMMENTS_PAGE_SIZE]
+        next_page = None
+        if page * COMMENTS_PAGE_SIZE < count:
+            next_query = {"page": page + 1}
+            if descending:
+                next_query["sort_order"] = "desc"
+            next_page = f"{self.base_url}/tickets/{ticket_id}/comments.json?{urlencode(next_query)}"
+        return {"comments": [self._comment(ticket_id, position) for position in selected], "next_page": next_page, "count": count}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    simulator = None
+
+    def do_GET(self) -> None:
+        simulator = self.simulator
+        time.sleep(simulator.latency)
+        allowed, headers = simulator._admit()
+        if not allowed:
+            simulator.count("rate_limited")
+            self._send(429, {"error": "TooManyRequests"}, headers)
+            return
+
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if url.path == "/api/v2/incremental/tickets/cursor.json":
+            simulator.count("export")
+            self._send(200, simulator.export_page(query), headers)
+        elif len(parts) == 5 and parts[:3] == ["api", "v2", "tickets"] and parts[4] == "comments.json" and parts[3].isdigit():
+            simulator.count("comments")
+            page = simulator.comments_page(int(parts[3]), query)
+            self._send(200 if page is not None else 404, page or {"error": "RecordNotFound"}, headers)
+        else:
+            simulator.count("other")
+            self._send(404, {"error": "InvalidEndpoint"}, headers)
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Dict[str, str]) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
@@ -0,0 +1,104 @@
+"""The Zendesk accounts a run extracts tickets from.
+
+By default a run extracts the single account configured by ZENDESK_DOMAIN,
+ZENDESK_EMAIL and ZENDESK_API_TOKEN, and keeps its files in the working
+directory.
+
+To extract several accounts in one process, list their names in
+ZENDESK_ACCOUNTS, separated by commas. For an account named `acme` the
+credentials are read from ZENDESK_ACME_DOMAIN, ZENDESK_ACME_EMAIL and
+ZENDESK_ACME_API_TOKEN. The email and token fall back to ZENDESK_EMAIL and
+ZENDESK_API_TOKEN, and the domain to the account name. Each account keeps its
+output, checkpoint, watermark and journal in `accounts/<name>`, and gets its
+own connection pool and rate-limit budget.
+"""
+import os
+import re
+from typing import List, NamedTuple, Optional
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+ACCOUNTS_DIRECTORY = "accounts"
+_ACCOUNT_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+class Account(NamedTuple):
+    """The credentials and file locations of one Zendesk account.
+
+    Attributes:
+        name: The name of the account, or None for the account configured
+              without ZENDESK_ACCOUNTS.
+        domain: The Zendesk subdomain, as in `<domain>.zendesk.com`.
+        email: The email address of the API user.
+        token: The API token.
+    """
+    name: Optional[str]
+    domain: Optional[str]
+    email: Optional[str]
+    token: Optional[str]
+
+    @property
+    def label(self) -> str:
+        """How the account is referred to in logs."""
+        return self.name or self.domain or "default"
+
+    def path(self, default: str, env: Optional[str] = None) -> str:
+        """Returns where the account keeps a file or directory.
+
+        Args:
+            default: The location relative to the working directory, such as
+                     `last_cursor.txt` or `output/shards`.
+            env: An environment variable that overrides the location of the
+                 default account's file.
+
+        Returns:
+            `default` under `accounts/<name>` for a named account. For the
+            default account, the value of `env` if it is set, or `default`.
+        """
+        if self.name is None:
+            return (os.getenv(env) if env else None) or default
+        return os.path.join(ACCOUNTS_DIRECTORY, self.name, default)
+
+
+def _env_prefix(name: str) -> str:
+    """Returns the prefix of the environment variables of a named account."""
+    return f"ZENDESK_{name.upper().replace('-', '_')}_"
+
+
+def get_default_account() -> Account:
+    """Reads the account configured by ZENDESK_DOMAIN, ZENDESK_EMAIL and ZENDESK_API_TOKEN."""
+    return Account(None, os.getenv("ZENDESK_DOMAIN"), os.getenv("ZENDESK_EMAIL"), os.getenv("ZENDESK_API_TOKEN"))
+
+
+def get_accounts() -> List[Account]:
+    """Reads the accounts of a run from the environment.
+
+    Returns:
+        One `Account` per name in ZENDESK_ACCOUNTS, or the default account if
+        it is not set. Missing credentials are reported when the account's
+        session is created.
+
+    Raises:
+        ZendeskExtractorError: If an account name is invalid or repeated, or
+                               two names read the same environment
+                               variables, such as `a-b` and `a_b`.
+    """
+    names = [name.strip().lower() for name in os.getenv("ZENDESK_ACCOUNTS", "").split(",") if name.strip()]
+    if not names:
+        return [get_default_account()]
+
+    accounts = []
+    for name in names:
+        if not _ACCOUNT_NAME.match(name):
+            raise ZendeskExtractorError(f"Invalid account name {name!r} in ZENDESK_ACCOUNTS. Use letters, digits, '-' and '_'.")
+        if any(account.name == name for account in accounts):
+            raise ZendeskExtractorError(f"Account {name!r} is listed twice in ZENDESK_ACCOUNTS.")
+        prefix = _env_prefix(name)
+        for account in accounts:
+            if _env_prefix(account.name) == prefix:
+                raise ZendeskExtractorError(f"Accounts {account.name!r} and {name!r} in ZENDESK_ACCOUNTS would both read their settings from {prefix}*.")
+        accounts.append(Account(
+            name,
+            os.getenv(f"{prefix}DOMAIN") or name,
+            os.getenv(f"{prefix}EMAIL") or os.getenv("ZENDESK_EMAIL"),
+            os.getenv(f"{prefix}API_TOKEN") or os.getenv("ZENDESK_API_TOKEN"),
+        ))
+    return accounts
@@ -0,0 +1,540 @@
+import os
+import asyncio
+import logging
+import httpx
+from typing import List, Dict, Any, Awaitable, Callable, Optional, AsyncIterator, Tuple
+from zendesk_extractor.core.main import (
+    transform_and_save, get_max_workers, get_bulk_comments, read_cursor, get_export_start_time,
+    filter_exported_tickets, load_saved_tickets, get_run_output, get_stored_ticket, is_unchanged, log_progress, log_summary,
+    checkpoint_cursor, record_checkpoint, get_ticket_journal, get_process_pool, prepare_account, get_http_cache, run_accounts, backfill_account,
+    DEFAULT_MAX_WORKERS, EXPORT_PAGE_SIZE,
+)
+from zendesk_extractor.core.models import Person
+from zendesk_extractor.core.people import PeopleCache, chunked, ticket_user_ids
+from zendesk_extractor.core.accounts import Account, get_accounts, get_default_account
+from zendesk_extractor.core import metrics
+from zendesk_extractor.core.scheduler import AsyncRateLimitScheduler, RateLimitedTransport
+from zendesk_extractor.core.http_cache import HttpCache, CachingTransport
+from zendesk_extractor.core.pipeline import PageTracker, PipelineItem, stream_pages_async, run_bounded_async
+from zendesk_extractor.core.bulk_comments import CommentEventStream, merge_comments
+from zendesk_extractor.core.output import RunOutput
+from zendesk_extractor.core.process_pool import BatchProcessPool
+from zendesk_extractor.core.progress import Progress
+from zendesk_extractor.core.exceptions import ZendeskAPIError, ZendeskExtractorError
+
+def get_async_zendesk_session(max_connections: int = 10, account: Optional[Account] = None, http_cache: Optional[HttpCache] = None) -> httpx.AsyncClient:
+    """Creates and returns an httpx.AsyncClient for interacting with the Zendesk API.
+
+    This is the asyncio counterpart of `get_zendesk_session`. The client keeps a
+    single connection pool to the Zendesk host that is shared by every request
+    made during a run, and sends every request through a shared
+    `AsyncRateLimitScheduler`.
+
+    Args:
+        max_connections: The maximum number of concurrent connections the
+                         client opens to the Zendesk host, and the most
+                         requests the scheduler lets run at once.
+        account: The account to connect to. Defaults to the account
+                 configured by ZENDESK_DOMAIN, ZENDESK_EMAIL and
+                 ZENDESK_API_TOKEN.
+        http_cache: The cache GET requests are revalidated against, if any.
+                    It is closed with the client.
+
+    Returns:
+        An httpx.AsyncClient configured for the Zendesk API.
+
+    Raises:
+        ZendeskAPIError: If the API credentials are not found in the environment
+                         variables or if the client creation fails.
+    """
+    try:
+        _, domain, email, token = account or get_default_account()
+
+        if not all([domain, email, token]):
+            raise ZendeskAPIError("Zendesk API credentials not found in environment variables.")
+
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        transport = RateLimitedTransport(AsyncRateLimitScheduler(max_concurrency=max_connections), transport)
+        if http_cache is not None:
+            transport = CachingTransport(http_cache, transport)
+        return httpx.AsyncClient(
+            base_url=f"https://{domain}.zendesk.com/api/v2",
+            auth=(f"{email}/token", token),
+            headers={"Accept": "application/json"},
+            transport=transport,
+            timeout=httpx.Timeout(30.0),
+        )
+    except Exception as e:
+        raise ZendeskAPIError(f"Failed to create Zendesk session: {e}")
+
+async def fetch_tickets_async(client: httpx.AsyncClient, start_time: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yields tickets from the Zendesk search API as each page arrives.
+
+    Unlike `fetch_tickets`, this does not wait for the last page before
+    returning, so callers can start processing the first tickets while the
+    remaining pages are still being fetched.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        start_time: An optional ISO 8601 formatted date string to filter tickets
+                    updated after this time.
+
+    Yields:
+        Ticket dictionaries, in the order returned by the API.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching tickets from the API.
+    """
+    url = "/search.json"
+    params = None
+
+    if start_time:
+        params = {"query": f"type:ticket updated>={start_time}"}
+
+    while url:
+        try:
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            raise ZendeskAPIError(f"An error occurred while fetching tickets: {e}")
+
+        for ticket in data["results"]:
+            yield ticket
+
+        if data.get("meta", {}).get("has_more"):
+            url = data["links"]["next"]
+            # The next link already carries the query. httpx replaces the URL's
+            # query string with any params passed, even an empty dict.
+            params = None
+        else:
+            url = None
+
+async def fetch_ticket_export_async(client: httpx.AsyncClient, cursor: Optional[str] = None, start_time: Optional[int] = None, per_page: int = EXPORT_PAGE_SIZE) -> AsyncIterator[Tuple[List[Dict[str, Any]], str]]:
+    """Yields pages of tickets from the cursor-based Incremental Ticket Export API.
+
+    This is the asyncio counterpart of `fetch_ticket_export`.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        cursor: The opaque cursor returned by a previous export. Takes
+                precedence over `start_time`.
+        start_time: A Unix timestamp to start the export from when there is
+                    no cursor yet.
+        per_page: The number of tickets requested per page (at most 1000).
+
+    Yields:
+        Tuples of (tickets, after_cursor) for each page.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching tickets from the API.
+    """
+    url = "/incremental/tickets/cursor.json"
+    params = {"per_page": per_page}
+
+    if cursor:
+        params["cursor"] = cursor
+    else:
+        params["start_time"] = start_time or 0
+
+    while url:
+        try:
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            raise ZendeskAPIError(f"An error occurred while exporting tickets: {e}")
+
+        yield data["tickets"], data["after_cursor"]
+
+        if data.get("end_of_stream"):
+            url = None
+        else:
+            url = data["after_url"]
+            params = None  # The after_url already carries the cursor
+
+async def fetch_ticket_comments_async(client: httpx.AsyncClient, ticket_id: int, after_id: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """Retrieves all comments for a single ticket, handling pagination.
+
+    This is the asyncio counterpart of `fetch_ticket_comments`.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        ticket_id: The ID of the ticket to fetch comments for.
+        after_id: If given, only the comments newer than this comment are
+                  fetched.
+
+    Returns:
+        A list of comment dictionaries, or None if no comments are found.
+
+    Raises:
+        ZendeskAPIError: If the ticket is not found or an error occurs while
+                         fetching comments.
+    """
+    comments = []
+    url = f"/tickets/{ticket_id}/comments.json"
+    params = {"sort_order": "desc"} if after_id is not None else None
+
+    while url:
+        try:
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            if after_id is None:
+                comments.extend(data["comments"])
+                url = data.get("next_page")
+            else:
+                comments.extend(comment for comment in data["comments"] if comment["id"] > after_id)
+                reached = any(comment["id"] <= after_id for comment in data["comments"])
+                url = None if reached else data.get("next_page")
+            params = None  # The next_page URL already carries the sort order
+
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise ZendeskAPIError(f"Ticket with ID {ticket_id} not found.")
+            else:
+                raise ZendeskAPIError(f"An HTTP error occurred while fetching comments for ticket {ticket_id}: {e}")
+        except httpx.HTTPError as e:
+            raise ZendeskAPIError(f"An error occurred while fetching comments for ticket {ticket_id}: {e}")
+
+    if after_id is not None:
+        comments.reverse()
+    return comments
+
+
+async def fetch_users_async(client: httpx.AsyncClient, user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Retrieves users by ID. This is the asyncio counterpart of `fetch_users`.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching the users.
+    """
+    try:
+        response = await client.get("/users/show_many.json", params={"ids": ",".join(map(str, user_ids))})
+        response.raise_for_status()
+        return response.json()["users"]
+    except httpx.HTTPError as e:
+        raise ZendeskAPIError(f"An error occurred while fetching users: {e}")
+
+
+async def fetch_organizations_async(client: httpx.AsyncClient, organization_ids: List[int]) -> List[Dict[str, Any]]:
+    """Retrieves organizations by ID. This is the asyncio counterpart of `fetch_organizations`.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching the organizations.
+    """
+    try:
+        response = await client.get("/organizations/show_many.json", params={"ids": ",".join(map(str, organization_ids))})
+        response.raise_for_status()
+        return response.json()["organizations"]
+    except httpx.HTTPError as e:
+        raise ZendeskAPIError(f"An error occurred while fetching organizations: {e}")
+
+
+async def resolve_people_async(client: httpx.AsyncClient, people: PeopleCache, user_ids: List[int]) -> Dict[int, Person]:
+    """Looks up the users and organizations the cache does not know yet.
+
+    This is the asyncio counterpart of `resolve_people`. The cache is read
+    and written in a worker thread.
+
+    Raises:
+        FileSaveError: If the cache cannot be read or written.
+    """
+    try:
+        for chunk in chunked(await asyncio.to_thread(people.missing_users, user_ids)):
+            await asyncio.to_thread(people.add_users, chunk, await fetch_users_async(client, chunk))
+        for chunk in chunked(await asyncio.to_thread(people.missing_organizations, user_ids)):
+            await asyncio.to_thread(people.add_organizations, chunk, await fetch_organizations_async(client, chunk))
+    except ZendeskAPIError as e:
+        logging.warning(f"Could not look up users or organizations, saving tickets without them: {e}")
+    return await asyncio.to_thread(people.people, user_ids)
+
+
+async def fetch_comment_events_async(client: httpx.AsyncClient, stream: CommentEventStream, end_time: int) -> None:
+    """Reads the ticket event export into a stream until it covers a time.
+
+    This is the asyncio counterpart of `fetch_comment_events`.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        stream: The run's event stream, which continues where it stopped.
+        end_time: The Unix timestamp after which no more pages are needed.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching ticket events.
+    """
+    while (request := stream.next_request(end_time)) is not None:
+        url, params = request
+        try:
+            response = await client.get(url or "/incremental/ticket_events.json", params=params)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            raise ZendeskAPIError(f"An error occurred while fetching ticket events: {e}")
+
+        if not stream.add_page(data):
+            break
+
+
+async def fetch_comments_in_bulk_async(client: httpx.AsyncClient, tickets: List[Dict[str, Any]], output: Optional[RunOutput] = None, stream: Optional[CommentEventStream] = None) -> Dict[int, List[Dict[str, Any]]]:
+    """Retrieves the comments of many tickets from the ticket event export.
+
+    This is the asyncio counterpart of `fetch_comments_in_bulk`.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        tickets: The raw tickets of one export page.
+        output: The outputs of the run, if any, to read saved tickets from.
+        stream: The event stream shared by the pages of the run. A new one is
+                started if not given.
+
+    Returns:
+        A mapping of ticket ID to the ticket's complete list of comments.
+    """
+    stream = stream if stream is not None else CommentEventStream()
+    saved_tickets = await asyncio.to_thread(load_saved_tickets, tickets, output)
+    end_time, ticket_ids = stream.plan(tickets, saved_tickets)
+    if not ticket_ids:
+        return {}
+
+    try:
+        await fetch_comment_events_async(client, stream, end_time)
+    except ZendeskAPIError as e:
+        logging.warning(f"Could not fetch comments in bulk, falling back to per-ticket requests: {e}")
+        return {}
+
+    logging.info(f"Fetched comments for {len(ticket_ids)} of {len(tickets)} tickets in bulk.")
+    return stream.assemble(tickets, saved_tickets, ticket_ids)
+
+
+async def process_ticket_async(client: httpx.AsyncClient, ticket: Dict[str, Any], comments: Optional[List[Dict[str, Any]]] = None, output: Optional[RunOutput] = None) -> bool:
+    """Fetches, transforms and saves a single ticket.
+
+    This is the asyncio counterpart of `process_ticket`. Errors raised while
+    processing the ticket are logged and swallowed so that one bad ticket never
+    aborts the rest of the run.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        ticket: The raw ticket dictionary returned by the Zendesk API.
+        comments: The ticket's comments, if they have already been fetched in
+                  bulk. Otherwise they are fetched from the comments endpoint,
+                  or only the new ones if the ticket is in the ticket store.
+        output: The outputs of the run to save the ticket to, if any.
+
+    Returns:
+        True if the ticket was saved or is unchanged, False otherwise.
+    """
+    ticket_id = ticket["id"]
+    logging.debug(f"Processing ticket ID: {ticket_id}")
+    try:
+        stored = await asyncio.to_thread(get_stored_ticket, ticket, output)
+        if is_unchanged(ticket, stored):
+            logging.debug(f"Ticket {ticket_id} has not been updated since it was saved. Skipping.")
+            metrics.TICKETS.inc(result="unchanged")
+            return True
+
+        with metrics.STAGE_SECONDS.time(stage="fetch"):
+            if comments is None and stored is not None and stored.comments:
+                new_comments = await fetch_ticket_comments_async(client, ticket_id, after_id=stored.last_comment_id)
+                comments = merge_comments(stored.comments, new_comments or [])
+            if comments is None:
+                comments = await fetch_ticket_comments_async(client, ticket_id)
+        if comments is None:
+            logging.warning(f"Could not fetch comments for ticket {ticket_id}. Skipping.")
+            metrics.TICKETS.inc(result="failed")
+            return False
+
+        people = None
+        if output is not None and output.people is not None:
+            with metrics.STAGE_SECONDS.time(stage="people"):
+                people = await resolve_people_async(client, output.people, ticket_user_ids([ticket], comments))
+
+        # Serialization and file writes run in a worker thread so they do not
+        # block the event loop.
+        if not await asyncio.to_thread(transform_and_save, ticket, comments, output, people):
+            metrics.TICKETS.inc(result="failed")
+            return False
+
+        logging.debug(f"Successfully processed and saved ticket ID: {ticket_id}")
+        return True
+
+    except ZendeskExtractorError as e:
+        logging.error(f"An error occurred while processing ticket {ticket_id}: {e}")
+        metrics.TICKETS.inc(result="failed")
+        return False
+
+
+async def process_tickets_async(client: httpx.AsyncClient, tickets: AsyncIterator[Dict[str, Any]], max_concurrency: int = DEFAULT_MAX_WORKERS, prefetched: Optional[Dict[int, List[Dict[str, Any]]]] = None) -> int:
+    """Processes tickets from an async iterator with bounded concurrency.
+
+    Tickets are handed to `max_concurrency` worker tasks through a bounded
+    queue, so pagination of `tickets` overlaps with comment fetching without
+    buffering more than a few tickets ahead of the workers.
+
+    Args:
+        client: The httpx.AsyncClient for making API calls.
+        tickets: An async iterator of raw ticket dictionaries.
+        max_concurrency: The maximum number of tickets processed at the same time.
+        prefetched: Comments already fetched in bulk, keyed by ticket ID.
+
+    Returns:
+        The number of tickets read from `tickets`.
+
+    Raises:
+        ZendeskAPIError: If `tickets` raises while paginating. Tickets already
+                         queued are still processed before the error propagates.
+    """
+    prefetched = prefetched or {}
+
+    async def handle(ticket: Dict[str, Any]) -> None:
+        await process_ticket_async(client, ticket, comments=prefetched.get(ticket["id"]))
+
+    return await run_bounded_async(tickets, handle, max_concurrency)
+
+
+async def prepare_pages_async(client: httpx.AsyncClient, pages: AsyncIterator[Tuple[List[Dict[str, Any]], str]], bulk_comments: bool = False, output: Optional[RunOutput] = None, progress: Optional[Progress] = None) -> AsyncIterator[Tuple[List[Dict[str, Any]], str, Dict[int, List[Dict[str, Any]]]]]:
+    """Asyncio counterpart of `prepare_pages`."""
+    stream = CommentEventStream() if bulk_comments else None
+    async for tickets, after_cursor in pages:
+        tickets = filter_exported_tickets(tickets)
+        if tickets:
+            logging.info(f"Found {len(tickets)} tickets.")
+        if progress is not None:
+            progress.add_fetched(len(tickets))
+        prefetched = await fetch_comments_in_bulk_async(client, tickets, output, stream) if bulk_comments and tickets else {}
+        if output is not None and output.people is not None and tickets:
+            comments = [comment for ticket_comments in prefetched.values() for comment in ticket_comments]
+            with metrics.STAGE_SECONDS.time(stage="people"):
+                await resolve_people_async(client, output.people, ticket_user_ids(tickets, comments))
+        yield tickets, after_cursor, prefetched
+
+
+async def run_accounts_async(accounts: List[Account], extract: Callable[[Account], Awaitable[int]]) -> int:
+    """Asyncio counterpart of `run_accounts`: extracts the accounts concurrently on the event loop.
+
+    Raises:
+        ZendeskExtractorError: If any account failed, once the others are done.
+    """
+    if len(accounts) == 1:
+        return await extract(accounts[0])
+
+    async def run(account: Account) -> Tuple[int, Optional[str]]:
+        try:
+            return await extract(account), None
+        except ZendeskExtractorError as e:
+            logging.error(f"An unrecoverable error occurred in account {account.label}: {e}")
+            return 0, f"{account.label}: {e}"
+
+    results = await asyncio.gather(*(run(account) for account in accounts))
+    errors = [error for _, error in results if error]
+    if errors:
+        raise ZendeskExtractorError("; ".join(errors))
+    return sum(total for total, _ in results)
+
+
+async def extract_account_async(account: Account, max_concurrency: int, bulk_comments: bool, progress: Progress, workers: Optional[BatchProcessPool] = None) -> int:
+    """Asyncio counterpart of `extract_account`.
+
+    The run's outputs, journal and cursor checkpoints are read and written in
+    worker threads, so their file and SQLite I/O never blocks the event loop.
+
+    Returns:
+        The number of tickets handled.
+
+    Raises:
+        ZendeskExtractorError: If the extraction cannot continue.
+    """
+    cursor_file, last_run_file = prepare_account(account)
+    output = await asyncio.to_thread(get_run_output, account, workers)
+    cursor = read_cursor(cursor_file)
+    start_time = None if cursor else get_export_start_time(last_run_file)
+
+    journal = await asyncio.to_thread(get_ticket_journal, account, output.tables is None)
+    tracker = PageTracker(lambda cursor: checkpoint_cursor(output, cursor, cursor_file), on_checkpoint=lambda page: record_checkpoint(journal, page, last_run_file))
+
+    finished = False
+    try:
+        async with get_async_zendesk_session(max_connections=max(max_concurrency, 10), account=account, http_cache=get_http_cache(account)) as client:
+            pages = prepare_pages_async(client, fetch_ticket_export_async(client, cursor=cursor, start_time=start_time), bulk_comments, output, progress)
+
+            async def handle(item: PipelineItem) -> None:
+                success = False
+                try:
+                    if await asyncio.to_thread(journal.skip, item.ticket, item.page):
+                        logging.debug(f"Ticket {item.ticket['id']} was completed before the previous run stopped. Skipping.")
+                        metrics.TICKETS.inc(result="unchanged")
+                        success = True
+                    else:
+                        success = await process_ticket_async(client, item.ticket, comments=item.comments, output=output)
+                        if success:
+                            await asyncio.to_thread(journal.record, item.ticket, item.page)
+                finally:
+                    log_progress(progress, progress.ticket_done(bool(success)))
+                    await asyncio.to_thread(tracker.complete, item.page)
+
+            total = await run_bounded_async(stream_pages_async(pages, tracker), handle, max_concurrency)
+            finished = True
+    finally:
+        try:
+            await asyncio.to_thread(journal.close, finished=finished)
+        finally:
+            await asyncio.to_thread(output.close)
+
+    if not total:
+        logging.info(f"No tickets found for the specified period{f' in account {account.name}' if account.name else ''}.")
+    return total
+
+
+async def main_async(max_concurrency: Optional[int] = None, bulk_comments: Optional[bool] = None, progress: Optional[Progress] = None) -> None:
+    """Asyncio counterpart of `main`, suitable for awaiting inside an event loop.
+
+    Tickets are streamed from the Incremental Ticket Export API to a bounded
+    set of worker tasks, using a single pooled httpx.AsyncClient per account.
+    Later pages are fetched while earlier ones are being processed, and
+    each page's cursor is checkpointed once all of its tickets are done.
+    Several accounts are extracted concurrently on the same event loop.
+
+    When ZENDESK_BACKFILL_START is set, the accounts are backfilled like
+    `main` does, by the threaded extractor in a worker thread, since a
+    backfill spreads its slices over processes rather than over one loop.
+
+    Args:
+        max_concurrency: The maximum number of tickets processed concurrently
+                         per account. If not given, it is read from the
+                         ZENDESK_MAX_WORKERS environment variable, like `main`.
+        bulk_comments: Whether to fetch comments in bulk from the ticket event
+                       export. If not given, it is read from the
+                       ZENDESK_BULK_COMMENTS environment variable.
+        progress: Counts the tickets fetched, processed and failed as the run
+                  goes on. It is marked finished when the run ends.
+    """
+    progress = progress or Progress()
+    try:
+        if max_concurrency is None:
+            max_concurrency = get_max_workers()
+        if bulk_comments is None:
+            bulk_comments = get_bulk_comments()
+
+        accounts = get_accounts()
+        if os.getenv("ZENDESK_BACKFILL_START", "").strip():
+            total = await asyncio.to_thread(run_accounts, accounts, lambda account: backfill_account(account, max_concurrency, bulk_comments, progress))
+        else:
+            workers = get_process_pool()
+            try:
+                total = await run_accounts_async(accounts, lambda account: extract_account_async(account, max_concurrency, bulk_comments, progress, workers))
+            finally:
+                if workers is not None:
+                    await asyncio.to_thread(workers.close)
+
+        progress.finish()
+        if total:
+            log_summary(progress)
+
+    except ZendeskExtractorError as e:
+        logging.error(f"An unrecoverable error occurred: {e}")
+        progress.finish(error=str(e))
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,376 @@
+"""Backfilling a long history of tickets in parallel time slices.
+
+The incremental export is a single stream of pages, so exporting years of
+tickets through one cursor is slow. A backfill splits a date range into time
+slices and exports each slice separately: from a start time that is the
+beginning of the slice, up to the first ticket updated after its end.
+
+Slices are coordinated through files in a shared directory, so they can be
+exported by several processes, or by several machines that share the output
+directory. `plan.json` holds the range and the slice length. Each slice has
+its own cursor checkpoint and run journal. A process claims a slice by
+creating its lease file, and keeps the lease fresh while it exports it. A
+slice whose lease has not been refreshed for a while is claimed again, and a
+failed slice is retried until it has failed `max_attempts` times.
+
+The export only returns the current version of each ticket, so every ticket
+belongs to the slice of its last update. Tickets updated after the end of the
+range are left to the regular incremental runs, which continue from the end
+of the range once every slice is done.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from zendesk_extractor.core.exceptions import FileSaveError, ZendeskExtractorError
+
+BACKFILL_DIRECTORY = "backfill"
+DEFAULT_SLICE_DAYS = 30
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 5.0
+
+def parse_time(value: str) -> int:
+    """Converts an ISO 8601 date or time into a Unix timestamp.
+
+    Dates and times without a time zone are taken to be in UTC.
+
+    Raises:
+        ZendeskExtractorError: If the value is not an ISO 8601 date or time.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ZendeskExtractorError(f"Invalid date {value!r}. Use an ISO 8601 date such as 2020-01-31.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def format_time(timestamp: int) -> str:
+    """Formats a Unix timestamp like the `updated_at` of a ticket."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def ticket_timestamp(ticket: Dict[str, Any]) -> Optional[int]:
+    """Returns the time a ticket was exported at, as a Unix timestamp.
+
+    This is the `generated_timestamp` of the export if it is present, which
+    is what the export is ordered by, and its `updated_at` otherwise.
+    """
+    if isinstance(ticket.get("generated_timestamp"), int):
+        return ticket["generated_timestamp"]
+    if ticket.get("updated_at"):
+        try:
+            return parse_time(ticket["updated_at"])
+        except ZendeskExtractorError:
+            return None
+    return None
+
+
+def clip_pages(pages: Iterable[Tuple[List[Dict[str, Any]], str]], end: int) -> Iterator[Tuple[List[Dict[str, Any]], str]]:
+    """Stops an export at the first ticket exported at or after `end`.
+
+    Args:
+        pages: Tuples of (tickets, after_cursor) from `fetch_ticket_export`.
+        end: The Unix timestamp the slice ends at, exclusive.
+
+    Yields:
+        The pages before `end`, the last one without its tickets from `end` on.
+    """
+    for tickets, after_cursor in pages:
+        for position, ticket in enumerate(tickets):
+            timestamp = ticket_timestamp(ticket)
+            if timestamp is not None and timestamp >= end:
+                yield tickets[:position], after_cursor
+                return
+        yield tickets, after_cursor
+
+
+class Slice(NamedTuple):
+    """A part of the backfilled range, from `start` included to `end` excluded, in Unix time."""
+    start: int
+    end: int
+
+    @property
+    def name(self) -> str:
+        """The name of the slice's files."""
+        return f"{self.start}-{self.end}"
+
+    def __str__(self) -> str:
+        return f"{format_time(self.start)}..{format_time(self.end)}"
+
+
+def plan_slices(start: int, end: int, slice_seconds: int) -> List[Slice]:
+    """Splits a range into consecutive slices of `slice_seconds`, the last one possibly shorter."""
+    return [Slice(slice_start, min(slice_start + slice_seconds, end)) for slice_start in range(start, end, slice_seconds)]
+
+
+def _write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class BackfillCoordinator:
+    """The slices of a backfill and which of them are done, taken or failed.
+
+    Every process taking part in the backfill opens its own coordinator on
+    the same directory.
+    """
+
+    def __init__(self, directory: str, start: int, end: Optional[int] = None, slice_seconds: int = DEFAULT_SLICE_DAYS * 86400,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS, clock: Callable[[], float] = time.time):
+        """Opens the backfill kept in `directory`, planning it if it is new.
+
+        Args:
+            directory: The directory shared by the processes of the backfill.
+            start: The Unix timestamp the backfill starts at.
+            end: The Unix timestamp the backfill ends at. Defaults to the end
+                 of the backfill already planned in `directory`, or to now.
+            slice_seconds: The length of a slice.
+            lease_seconds: How long a slice stays taken after its lease was
+                           last refreshed.
+            max_attempts: How many times a slice is exported before it is
+                          left failed.
+            clock: Returns the current Unix time.
+
+        Raises:
+            ZendeskExtractorError: If `directory` holds a backfill of another
+                                   range, or the range is empty.
+            FileSaveError: If the plan cannot be written.
+        """
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._clock = clock
+        os.makedirs(directory, exist_ok=True)
+        plan = self._load_plan()
+        if plan is None:
+            plan = {"start": start, "end": int(clock()) if end is None else end, "slice_seconds": slice_seconds}
+            if plan["end"] <= start:
+                raise ZendeskExtractorError(f"The backfill ends at {format_time(plan['end'])}, before it starts at {format_time(start)}.")
+            self._create_plan(plan)
+            plan = self._load_plan()
+        if (plan["start"], plan["slice_seconds"]) != (start, slice_seconds) or end not in (None, plan["end"]):
+            raise ZendeskExtractorError(
+                f"{directory} holds a backfill of {format_time(plan['start'])}..{format_time(plan['end'])} in slices of {plan['slice_seconds']}s. "
+                "Finish it with the same settings or remove the directory."
+            )
+        self.start, self.end = plan["start"], plan["end"]
+        self.slices = plan_slices(self.start, self.end, plan["slice_seconds"])
+
+    @property
+    def _plan_path(self) -> str:
+        return os.path.join(self.directory, "plan.json")
+
+    def _create_plan(self, plan: Dict[str, int]) -> None:
+        # Linking fails if the plan exists, so of several processes starting
+        # the backfill at once, the first one's plan is kept.
+        tmp_path = f"{self._plan_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps(plan))
+            os.link(tmp_path, self._plan_path)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            raise FileSaveError(f"Could not write the backfill plan {self._plan_path}: {e}")
+        finally:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _load_plan(self) -> Optional[Dict[str, int]]:
+        try:
+            with open(self._plan_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise ZendeskExtractorError(f"Could not read the backfill plan {self._plan_path}: {e}")
+
+    def path(self, backfill_slice: Slice, kind: str) -> str:
+        """Returns the path of one of a slice's files, such as its `cursor` or `journal.jsonl`."""
+        return os.path.join(self.directory, f"{backfill_slice.name}.{kind}")
+
+    def is_done(self, backfill_slice: Slice) -> bool:
+        return os.path.exists(self.path(backfill_slice, "done"))
+
+    def attempts(self, backfill_slice: Slice) -> int:
+        """Returns how many times exporting a slice has failed."""
+        try:
+            with open(self.path(backfill_slice, "failures")) as f:
+                return len(f.read().splitlines())
+        except FileNotFoundError:
+            return 0
+
+    def _lease_expired(self, lease_path: str) -> bool:
+        try:
+            return self._clock() - os.stat(lease_path).st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return True
+
+    def _take_lease(self, backfill_slice: Slice) -> bool:
+        lease_path = self.path(backfill_slice, "lease")
+        if os.path.exists(lease_path):
+            if not self._lease_expired(lease_path):
+                return False
+            # Renaming is atomic, so only one process takes over an expired lease.
+            try:
+                os.rename(lease_path, f"{lease_path}.{self.owner.replace(':', '-')}.expired")
+            except FileNotFoundError:
+                return False
+            os.remove(f"{lease_path}.{self.owner.replace(':', '-')}.expired")
+            logging.warning(f"Taking over backfill slice {backfill_slice}, whose process stopped refreshing it.")
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(self.owner)
+        return True
+
+    def claim(self) -> Optional[Slice]:
+        """Takes the first slice that is not done, taken or failed for good.
+
+        Returns:
+            The slice, or None if there is none to take right now.
+        """
+        for backfill_slice in self.slices:
+            if self.is_done(backfill_slice) or self.attempts(backfill_slice) >= self.max_attempts:
+                continue
+            if self._take_lease(backfill_slice):
+                # Another process may have finished the slice just before its lease was released.
+                if self.is_done(backfill_slice):
+                    self._release(backfill_slice)
+                    continue
+                return backfill_slice
+        return None
+
+    def refresh(self, backfill_slice: Slice) -> bool:
+        """Refreshes the lease of a slice.
+
+        Returns:
+            False if the lease expired and was taken by another process.
+        """
+        lease_path = self.path(backfill_slice, "lease")
+        try:
+            with open(lease_path) as f:
+                if f.read() != self.owner:
+                    return False
+            os.utime(lease_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def holding(self, backfill_slice: Slice) -> Iterator[None]:
+        """Refreshes the lease of a slice in the background while the `with` block exports it."""
+        stopped = threading.Event()
+
+        def refresh() -> None:
+            while not stopped.wait(self.lease_seconds / 3):
+                if not self.refresh(backfill_slice):
+                    logging.warning(f"Lost the lease of backfill slice {backfill_slice} to another process.")
+                    return
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def _release(self, backfill_slice: Slice) -> None:
+        try:
+            os.remove(self.path(backfill_slice, "lease"))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, backfill_slice: Slice, tickets: int) -> None:
+        """Marks a slice as done and releases it."""
+        _write_atomic(self.path(backfill_slice, "done"), json.dumps({"tickets": tickets, "owner": self.owner}))
+        for kind in ("cursor", "failures"):
+            try:
+                os.remove(self.path(backfill_slice, kind))
+            except FileNotFoundError:
+                pass
+        self._release(backfill_slice)
+
+    def fail(self, backfill_slice: Slice, error: str) -> None:
+        """Records a failed attempt at a slice and releases it, so it can be retried."""
+        with open(self.path(backfill_slice, "failures"), "a") as f:
+            f.write(json.dumps({"owner": self.owner, "error": error}) + "\n")
+        self._release(backfill_slice)
+
+    def status(self) -> Dict[str, int]:
+        """Counts the slices that are `done`, `failed` for good, `running` and `pending`."""
+        counts = {"done": 0, "failed": 0, "running": 0, "pending": 0}
+        for backfill_slice in self.slices:
+            if self.is_done(backfill_slice):
+                counts["done"] += 1
+            elif self.attempts(backfill_slice) >= self.max_attempts:
+                counts["failed"] += 1
+            elif not self._lease_expired(self.path(backfill_slice, "lease")):
+                counts["running"] += 1
+            else:
+                counts["pending"] += 1
+        return counts
+
+    def watermark(self) -> Optional[str]:
+        """Returns where the incremental runs continue once the backfill is done.
+
+        Returns:
+            The end of the range as a timestamp like `updated_at` once every
+            slice is done, None before.
+        """
+        if all(self.is_done(backfill_slice) for backfill_slice in self.slices):
+            return format_time(self.end)
+        return None
+
+
+def run_backfill_worker(coordinator: BackfillCoordinator, extract: Callable[[Slice], int], poll_interval: float = DEFAULT_POLL_INTERVAL) -> int:
+    """Exports slices one after the other until none is left.
+
+    While the remaining slices are taken by other processes, the worker waits
+    and takes over those that fail or whose process stops.
+
+    Args:
+        coordinator: The backfill.
+        extract: Exports one slice and returns the number of its tickets.
+        poll_interval: The seconds between looks at the slices of others.
+
+    Returns:
+        The number of tickets this worker exported.
+    """
+    total = 0
+    while True:
+        backfill_slice = coordinator.claim()
+        if backfill_slice is None:
+            status = coordinator.status()
+            if not status["running"] and not status["pending"]:
+                return total
+            time.sleep(poll_interval)
+            continue
+
+        logging.info(f"Backfilling slice {backfill_slice}.")
+        try:
+            with coordinator.holding(backfill_slice):
+                tickets = extract(backfill_slice)
+        except ZendeskExtractorError as e:
+            logging.error(f"Backfill slice {backfill_slice} failed: {e}")
+            coordinator.fail(backfill_slice, str(e))
+            continue
+        coordinator.complete(backfill_slice, tickets)
+        total += tickets
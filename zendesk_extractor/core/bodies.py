@@ -0,0 +1,139 @@
+"""Content-addressed storage of long comment bodies.
+
+Quoted reply chains and signatures make many comment bodies long and
+identical to each other. With deduplication enabled, every body of at least
+a minimum size is written once to `output/bodies/<aa>/<sha256>.txt`. The
+comment in the ticket's JSON file holds its `body_ref` (the SHA-256 of the
+body) instead of the body, and the XML file holds a `<body_ref>` element in
+place of `<body>`. The bodies are compressed like the ticket files.
+
+Readers call `BodyStore.restore` or `restore_xml` to put the bodies back.
+"""
+import os
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from zendesk_extractor.core.compression import SUFFIXES, compress, find_file, read_file
+from zendesk_extractor.core.models import Ticket
+from zendesk_extractor.core.transformation import replace_body_refs
+
+BODY_DIRECTORY = "bodies"
+DEFAULT_MIN_BODY_BYTES = 512
+
+class BodyStore:
+    """The deduplicated comment bodies of an output directory.
+
+    Bodies are written to a temporary file that is then renamed, and a body
+    is only ever written with the same content, so the store is safe to share
+    between threads and processes.
+    """
+
+    def __init__(self, directory: str, compression: Optional[str] = None, min_bytes: int = DEFAULT_MIN_BODY_BYTES):
+        """Initializes the store.
+
+        Args:
+            directory: The directory of the bodies, such as `output/bodies`.
+            compression: None, "gzip" or "zstd".
+            min_bytes: The size in UTF-8 bytes from which bodies are stored
+                       here instead of in the ticket files.
+        """
+        self.directory = directory
+        self.compression = compression
+        self.min_bytes = min_bytes
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.txt")
+
+    def put(self, body: str) -> str:
+        """Stores a body unless it is already stored.
+
+        Returns:
+            The SHA-256 of the body, in hexadecimal.
+
+        Raises:
+            OSError: If the body cannot be written.
+        """
+        data = body.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest) + SUFFIXES[self.compression]
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compress(data, self.compression))
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """Returns a stored body.
+
+        Raises:
+            OSError: If the body is not stored or cannot be read.
+        """
+        path = find_file(self._path(digest))
+        if path is None:
+            raise FileNotFoundError(f"Comment body {digest} is not in {self.directory}.")
+        return read_file(path).decode("utf-8")
+
+    def dedup(self, ticket: Ticket) -> Dict[int, str]:
+        """Stores the long bodies of a ticket's comments.
+
+        Returns:
+            The `body_ref` of each stored body, by the position of its comment
+            in the conversation.
+
+        Raises:
+            OSError: If a body cannot be written.
+        """
+        refs = {}
+        for position, comment in enumerate(ticket.conversation):
+            body = comment.body
+            # Checking the length in characters first skips encoding the
+            # bodies that are too short even if every character took 4 bytes.
+            if isinstance(body, str) and len(body) * 4 >= self.min_bytes and len(body.encode("utf-8")) >= self.min_bytes:
+                refs[position] = self.put(body)
+        return refs
+
+    def restore(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Puts the stored bodies back into a ticket read from a JSON file, in place.
+
+        Returns:
+            `data`, for convenience.
+
+        Raises:
+            OSError: If a body is not stored or cannot be read.
+        """
+        conversation = data.get("conversation") or []
+        for position, comment in enumerate(conversation):
+            if "body_ref" in comment:
+                conversation[position] = _rename(comment, "body_ref", "body", self.get(comment["body_ref"]))
+        return data
+
+    def restore_xml(self, xml: str) -> str:
+        """Puts the stored bodies back into a ticket's XML document.
+
+        Raises:
+            OSError: If a body is not stored or cannot be read.
+        """
+        return replace_body_refs(xml, self.get)
+
+
+def apply_body_refs(data: Dict[str, Any], refs: Dict[int, str]) -> Dict[str, Any]:
+    """Replaces the bodies of a ticket dictionary by their `body_ref`, in place.
+
+    Args:
+        data: The ticket, as returned by `Ticket.to_dict`.
+        refs: The references returned by `BodyStore.dedup`.
+
+    Returns:
+        `data`, for convenience.
+    """
+    conversation = data["conversation"]
+    for position, digest in refs.items():
+        conversation[position] = _rename(conversation[position], "body", "body_ref", digest)
+    return data
+
+
+def _rename(comment: Dict[str, Any], old: str, new: str, value: Any) -> Dict[str, Any]:
+    """Returns a copy of a comment with a key replaced, keeping the order of the keys."""
+    return {new if key == old else key: value if key == old else item for key, item in comment.items()}
@@ -0,0 +1,279 @@
+"""Bulk comment retrieval through the Incremental Ticket Event Export API.
+
+Instead of one comments request per ticket, the comments of a whole page of
+tickets are read from the ticket event stream (with the `comment_events`
+sideload) and demultiplexed by ticket ID. The event stream only contains
+comments made inside the requested window, so each ticket's earlier comments
+come from the previously saved copy of the ticket. Tickets without a usable
+saved copy fall back to the per-ticket comments endpoint.
+
+The event stream is account-wide and its endpoint has a tight rate limit, so
+a run reads it once: a `CommentEventStream` starts at the window of the first
+export page and each later page continues reading where the previous one
+stopped.
+"""
+import requests
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
+from requests import Session
+from zendesk_extractor.core.exceptions import ZendeskAPIError
+
+BULK_COMMENTS_MAX_LOOKBACK = timedelta(days=30)
+
+def parse_timestamp(value: str) -> datetime:
+    """Parses a Zendesk ISO 8601 timestamp such as `2023-10-27T10:30:00Z`."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def comment_from_event(ticket_event: Dict[str, Any], child_event: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts a `Comment` child event into the shape of the comments endpoint.
+
+    Args:
+        ticket_event: The ticket event (audit) the comment belongs to.
+        child_event: The child event with `event_type` "Comment".
+
+    Returns:
+        A comment dictionary with the same keys `transform_to_structured_json`
+        reads from the comments endpoint.
+    """
+    return {
+        "id": child_event.get("id"),
+        "author_id": child_event.get("author_id", ticket_event.get("updater_id")),
+        "body": child_event.get("body"),
+        "created_at": child_event.get("created_at", ticket_event.get("created_at")),
+    }
+
+
+def group_comment_events(ticket_events: Iterable[Dict[str, Any]], comments: Optional[Dict[int, List[Dict[str, Any]]]] = None) -> Dict[int, List[Dict[str, Any]]]:
+    """Demultiplexes the comments in a list of ticket events by ticket ID.
+
+    Args:
+        ticket_events: Ticket events returned by the ticket event export.
+        comments: An existing mapping to add the comments to.
+
+    Returns:
+        A mapping of ticket ID to the comments made on that ticket, in event
+        order.
+    """
+    if comments is None:
+        comments = defaultdict(list)
+    for ticket_event in ticket_events:
+        for child_event in ticket_event.get("child_events") or []:
+            if child_event.get("event_type") == "Comment":
+                comments[ticket_event["ticket_id"]].append(comment_from_event(ticket_event, child_event))
+    return comments
+
+
+def plan_comment_window(tickets: List[Dict[str, Any]], saved_tickets: Dict[int, Dict[str, Any]], max_lookback: timedelta = BULK_COMMENTS_MAX_LOOKBACK) -> Tuple[Optional[int], Optional[int], Set[int]]:
+    """Works out which tickets can get their comments from the event stream.
+
+    A ticket needs the events since it was last saved, or since it was created
+    if it has never been saved. Tickets that would stretch the window further
+    back than `max_lookback` before the newest update are left to the
+    per-ticket comments endpoint.
+
+    Args:
+        tickets: The raw tickets of one export page.
+        saved_tickets: The previously saved copies of those tickets, keyed by
+                       ticket ID.
+        max_lookback: How far back the event window may reach.
+
+    Returns:
+        A tuple of (start_time, end_time, ticket_ids) where the times are Unix
+        timestamps bounding the event window, or None if no ticket can use it,
+        and `ticket_ids` are the tickets covered by the window.
+    """
+    if not tickets:
+        return None, None, set()
+
+    window_end = max(parse_timestamp(ticket["updated_at"]) for ticket in tickets)
+    cutoff = window_end - max_lookback
+    window_start = None
+    ticket_ids = set()
+
+    for ticket in tickets:
+        saved = saved_tickets.get(ticket["id"])
+        since = parse_timestamp(saved["updated_at"] if saved else ticket["created_at"])
+        if since < cutoff:
+            continue
+        ticket_ids.add(ticket["id"])
+        if window_start is None or since < window_start:
+            window_start = since
+
+    if window_start is None:
+        return None, None, set()
+    return int(window_start.timestamp()), int(window_end.timestamp()), ticket_ids
+
+
+def _since(ticket: Dict[str, Any], saved_ticket: Optional[Dict[str, Any]]) -> int:
+    """Returns the Unix time from which a ticket needs its comment events."""
+    return int(parse_timestamp(saved_ticket["updated_at"] if saved_ticket else ticket["created_at"]).timestamp())
+
+
+class CommentEventStream:
+    """The ticket event export of one run, shared by all of its export pages.
+
+    The stream starts at the event window of the first page that needs it.
+    Later pages continue from the last page of events read, so no event is
+    requested twice. Tickets that need events from before the start of the
+    stream are left to the per-ticket comments endpoint.
+
+    The events are kept until the ticket they belong to has been assembled,
+    and the events up to that ticket's `updated_at` are then dropped.
+
+    This class does not make requests: `next_request` says what to fetch and
+    `add_page` takes the response.
+    """
+
+    def __init__(self, max_lookback: timedelta = BULK_COMMENTS_MAX_LOOKBACK):
+        self.max_lookback = max_lookback
+        self.start_time: Optional[int] = None
+        self.read_until: Optional[int] = None
+        self.next_page: Optional[str] = None
+        self.end_of_stream = False
+        self.comments: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        self._dropped_until: Dict[int, int] = {}
+
+    def plan(self, tickets: List[Dict[str, Any]], saved_tickets: Dict[int, Dict[str, Any]]) -> Tuple[Optional[int], Set[int]]:
+        """Works out which tickets of a page can get their comments from the stream.
+
+        Args:
+            tickets: The raw tickets of one export page.
+            saved_tickets: The previously saved copies of those tickets, keyed
+                           by ticket ID.
+
+        Returns:
+            A tuple of (end_time, ticket_ids): the Unix time up to which the
+            stream must be read, or None if no ticket can use it, and the
+            tickets covered by the stream.
+        """
+        start_time, end_time, ticket_ids = plan_comment_window(tickets, saved_tickets, self.max_lookback)
+        if not ticket_ids:
+            return None, set()
+        if self.start_time is None:
+            self.start_time = start_time
+        by_id = {ticket["id"]: ticket for ticket in tickets}
+        ticket_ids = {
+            ticket_id for ticket_id in ticket_ids
+            if _since(by_id[ticket_id], saved_tickets.get(ticket_id)) >= max(self.start_time, self._dropped_until.get(ticket_id, self.start_time))
+        }
+        return (end_time if ticket_ids else None), ticket_ids
+
+    def next_request(self, end_time: int) -> Optional[Tuple[Optional[str], Optional[Dict[str, Any]]]]:
+        """Returns the next request needed to read the stream up to `end_time`.
+
+        Returns:
+            None if the events up to `end_time` have been read. Otherwise a
+            tuple of (url, params): the `next_page` URL to request as it is,
+            or None and the parameters of the first request of the stream.
+        """
+        if self.read_until is not None and (self.read_until > end_time or (self.end_of_stream and self.read_until >= end_time)):
+            return None
+        if self.next_page:
+            return self.next_page, None
+        return None, {"start_time": self.start_time, "include": "comment_events"}
+
+    def add_page(self, data: Dict[str, Any]) -> bool:
+        """Adds a page of the ticket event export to the stream.
+
+        Returns:
+            False if the page is the end of the stream for now, so there is
+            nothing more to read.
+        """
+        group_comment_events(data["ticket_events"], self.comments)
+        self.read_until = data.get("end_time", self.read_until)
+        self.next_page = data.get("next_page")
+        self.end_of_stream = bool(data.get("end_of_stream")) or not self.next_page
+        return not self.end_of_stream
+
+    def assemble(self, tickets: List[Dict[str, Any]], saved_tickets: Dict[int, Dict[str, Any]], ticket_ids: Set[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Builds the full comment list of each covered ticket, like `assemble_comments`.
+
+        The events of these tickets up to their `updated_at` are then dropped,
+        since the tickets are saved with them.
+        """
+        comments = assemble_comments(tickets, saved_tickets, ticket_ids, self.comments)
+        for ticket in tickets:
+            if ticket["id"] not in ticket_ids:
+                continue
+            until = int(parse_timestamp(ticket["updated_at"]).timestamp())
+            kept = [
+                comment for comment in self.comments.pop(ticket["id"], [])
+                if not comment.get("created_at") or parse_timestamp(comment["created_at"]).timestamp() > until
+            ]
+            if kept:
+                self.comments[ticket["id"]] = kept
+            self._dropped_until[ticket["id"]] = until
+        return comments
+
+
+def saved_conversation(saved_ticket: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Converts the conversation of a saved ticket back into raw comment dictionaries."""
+    if not saved_ticket:
+        return []
+    return [
+        {
+            "id": comment["comment_id"],
+            "author_id": comment["author_id"],
+            "body": comment["body"],
+            "created_at": comment["created_at"],
+        }
+        for comment in saved_ticket.get("conversation") or []
+    ]
+
+
+def merge_comments(previous: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Appends new comments to a previously saved conversation, skipping duplicates."""
+    seen = {comment["id"] for comment in previous}
+    merged = list(previous)
+    for comment in new:
+        if comment["id"] not in seen:
+            seen.add(comment["id"])
+            merged.append(comment)
+    return merged
+
+
+def fetch_comment_events(session: Session, stream: CommentEventStream, end_time: int) -> None:
+    """Reads the ticket event export into a stream until it covers a time.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        stream: The run's event stream, which continues where it stopped.
+        end_time: The Unix timestamp after which no more pages are needed.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching ticket events. The
+                         pages read before the error are kept in the stream.
+    """
+    while (request := stream.next_request(end_time)) is not None:
+        url, params = request
+        try:
+            response = session.get(url or f"{session.base_url}/incremental/ticket_events.json", params=params)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            raise ZendeskAPIError(f"An error occurred while fetching ticket events: {e}")
+
+        if not stream.add_page(data):
+            break
+
+
+def assemble_comments(tickets: List[Dict[str, Any]], saved_tickets: Dict[int, Dict[str, Any]], ticket_ids: Set[int], events: Dict[int, List[Dict[str, Any]]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Builds the full comment list of each ticket covered by the event window.
+
+    Args:
+        tickets: The raw tickets of one export page.
+        saved_tickets: The previously saved copies of those tickets.
+        ticket_ids: The tickets covered by the event window.
+        events: The comments from the event window, keyed by ticket ID.
+
+    Returns:
+        A mapping of ticket ID to its complete list of comments. Tickets outside
+        the window are left out so that callers fetch them individually.
+    """
+    return {
+        ticket["id"]: merge_comments(saved_conversation(saved_tickets.get(ticket["id"])), events.get(ticket["id"], []))
+        for ticket in tickets
+        if ticket["id"] in ticket_ids
+    }
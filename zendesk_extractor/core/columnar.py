@@ -0,0 +1,292 @@
+"""Columnar Parquet export of tickets and comments for analytics.
+
+Every run appends a new partition to two Parquet datasets in
+`output/parquet`: `tickets` with one row per ticket, and `comments` with one
+row per comment. Partitions are directories named `run=<UTC timestamp>`, so
+`pyarrow.dataset`, pandas or DuckDB read both datasets as whole tables with a
+`run` column, and earlier runs are never rewritten. A ticket updated in
+several runs has a row in each of their partitions; the row with the
+greatest `updated_at` is the current one.
+
+Each writer claims its partition by creating the directory, which fails if it
+already exists, so processes that start in the same second, such as those of
+a backfill, never write to the same partition.
+
+Rows are buffered and written in row groups of `row_group_size` rows. Files
+are written under a hidden name and renamed once they are complete, so
+readers never see a file without its footer. Rows only survive a crash once
+their file is complete, so each checkpoint of the export cursor first
+completes the current part file of the partition, and later rows go to the
+next part. Once a row group cannot be written, the writer refuses every
+later ticket and checkpoint, so the cursor never moves past tickets whose
+rows were lost.
+
+This module requires the optional `pyarrow` package.
+"""
+import os
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from zendesk_extractor.core.models import Ticket
+from zendesk_extractor.core.bulk_comments import parse_timestamp
+from zendesk_extractor.core.exceptions import FileSaveError, ZendeskExtractorError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pq = None
+
+PARQUET_DIRECTORY = "output/parquet"
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+def ticket_schema() -> "pa.Schema":
+    """Returns the schema of the tickets table."""
+    return pa.schema([
+        ("ticket_id", pa.int64()),
+        ("created_at", pa.timestamp("s", tz="UTC")),
+        ("updated_at", pa.timestamp("s", tz="UTC")),
+        ("subject", pa.string()),
+        ("status", pa.string()),
+        ("requester_id", pa.int64()),
+        ("assignee_id", pa.int64()),
+        ("tags", pa.list_(pa.string())),
+    ])
+
+
+def comment_schema() -> "pa.Schema":
+    """Returns the schema of the comments table."""
+    return pa.schema([
+        ("comment_id", pa.int64()),
+        ("ticket_id", pa.int64()),
+        ("author_id", pa.int64()),
+        ("body", pa.string()),
+        ("created_at", pa.timestamp("s", tz="UTC")),
+    ])
+
+
+def to_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parses a Zendesk timestamp, returning None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        return None
+
+
+class _TableWriter:
+    """Writes the rows of one table of one run in row groups."""
+
+    def __init__(self, directory: str, schema: "pa.Schema", row_group_size: int):
+        self.directory = directory
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns = {name: [] for name in schema.names}
+        self._buffered = 0
+        self._writer = None
+        self._part = 0
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"part-{self._part:05d}.parquet")
+
+    @property
+    def _tmp_path(self) -> str:
+        return os.path.join(self.directory, f".part-{self._part:05d}.parquet.inprogress")
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """Buffers one row, writing a row group once enough rows are buffered."""
+        for name, column in self._columns.items():
+            column.append(row[name])
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered rows as a row group."""
+        if not self._buffered:
+            return
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._writer = pq.ParquetWriter(self._tmp_path, self.schema)
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows += self._buffered
+        self._columns = {name: [] for name in self.schema.names}
+        self._buffered = 0
+
+    def finish_part(self) -> None:
+        """Writes the remaining rows and publishes the current part file under its final name.
+
+        The next rows go to a new part file.
+        """
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp_path, self._path)
+            self._part += 1
+
+    def abandon(self) -> None:
+        """Drops the buffered rows and the unfinished part file."""
+        self._columns = {name: [] for name in self.schema.names}
+        self._buffered = 0
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except (OSError, pa.ArrowException):
+                pass
+            self._writer = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class ColumnarWriter:
+    """Appends tickets and their comments to a new partition of the Parquet datasets.
+
+    The writer is safe to share between threads. The partition is claimed
+    when the writer is created. Nothing is written to it until the first row
+    group is full, a checkpoint or the writer is closed, and a run without
+    tickets leaves no partition.
+    """
+
+    def __init__(self, directory: str = PARQUET_DIRECTORY, run_id: Optional[str] = None, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        """Initializes the writer.
+
+        Args:
+            directory: The directory holding the `tickets` and `comments`
+                       datasets.
+            run_id: The name of the partition. Defaults to the current UTC
+                    time, such as `20231027T103000Z`, with a suffix if
+                    another writer already claimed it.
+            row_group_size: The number of rows per row group.
+
+        Raises:
+            ZendeskExtractorError: If the pyarrow package is not installed.
+            FileSaveError: If the partition cannot be claimed, or `run_id`
+                           is already taken.
+        """
+        if pa is None:
+            raise ZendeskExtractorError("The Parquet export requires the pyarrow package.")
+        self.run_id = self._claim_run_id(directory, run_id)
+        partition = f"run={self.run_id}"
+        self._tickets = _TableWriter(os.path.join(directory, "tickets", partition), ticket_schema(), row_group_size)
+        self._comments = _TableWriter(os.path.join(directory, "comments", partition), comment_schema(), row_group_size)
+        self._lock = threading.Lock()
+        self._error: Optional[Exception] = None
+
+    @staticmethod
+    def _claim_run_id(directory: str, run_id: Optional[str] = None) -> str:
+        """Creates the tickets partition of a new run and returns its name.
+
+        The directory is created with `exist_ok=False`, so of several writers
+        trying the same name only one gets it and the others try the next
+        suffix.
+        """
+        base = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        candidate = base
+        suffix = 1
+        while True:
+            try:
+                os.makedirs(os.path.join(directory, "tickets", f"run={candidate}"), exist_ok=False)
+                return candidate
+            except FileExistsError:
+                if run_id:
+                    raise FileSaveError(f"Parquet partition run={run_id} already exists.")
+                candidate = f"{base}-{suffix}"
+                suffix += 1
+            except OSError as e:
+                raise FileSaveError(f"Could not create Parquet partition run={candidate}: {e}")
+
+    def write(self, ticket: Ticket) -> None:
+        """Adds a ticket and its comments to the run's partition.
+
+        Raises:
+            FileSaveError: If a row group cannot be written, now or earlier in
+                           the run.
+        """
+        ticket_row = {
+            "ticket_id": ticket.ticket_id,
+            "created_at": to_timestamp(ticket.created_at),
+            "updated_at": to_timestamp(ticket.updated_at),
+            "subject": ticket.subject,
+            "status": ticket.status,
+            "requester_id": ticket.requester_id,
+            "assignee_id": ticket.assignee_id,
+            "tags": ticket.tags,
+        }
+        comment_rows = [
+            {
+                "comment_id": comment.comment_id,
+                "ticket_id": ticket.ticket_id,
+                "author_id": comment.author_id,
+                "body": comment.body,
+                "created_at": to_timestamp(comment.created_at),
+            }
+            for comment in ticket.conversation
+        ]
+        with self._lock:
+            if self._error is not None:
+                raise FileSaveError(f"Not writing ticket {ticket.ticket_id} to Parquet after an earlier error: {self._error}")
+            try:
+                self._tickets.append(ticket_row)
+                for row in comment_rows:
+                    self._comments.append(row)
+            except (OSError, pa.ArrowException) as e:
+                self._error = e
+                raise FileSaveError(f"Error writing ticket {ticket.ticket_id} to Parquet: {e}")
+
+    def checkpoint(self) -> None:
+        """Completes the current part files, so every row written so far survives a crash.
+
+        Raises:
+            FileSaveError: If the files cannot be written, now or earlier in
+                           the run. The rows since the last checkpoint are
+                           then lost, and so must be exported again.
+        """
+        with self._lock:
+            if self._error is not None:
+                raise FileSaveError(f"Parquet partition run={self.run_id} is missing rows after an earlier error: {self._error}")
+            try:
+                self._tickets.finish_part()
+                self._comments.finish_part()
+            except (OSError, pa.ArrowException) as e:
+                self._error = e
+                raise FileSaveError(f"Error writing Parquet partition run={self.run_id}: {e}")
+
+    def close(self) -> None:
+        """Writes the remaining rows and closes the partition's files.
+
+        After an error, the unfinished part files are removed instead.
+
+        Raises:
+            FileSaveError: If the files cannot be written, now or earlier in
+                           the run.
+        """
+        try:
+            self.checkpoint()
+        except FileSaveError:
+            with self._lock:
+                self._tickets.abandon()
+                self._comments.abandon()
+            raise
+        if self._tickets.rows:
+            logging.info(f"Wrote {self._tickets.rows} tickets and {self._comments.rows} comments to Parquet partition run={self.run_id}.")
+            return
+        # Give back the partition claimed for a run without tickets.
+        for path in (self._tickets.directory, os.path.dirname(self._tickets.directory)):
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,136 @@
+"""Compression of the files the extractor writes.
+
+Shards, per-ticket JSON and XML files and deduplicated comment bodies can be
+compressed with gzip or, if the `zstandard` package is installed, zstd. A
+compressed file keeps its name with `.gz` or `.zst` appended, so the codec of
+any file can be told from its name and the standard tools decompress it.
+"""
+import os
+import gzip
+from typing import Optional
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+def check_compression(compression: Optional[str], what: str) -> None:
+    """Checks that a compression can be used.
+
+    Args:
+        compression: None, "gzip" or "zstd".
+        what: What is compressed, for the error message, such as "shard".
+
+    Raises:
+        ZendeskExtractorError: If the compression is unknown, or is "zstd" and
+                               the zstandard package is not installed.
+    """
+    if compression not in SUFFIXES:
+        raise ZendeskExtractorError(f"Unknown {what} compression {compression!r}. Use gzip or zstd.")
+    if compression == "zstd" and zstandard is None:
+        raise ZendeskExtractorError(f"zstd {what} compression requires the zstandard package.")
+
+
+def compress(data: bytes, compression: Optional[str]) -> bytes:
+    """Compresses data as a standalone gzip member or zstd frame."""
+    if compression == "gzip":
+        return gzip.compress(data, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def compression_of(name: str) -> Optional[str]:
+    """Returns the compression of a file, from its name."""
+    if name.endswith(".gz"):
+        return "gzip"
+    if name.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def decompress(data: bytes, name: str) -> bytes:
+    """Decompresses data, picking the codec from the name of the file it was read from."""
+    compression = compression_of(name)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ZendeskExtractorError(f"Reading {name} requires the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def find_file(path: str) -> Optional[str]:
+    """Returns the path of a file as written with any compression, or None if it does not exist.
+
+    Args:
+        path: The path of the file without a compression suffix, such as
+              `output/json/1.json`. If it already ends with `.gz` or `.zst`,
+              only that file is looked for.
+    """
+    if compression_of(path) is not None:
+        return path if os.path.exists(path) else None
+    for suffix in SUFFIXES.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+
+def read_file(path: str) -> bytes:
+    """Reads and decompresses a file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ZendeskExtractorError: If it is compressed with zstd and the zstandard
+                               package is not installed.
+    """
+    with open(path, "rb") as f:
+        return decompress(f.read(), path)
+
+
+def write_file(path: str, data: bytes, compression: Optional[str]) -> int:
+    """Writes a file compressed, removing the copies of it left with other compressions.
+
+    Args:
+        path: The path of the file without a compression suffix.
+        data: The uncompressed content.
+        compression: None, "gzip" or "zstd".
+
+    Returns:
+        The number of bytes written.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    payload = compress(data, compression)
+    with open(path + SUFFIXES[compression], "wb") as f:
+        f.write(payload)
+    # A ticket saved again after the compression setting changed must not
+    # leave its previous version behind, where readers could pick it up.
+    for other, suffix in SUFFIXES.items():
+        if other != compression:
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+    return len(payload)
+
+
+def remove_file(path: str) -> None:
+    """Removes a file written by `write_file`, whatever its compression.
+
+    Args:
+        path: The path of the file without a compression suffix.
+
+    Raises:
+        OSError: If a copy of the file exists but cannot be removed.
+    """
+    for suffix in SUFFIXES.values():
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
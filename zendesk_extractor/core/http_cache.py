@@ -0,0 +1,285 @@
+"""A persistent cache of Zendesk API responses, revalidated on every request.
+
+Incremental runs overlap: the same comment pages are requested again for
+every ticket that was updated, even when its comments did not change. With
+the cache enabled, each successful GET response that carries an `ETag` or a
+`Last-Modified` header is kept in an SQLite database, `output/http_cache.db`
+by default, keyed by its URL. The next request for that URL is sent with
+`If-None-Match` and `If-Modified-Since`, and a `304 Not Modified` is answered
+with the cached body, so the body is neither downloaded nor decompressed
+again. Responses are never served without asking Zendesk first, so the cache
+cannot return stale data.
+
+The cache is bounded by the total size of the bodies it holds. Once it grows
+past its maximum, the least recently used responses are evicted.
+
+Like the rate-limit scheduler, the cache sits beneath the HTTP clients:
+`CachingAdapter` plugs it into a requests.Session and `CachingTransport` into
+an httpx.AsyncClient, so the fetch functions see ordinary 200 responses.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import httpx
+import requests
+from typing import Any, Callable, Dict, NamedTuple, Optional
+from requests.structures import CaseInsensitiveDict
+from zendesk_extractor.core import metrics
+from zendesk_extractor.core.exceptions import FileSaveError
+from zendesk_extractor.core.scheduler import RateLimitScheduler, RateLimitedAdapter
+
+HTTP_CACHE_PATH = "output/http_cache.db"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Headers that describe the body as it was sent, not the decoded body the cache holds.
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_used_at ON responses (used_at);
+"""
+
+class CachedResponse(NamedTuple):
+    """A response kept in the cache.
+
+    Attributes:
+        etag: The `ETag` of the response, if it had one.
+        last_modified: The `Last-Modified` date of the response, if it had one.
+        headers: The headers of the response, without those of the encoding.
+        body: The decoded body of the response.
+    """
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Returns the headers that make a request conditional on this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def storable_headers(headers: Any) -> Dict[str, str]:
+    """Returns the headers of a response worth keeping with its decoded body."""
+    return {name: value for name, value in headers.items() if name.lower() not in _TRANSFER_HEADERS}
+
+
+class HttpCache:
+    """The SQLite cache of API responses.
+
+    The cache is safe to share between threads, and between processes that
+    use the same database, such as the processes of a backfill. The database
+    is opened on first use.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, clock: Callable[[], float] = time.time):
+        """Initializes the cache.
+
+        Args:
+            path: The SQLite database of the cache.
+            max_bytes: The total size of the cached bodies above which the
+                       least recently used responses are evicted.
+            clock: Returns the current Unix time.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._size = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database and creates its tables on first use. Call with the lock held."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Returns the cached response for a URL, if there is one.
+
+        Raises:
+            FileSaveError: If the database cannot be read.
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT etag, last_modified, headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+        except sqlite3.Error as e:
+            raise FileSaveError(f"Error reading the HTTP cache {self.path}: {e}")
+        if row is None:
+            return None
+        return CachedResponse(row[0], row[1], json.loads(row[2]), row[3])
+
+    def touch(self, url: str) -> None:
+        """Marks a cached response as used, so it is evicted last.
+
+        Raises:
+            FileSaveError: If the database cannot be written.
+        """
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute("UPDATE responses SET used_at = ? WHERE url = ?", (self.clock(), url))
+        except sqlite3.Error as e:
+            raise FileSaveError(f"Error writing the HTTP cache {self.path}: {e}")
+
+    def put(self, url: str, response: CachedResponse) -> None:
+        """Caches a response, evicting the least recently used ones if the cache is full.
+
+        A body larger than the whole cache is not cached.
+
+        Raises:
+            FileSaveError: If the database cannot be written.
+        """
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO responses (url, etag, last_modified, headers, body, size, used_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (url, response.etag, response.last_modified, json.dumps(response.headers), response.body, size, self.clock()),
+                    )
+                    # The size is only summed when it may be over the limit,
+                    # since other processes may have changed the database.
+                    if self._size is not None:
+                        self._size += size
+                    if self._size is None or self._size > self.max_bytes:
+                        self._size = self._evict(connection)
+        except sqlite3.Error as e:
+            raise FileSaveError(f"Error writing the HTTP cache {self.path}: {e}")
+
+    def _evict(self, connection: sqlite3.Connection) -> int:
+        """Deletes the least recently used responses until the bodies fit. Returns their total size."""
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return total
+        rows = connection.execute("SELECT url, size FROM responses ORDER BY used_at")
+        evicted = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((url,))
+            total -= size
+        rows.close()
+        connection.executemany("DELETE FROM responses WHERE url = ?", evicted)
+        metrics.HTTP_CACHE_EVICTIONS.inc(len(evicted))
+        return total
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class CachingAdapter(RateLimitedAdapter):
+    """A requests transport adapter that revalidates GET requests against an `HttpCache`.
+
+    Requests that are not GET, and streamed requests, are sent as they are.
+    """
+
+    def __init__(self, cache: HttpCache, scheduler: RateLimitScheduler, **kwargs: Any):
+        self.cache = cache
+        super().__init__(scheduler, **kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != "GET" or kwargs.get("stream"):
+            return super().send(request, **kwargs)
+
+        cached = self.cache.get(request.url)
+        if cached is not None:
+            request.headers.update(cached.conditional_headers())
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            metrics.HTTP_CACHE_REQUESTS.inc(result="hit")
+            self.cache.touch(request.url)
+            replayed = requests.Response()
+            replayed.status_code = 200
+            replayed.reason = "OK"
+            replayed.headers = CaseInsensitiveDict({**cached.headers, **storable_headers(response.headers)})
+            replayed._content = cached.body
+            replayed.url = response.url
+            replayed.request = request
+            replayed.connection = self
+            replayed.elapsed = response.elapsed
+            response.close()
+            return replayed
+
+        metrics.HTTP_CACHE_REQUESTS.inc(result="miss")
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            self.cache.put(request.url, CachedResponse(etag, last_modified, storable_headers(response.headers), response.content))
+        return response
+
+    def close(self) -> None:
+        super().close()
+        self.cache.close()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """An httpx transport that revalidates GET requests against an `HttpCache`.
+
+    The cache is read and written in a worker thread, so it does not block
+    the event loop.
+    """
+
+    def __init__(self, cache: HttpCache, transport: httpx.AsyncBaseTransport):
+        self.cache = cache
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self.transport.handle_async_request(request)
+
+        url = str(request.url)
+        cached = await asyncio.to_thread(self.cache.get, url)
+        if cached is not None:
+            request.headers.update(cached.conditional_headers())
+        response = await self.transport.handle_async_request(request)
+
+        if response.status_code == 304 and cached is not None:
+            metrics.HTTP_CACHE_REQUESTS.inc(result="hit")
+            await response.aclose()
+            await asyncio.to_thread(self.cache.touch, url)
+            return httpx.Response(200, headers={**cached.headers, **storable_headers(response.headers)}, content=cached.body, request=request)
+
+        metrics.HTTP_CACHE_REQUESTS.inc(result="miss")
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return response
+        body = await response.aread()
+        await response.aclose()
+        headers = storable_headers(response.headers)
+        await asyncio.to_thread(self.cache.put, url, CachedResponse(etag, last_modified, headers, body))
+        return httpx.Response(200, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+        self.cache.close()
@@ -0,0 +1,208 @@
+"""A durable journal of the tickets completed since the last checkpoint.
+
+The export cursor is only checkpointed once every ticket of a page is done,
+so a run that stops in the middle of a page would otherwise redo the tickets
+of that page it had already finished. The journal records each completed
+ticket with its `updated_at`, and a restarted run skips the tickets whose
+current version is in it.
+
+Entries are appended in batches, each written with a single write and
+followed by an fsync, so a crash loses at most the last unflushed batch and
+never leaves more than one torn line, which is ignored when the journal is
+read back. Once a page is checkpointed, its entries are no longer needed and
+the journal is compacted.
+
+The journal also keeps the watermark of the run: the greatest `updated_at`
+among the tickets of the checkpointed pages.
+
+When another output only makes tickets durable at checkpoints, such as the
+Parquet export, a ticket completed on a page that is not checkpointed yet may
+still be lost in a crash. The journal is then opened with
+`skip_completed=False`: it only keeps the watermark, and a restarted run
+redoes the whole page.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zendesk_extractor.core.exceptions import FileSaveError
+
+JOURNAL_PATH = "run_journal.jsonl"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+class TicketJournal:
+    """The completed tickets of the pages that are not checkpointed yet.
+
+    The journal is safe to share between threads.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH, batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL, clock: Callable[[], float] = time.monotonic,
+                 skip_completed: bool = True):
+        """Opens the journal, reading the entries left by an interrupted run.
+
+        Args:
+            path: The journal file.
+            batch_size: The number of entries buffered before they are
+                        written and synced.
+            flush_interval: The most seconds an entry stays buffered, as long
+                            as tickets keep completing.
+            clock: Returns the current time in seconds.
+            skip_completed: Whether completed tickets are written to the
+                            journal and skipped by a restarted run. If not,
+                            they only count towards the watermark.
+
+        Raises:
+            FileSaveError: If the journal cannot be opened.
+        """
+        self.path = path
+        self.skip_completed = skip_completed
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.watermark = None
+        self._clock = clock
+        self._last_flush = clock()
+        # ticket_id -> (updated_at, page). Entries read back from an earlier
+        # run have no page until their ticket comes up again.
+        self._entries: Dict[int, Tuple[Optional[str], Optional[int]]] = {}
+        self._buffer: List[bytes] = []
+        self._lock = threading.Lock()
+        if skip_completed:
+            self._load()
+        try:
+            self._file = open(path, "ab")
+        except OSError as e:
+            raise FileSaveError(f"Could not open the run journal {path}: {e}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            raise FileSaveError(f"Could not read the run journal {self.path}: {e}")
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                self._entries[entry["ticket_id"]] = (entry.get("updated_at"), None)
+            except (ValueError, KeyError, TypeError):
+                logging.warning(f"Ignoring a damaged line of the run journal {self.path}.")
+        if self._entries:
+            logging.info(f"Resuming: {len(self._entries)} tickets were completed before the previous run stopped.")
+
+    @staticmethod
+    def _line(ticket_id: int, updated_at: Optional[str]) -> bytes:
+        return json.dumps({"ticket_id": ticket_id, "updated_at": updated_at}).encode("utf-8") + b"\n"
+
+    def skip(self, ticket: Dict[str, Any], page: int) -> bool:
+        """Returns whether this version of a ticket was already completed.
+
+        A ticket that is skipped counts as completed on `page`. Nothing is
+        skipped if the journal was opened with `skip_completed=False`.
+        """
+        if not self.skip_completed:
+            return False
+        with self._lock:
+            entry = self._entries.get(ticket["id"])
+            if entry is None or entry[0] is None or entry[0] != ticket.get("updated_at"):
+                return False
+            self._entries[ticket["id"]] = (entry[0], page)
+            return True
+
+    def record(self, ticket: Dict[str, Any], page: int) -> None:
+        """Records a completed ticket, writing the buffered entries when a batch is full.
+
+        Raises:
+            FileSaveError: If a batch cannot be written.
+        """
+        with self._lock:
+            self._entries[ticket["id"]] = (ticket.get("updated_at"), page)
+            if not self.skip_completed:
+                return
+            self._buffer.append(self._line(ticket["id"], ticket.get("updated_at")))
+            if len(self._buffer) >= self.batch_size or self._clock() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        """Writes and syncs the buffered entries.
+
+        Raises:
+            FileSaveError: If they cannot be written.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = self._clock()
+        if not self._buffer:
+            return
+        batch = b"".join(self._buffer)
+        self._buffer = []
+        try:
+            self._file.write(batch)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            raise FileSaveError(f"Could not write the run journal {self.path}: {e}")
+
+    def checkpoint(self, page: int) -> Optional[str]:
+        """Drops the entries of the pages up to `page`, once their cursor is checkpointed.
+
+        The remaining entries are written to a new file that replaces the
+        journal, so the journal is never left half compacted.
+
+        Args:
+            page: The last checkpointed page.
+
+        Returns:
+            The watermark: the greatest `updated_at` of the tickets completed
+            on the checkpointed pages so far, or None if there is none yet.
+
+        Raises:
+            FileSaveError: If the journal cannot be rewritten.
+        """
+        with self._lock:
+            done = [ticket_id for ticket_id, (_, entry_page) in self._entries.items() if entry_page is not None and entry_page <= page]
+            for ticket_id in done:
+                updated_at = self._entries.pop(ticket_id)[0]
+                if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                    self.watermark = updated_at
+            if done:
+                self._rewrite()
+            return self.watermark
+
+    def _rewrite(self) -> None:
+        self._buffer = []
+        tmp_path = f"{self.path}.tmp"
+        try:
+            self._file.close()
+            with open(tmp_path, "wb") as f:
+                if self.skip_completed:
+                    f.write(b"".join(self._line(ticket_id, updated_at) for ticket_id, (updated_at, _) in self._entries.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "ab")
+        except OSError as e:
+            raise FileSaveError(f"Could not compact the run journal {self.path}: {e}")
+
+    def close(self, finished: bool = False) -> None:
+        """Writes the buffered entries and closes the journal.
+
+        Args:
+            finished: Whether the run reached the end of the export with every
+                      page checkpointed. The journal is then removed.
+        """
+        with self._lock:
+            try:
+                self._flush()
+            finally:
+                self._file.close()
+            if finished:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
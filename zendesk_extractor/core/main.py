@@ -1,27 +1,68 @@
 import os
-import json
+import time
 import requests
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Iterable, Iterator, Tuple
 from requests import Session
 from zendesk_extractor.core.transformation import transform_to_structured_json, convert_to_xml
-from zendesk_extractor.core.models import Ticket
-from dataclasses import asdict
+from zendesk_extractor.core.models import Person, Ticket
+from zendesk_extractor.core import serializers, metrics
+from zendesk_extractor.core.shards import ShardWriter, SHARD_DIRECTORY, DEFAULT_SHARD_MAX_BYTES, DEFAULT_SHARD_MAX_TICKETS
+from zendesk_extractor.core.columnar import ColumnarWriter, PARQUET_DIRECTORY, DEFAULT_ROW_GROUP_SIZE
+from zendesk_extractor.core.output import RunOutput, OUTPUT_DIRECTORY
+from zendesk_extractor.core.accounts import Account, get_accounts, get_default_account
+from zendesk_extractor.core.bodies import BodyStore, BODY_DIRECTORY, DEFAULT_MIN_BODY_BYTES, apply_body_refs
+from zendesk_extractor.core.compression import check_compression, find_file, read_file, remove_file, write_file
+from zendesk_extractor.core.progress import Progress
+from zendesk_extractor.core.process_pool import BatchProcessPool, DEFAULT_BATCH_SIZE
+from zendesk_extractor.core.journal import TicketJournal, JOURNAL_PATH
+from zendesk_extractor.core.backfill import BackfillCoordinator, Slice, BACKFILL_DIRECTORY, DEFAULT_SLICE_DAYS, clip_pages, format_time, parse_time, run_backfill_worker
+from zendesk_extractor.core.store import TicketStore, StoredTicket, STORE_PATH, content_hash
+from zendesk_extractor.core.ticket_index import TicketIndex, INDEX_PATH
+from zendesk_extractor.core.people import PeopleCache, PEOPLE_CACHE_PATH, DEFAULT_TTL_SECONDS, attach_people, chunked, ticket_user_ids
+from zendesk_extractor.core.scheduler import RateLimitScheduler, RateLimitedAdapter
+from zendesk_extractor.core.http_cache import HttpCache, CachingAdapter, HTTP_CACHE_PATH, DEFAULT_MAX_BYTES
+from zendesk_extractor.core.pipeline import PageTracker, PipelineItem, stream_pages, run_bounded
+from zendesk_extractor.core.bulk_comments import CommentEventStream, fetch_comment_events, merge_comments
 from zendesk_extractor.core.exceptions import ZendeskAPIError
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def get_zendesk_session() -> Session:
+DEFAULT_MAX_WORKERS = 8
+LAST_RUN_FILE = "last_run.txt"
+CURSOR_FILE = "last_cursor.txt"
+EXPORT_PAGE_SIZE = 1000
+PROGRESS_LOG_INTERVAL = 1000
+OUTPUT_MODES = ("files", "shards")
+
+def get_zendesk_session(pool_size: int = 10, account: Optional[Account] = None, http_cache: Optional[HttpCache] = None) -> Session:
     """Creates and returns a requests.Session object for interacting with the Zendesk API.
 
     This function retrieves Zendesk API credentials (domain, email, and token) from
     environment variables, validates their presence, and initializes a requests.Session
     object with the necessary authentication headers and base URL.
 
+    Every request made through the session goes through a shared
+    `RateLimitScheduler`, which keeps the session under the account's rate
+    limit and retries 429 and transient 5xx responses.
+
+    Args:
+        pool_size: The maximum number of pooled connections kept open to the
+                   Zendesk host, and the most requests the scheduler lets run
+                   at once. This should be at least the number of threads
+                   sharing the session.
+        account: The account to connect to. Defaults to the account
+                 configured by ZENDESK_DOMAIN, ZENDESK_EMAIL and
+                 ZENDESK_API_TOKEN.
+        http_cache: The cache GET requests are revalidated against, if any.
+                    Responses that have not changed are then read from it.
+
     Returns:
         A requests.Session object configured for the Zendesk API.
 
@@ -30,9 +71,7 @@ def get_zendesk_session() -> Session:
                          variables or if the session creation fails.
     """
     try:
-        domain = os.getenv("ZENDESK_DOMAIN")
-        email = os.getenv("ZENDESK_EMAIL")
-        token = os.getenv("ZENDESK_API_TOKEN")
+        _, domain, email, token = account or get_default_account()
 
         if not all([domain, email, token]):
             raise ZendeskAPIError("Zendesk API credentials not found in environment variables.")
@@ -40,16 +79,63 @@ def get_zendesk_session() -> Session:
         session = requests.Session()
         session.auth = (f"{email}/token", token)
         session.headers.update({"Accept": "application/json"})
+        session.scheduler = RateLimitScheduler(max_concurrency=pool_size)
+        if http_cache is not None:
+            adapter = CachingAdapter(http_cache, session.scheduler, pool_connections=1, pool_maxsize=pool_size)
+        else:
+            adapter = RateLimitedAdapter(session.scheduler, pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
         session.base_url = f"https://{domain}.zendesk.com/api/v2"
         return session
     except Exception as e:
         raise ZendeskAPIError(f"Failed to create Zendesk session: {e}")
 
+def iter_tickets(session: Session, start_time: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yields tickets from the Zendesk search API, one page at a time.
+
+    Only the current page is held in memory, so callers can start processing
+    the first tickets before pagination has finished.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        start_time: An optional ISO 8601 formatted date string to filter tickets
+                    updated after this time.
+
+    Yields:
+        Ticket dictionaries, in the order returned by the API.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching tickets from the API.
+    """
+    url = f"{session.base_url}/search.json"
+    params = {}
+
+    if start_time:
+        params["query"] = f"type:ticket updated>={start_time}"
+
+    while url:
+        try:
+            response = session.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            raise ZendeskAPIError(f"An error occurred while fetching tickets: {e}")
+
+        yield from data["results"]
+
+        if data.get("meta", {}).get("has_more"):
+            url = data["links"]["next"]
+            params = {}  # Clear params for subsequent requests as the full URL is provided
+        else:
+            url = None
+
+
 def fetch_tickets(session: Session, start_time: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
     """Retrieves a list of tickets from Zendesk, handling API pagination.
 
     This function queries the Zendesk search API for tickets created after a specified
-    time. It automatically handles pagination to fetch all available tickets.
+    time. It automatically handles pagination to fetch all available tickets. Use
+    `iter_tickets` to process tickets without holding all of them in memory.
 
     Args:
         session: The requests.Session object for making API calls.
@@ -62,32 +148,56 @@ def fetch_tickets(session: Session, start_time: Optional[str] = None) -> Optiona
     Raises:
         ZendeskAPIError: If an error occurs while fetching tickets from the API.
     """
-    tickets = []
-    url = f"{session.base_url}/search.json"
-    params = {}
+    return list(iter_tickets(session, start_time=start_time))
 
-    if start_time:
-        params["query"] = f"type:ticket updated>={start_time}"
+def fetch_ticket_export(session: Session, cursor: Optional[str] = None, start_time: Optional[int] = None, per_page: int = EXPORT_PAGE_SIZE) -> Iterator[Tuple[List[Dict[str, Any]], str]]:
+    """Yields pages of tickets from the cursor-based Incremental Ticket Export API.
+
+    The export returns every ticket that changed after the given cursor (or
+    start time), in large pages and without overlap between runs. Each page is
+    yielded together with the cursor that points just past it, so callers can
+    checkpoint once the page has been handled.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        cursor: The opaque cursor returned by a previous export. Takes
+                precedence over `start_time`.
+        start_time: A Unix timestamp to start the export from when there is
+                    no cursor yet.
+        per_page: The number of tickets requested per page (at most 1000).
+
+    Yields:
+        Tuples of (tickets, after_cursor) for each page.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching tickets from the API.
+    """
+    url = f"{session.base_url}/incremental/tickets/cursor.json"
+    params = {"per_page": per_page}
+
+    if cursor:
+        params["cursor"] = cursor
+    else:
+        params["start_time"] = start_time or 0
 
     while url:
         try:
             response = session.get(url, params=params)
             response.raise_for_status()
             data = response.json()
-            tickets.extend(data["results"])
+        except requests.exceptions.RequestException as e:
+            raise ZendeskAPIError(f"An error occurred while exporting tickets: {e}")
 
-            if data.get("meta", {}).get("has_more"):
-                url = data["links"]["next"]
-                params = {}  # Clear params for subsequent requests as the full URL is provided
-            else:
-                url = None
+        yield data["tickets"], data["after_cursor"]
 
-        except requests.exceptions.RequestException as e:
-            raise ZendeskAPIError(f"An error occurred while fetching tickets: {e}")
+        if data.get("end_of_stream"):
+            url = None
+        else:
+            url = data["after_url"]
+            params = None  # The after_url already carries the cursor
 
-    return tickets
 
-def fetch_ticket_comments(session: Session, ticket_id: int) -> Optional[List[Dict[str, Any]]]:
+def fetch_ticket_comments(session: Session, ticket_id: int, after_id: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
     """Retrieves all comments for a single ticket, handling pagination.
 
     This function fetches all comments for a given ticket ID, automatically
@@ -96,9 +206,13 @@ def fetch_ticket_comments(session: Session, ticket_id: int) -> Optional[List[Dic
     Args:
         session: The requests.Session object for making API calls.
         ticket_id: The ID of the ticket to fetch comments for.
+        after_id: If given, only the comments newer than this comment are
+                  fetched. They are read newest first and pagination stops at
+                  the first comment that is not newer.
 
     Returns:
-        A list of comment dictionaries, or None if no comments are found.
+        A list of comment dictionaries, oldest first, or None if no comments
+        are found.
 
     Raises:
         ZendeskAPIError: If the ticket is not found or an error occurs while
@@ -106,14 +220,21 @@ def fetch_ticket_comments(session: Session, ticket_id: int) -> Optional[List[Dic
     """
     comments = []
     url = f"{session.base_url}/tickets/{ticket_id}/comments.json"
+    params = {"sort_order": "desc"} if after_id is not None else None
 
     while url:
         try:
-            response = session.get(url)
+            response = session.get(url, params=params)
             response.raise_for_status()
             data = response.json()
-            comments.extend(data["comments"])
-            url = data.get("next_page")
+            if after_id is None:
+                comments.extend(data["comments"])
+                url = data.get("next_page")
+            else:
+                comments.extend(comment for comment in data["comments"] if comment["id"] > after_id)
+                reached = any(comment["id"] <= after_id for comment in data["comments"])
+                url = None if reached else data.get("next_page")
+            params = None  # The next_page URL already carries the sort order
 
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
@@ -123,39 +244,171 @@ def fetch_ticket_comments(session: Session, ticket_id: int) -> Optional[List[Dic
         except requests.exceptions.RequestException as e:
             raise ZendeskAPIError(f"An error occurred while fetching comments for ticket {ticket_id}: {e}")
 
+    if after_id is not None:
+        comments.reverse()
     return comments
 
 
+def fetch_users(session: Session, user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Retrieves users by ID with the `show_many` endpoint.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        user_ids: At most SHOW_MANY_LIMIT user IDs.
+
+    Returns:
+        The users that exist, in no particular order.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching the users.
+    """
+    try:
+        response = session.get(f"{session.base_url}/users/show_many.json", params={"ids": ",".join(map(str, user_ids))})
+        response.raise_for_status()
+        return response.json()["users"]
+    except requests.exceptions.RequestException as e:
+        raise ZendeskAPIError(f"An error occurred while fetching users: {e}")
+
+
+def fetch_organizations(session: Session, organization_ids: List[int]) -> List[Dict[str, Any]]:
+    """Retrieves organizations by ID with the `show_many` endpoint.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        organization_ids: At most SHOW_MANY_LIMIT organization IDs.
+
+    Returns:
+        The organizations that exist, in no particular order.
+
+    Raises:
+        ZendeskAPIError: If an error occurs while fetching the organizations.
+    """
+    try:
+        response = session.get(f"{session.base_url}/organizations/show_many.json", params={"ids": ",".join(map(str, organization_ids))})
+        response.raise_for_status()
+        return response.json()["organizations"]
+    except requests.exceptions.RequestException as e:
+        raise ZendeskAPIError(f"An error occurred while fetching organizations: {e}")
+
+
+def resolve_people(session: Session, people: PeopleCache, user_ids: List[int]) -> Dict[int, Person]:
+    """Looks up the users and organizations the cache does not know yet.
+
+    A failed lookup is logged and leaves the people it was for out, so
+    enrichment never fails a ticket.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        people: The run's people cache.
+        user_ids: The IDs of the requesters, assignees and comment authors.
+
+    Returns:
+        The people that could be resolved, by user ID.
+
+    Raises:
+        FileSaveError: If the cache cannot be read or written.
+    """
+    try:
+        for chunk in chunked(people.missing_users(user_ids)):
+            people.add_users(chunk, fetch_users(session, chunk))
+        for chunk in chunked(people.missing_organizations(user_ids)):
+            people.add_organizations(chunk, fetch_organizations(session, chunk))
+    except ZendeskAPIError as e:
+        logging.warning(f"Could not look up users or organizations, saving tickets without them: {e}")
+    return people.people(user_ids)
+
+
 from zendesk_extractor.core.exceptions import FileSaveError
 
-def save_data_to_file(ticket_id: int, data: Any, file_extension: str) -> None:
+def save_data_to_file(ticket_id: int, data: Any, file_extension: str, output_directory: str = OUTPUT_DIRECTORY, body_refs: Optional[Dict[int, str]] = None) -> int:
     """Saves data to a file with the given extension.
 
     This function saves the given data to a file in the corresponding
     `output/{file_extension}` directory. The filename is based on the ticket ID.
+    Tickets saved as JSON are encoded with the fastest available JSON backend,
+    compacted if ZENDESK_JSON_COMPACT is set. Other data is written as UTF-8.
+    The file is compressed according to ZENDESK_FILE_COMPRESSION.
 
     Args:
         ticket_id: The ID of the ticket, used for the filename.
         data: The data to be saved.
         file_extension: The extension of the file (e.g., "json" or "xml").
+        output_directory: The directory holding the `json` and `xml`
+                          directories of the account.
+        body_refs: The `body_ref` of the comments whose bodies are stored
+                   separately, which a JSON file holds instead of the bodies.
+
+    Returns:
+        The number of bytes written.
 
     Raises:
         FileSaveError: If an error occurs while saving the file.
     """
     try:
-        directory = f"output/{file_extension}"
+        directory = os.path.join(output_directory, file_extension)
         os.makedirs(directory, exist_ok=True)
         filepath = os.path.join(directory, f"{ticket_id}.{file_extension}")
-        with open(filepath, "w") as f:
-            if file_extension == "json":
-                json.dump(asdict(data), f, indent=2)
-            else:
-                f.write(data)
+        if file_extension == "json":
+            ticket = data.to_dict()
+            if body_refs:
+                apply_body_refs(ticket, body_refs)
+            payload = serializers.dumps(ticket, compact=get_json_compact())
+        else:
+            payload = data.encode("utf-8")
+        return write_file(filepath, payload, get_file_compression())
     except (IOError, OSError) as e:
         raise FileSaveError(f"Error saving {file_extension.upper()} file for ticket {ticket_id}: {e}")
 
 
-def save_as_json(ticket_id: int, data: Ticket) -> None:
+def load_saved_ticket(ticket_id: int, output: Optional[RunOutput] = None) -> Optional[Dict[str, Any]]:
+    """Loads the previously saved JSON copy of a ticket.
+
+    Args:
+        ticket_id: The ID of the ticket.
+        output: The outputs of the run. The ticket is read from the ticket
+                store if it has one, and from the shards instead of its JSON
+                file if tickets are written to shards.
+
+    Returns:
+        The saved ticket as a dictionary, or None if it has not been saved yet
+        or the file cannot be read.
+    """
+    if output is not None and output.store is not None:
+        saved = output.store.load(ticket_id)
+        if saved is not None:
+            return saved
+    if output is not None and output.shards is not None:
+        return output.shards.load(ticket_id)
+    directory = output.directory if output is not None else OUTPUT_DIRECTORY
+    path = find_file(os.path.join(directory, "json", f"{ticket_id}.json"))
+    if path is None:
+        return None
+    try:
+        return BodyStore(os.path.join(directory, BODY_DIRECTORY)).restore(serializers.loads(read_file(path)))
+    except (IOError, OSError, ValueError, ZendeskExtractorError):
+        return None
+
+
+def load_saved_tickets(tickets: List[Dict[str, Any]], output: Optional[RunOutput] = None) -> Dict[int, Dict[str, Any]]:
+    """Loads the previously saved copies of several tickets.
+
+    Args:
+        tickets: The raw ticket dictionaries to look up.
+        output: The outputs of the run, if any.
+
+    Returns:
+        A mapping of ticket ID to saved ticket, for the tickets that have been
+        saved before.
+    """
+    saved_tickets = {}
+    for ticket in tickets:
+        saved = load_saved_ticket(ticket["id"], output)
+        if saved:
+            saved_tickets[ticket["id"]] = saved
+    return saved_tickets
+
+
+def save_as_json(ticket_id: int, data: Ticket, output_directory: str = OUTPUT_DIRECTORY, body_refs: Optional[Dict[int, str]] = None) -> int:
     """Saves the structured data as a JSON file.
 
     This function saves the given Ticket object as a JSON file by calling
@@ -164,11 +417,17 @@ def save_as_json(ticket_id: int, data: Ticket) -> None:
     Args:
         ticket_id: The ID of the ticket, used for the filename.
         data: The Ticket object to be saved.
+        output_directory: The directory the `json` directory is in.
+        body_refs: The `body_ref` of the comments whose bodies are stored
+                   separately.
+
+    Returns:
+        The number of bytes written.
     """
-    save_data_to_file(ticket_id, data, "json")
+    return save_data_to_file(ticket_id, data, "json", output_directory, body_refs)
 
 
-def save_as_xml(ticket_id: int, xml_string: str) -> None:
+def save_as_xml(ticket_id: int, xml_string: str, output_directory: str = OUTPUT_DIRECTORY) -> int:
     """Saves the XML data as an XML file.
 
     This function saves the given XML string as an XML file by calling
@@ -177,71 +436,1118 @@ def save_as_xml(ticket_id: int, xml_string: str) -> None:
     Args:
         ticket_id: The ID of the ticket, used for the filename.
         xml_string: The XML content to be saved.
+        output_directory: The directory the `xml` directory is in.
+
+    Returns:
+        The number of bytes written.
     """
-    save_data_to_file(ticket_id, xml_string, "xml")
+    return save_data_to_file(ticket_id, xml_string, "xml", output_directory)
 
 
 from zendesk_extractor.core.exceptions import ZendeskExtractorError
 
-def main() -> None:
-    """Main function to orchestrate the Zendesk ticket processing.
+def get_env_int(name: str, default: int) -> int:
+    """Reads a positive integer setting from the environment.
 
-    This function orchestrates the entire process of fetching tickets from Zendesk,
-    transforming them into structured JSON and XML formats, and saving them to files.
-    It handles errors gracefully and logs the progress.
+    Args:
+        name: The name of the environment variable.
+        default: The value to use if the variable is not set or invalid.
+
+    Returns:
+        The value of the variable, or `default` if it is not set or is not a
+        positive integer.
     """
+    value = os.getenv(name)
+    if value is None:
+        return default
     try:
-        session = get_zendesk_session()
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        logging.warning(f"Invalid {name} value {value!r}. Using {default}.")
+        return default
+    return number
 
-        last_run_file = "last_run.txt"
-        try:
-            with open(last_run_file, "r") as f:
-                start_date = f.read().strip()
-        except FileNotFoundError:
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
 
-        tickets = fetch_tickets(session, start_time=start_date)
+def get_max_workers() -> int:
+    """Reads the number of concurrently processed tickets from the environment.
+
+    Returns:
+        The value of the ZENDESK_MAX_WORKERS environment variable, or
+        DEFAULT_MAX_WORKERS if it is not set or is not a positive integer.
+    """
+    return get_env_int("ZENDESK_MAX_WORKERS", DEFAULT_MAX_WORKERS)
+
+
+def get_env_flag(name: str, default: bool = False) -> bool:
+    """Reads a boolean setting from the environment.
+
+    Args:
+        name: The name of the environment variable.
+        default: The value to use if the variable is not set.
+
+    Returns:
+        True if the variable is set to "1", "true", "yes" or "on", ignoring
+        case, False if it is set to anything else, and `default` if it is
+        not set.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_bulk_comments() -> bool:
+    """Reads whether comments should be fetched in bulk from the environment.
+
+    Returns:
+        True if the ZENDESK_BULK_COMMENTS environment variable is set to a
+        true value ("1", "true", "yes" or "on"), False otherwise.
+    """
+    return get_env_flag("ZENDESK_BULK_COMMENTS")
+
+
+def get_json_compact() -> bool:
+    """Reads whether JSON files should be written without indentation.
+
+    Returns:
+        True if the ZENDESK_JSON_COMPACT environment variable is set to a true
+        value ("1", "true", "yes" or "on"), False otherwise.
+    """
+    return get_env_flag("ZENDESK_JSON_COMPACT")
+
+
+def get_file_compression() -> Optional[str]:
+    """Reads how the per-ticket files are compressed from the environment.
+
+    Returns:
+        "gzip" or "zstd" if ZENDESK_FILE_COMPRESSION is set to one of them,
+        None if it is not set or is "none".
+
+    Raises:
+        ZendeskExtractorError: If the compression is unknown, or is "zstd" and
+                               the zstandard package is not installed.
+    """
+    compression = os.getenv("ZENDESK_FILE_COMPRESSION", "").strip().lower()
+    compression = None if compression in ("", "none") else compression
+    check_compression(compression, "file")
+    return compression
+
+
+def get_dedup_min_bytes() -> Optional[int]:
+    """Reads whether long comment bodies are deduplicated from the environment.
+
+    Returns:
+        The size in bytes from which comment bodies are stored once in
+        `output/bodies` (ZENDESK_DEDUP_MIN_BYTES, DEFAULT_MIN_BODY_BYTES by
+        default) if ZENDESK_DEDUP_BODIES is set to a true value, None
+        otherwise.
+    """
+    if not get_env_flag("ZENDESK_DEDUP_BODIES"):
+        return None
+    return get_env_int("ZENDESK_DEDUP_MIN_BYTES", DEFAULT_MIN_BODY_BYTES)
+
+
+def get_lazy_xml() -> bool:
+    """Reads whether the XML files are left to the web interface from the environment.
+
+    Returns:
+        True if the ZENDESK_LAZY_XML environment variable is set to a true
+        value ("1", "true", "yes" or "on"), False otherwise. The web interface
+        then renders a ticket's XML from its JSON file when it is requested.
+    """
+    return get_env_flag("ZENDESK_LAZY_XML")
+
+
+def get_http_cache(account: Optional[Account] = None) -> Optional[HttpCache]:
+    """Opens the cache of API responses for a run from the environment.
+
+    The cache is used when ZENDESK_HTTP_CACHE is set to a true value. It is
+    kept in ZENDESK_HTTP_CACHE_PATH, `output/http_cache.db` by default, and
+    holds at most ZENDESK_HTTP_CACHE_MAX_BYTES bytes of response bodies,
+    256 MiB by default.
+
+    Args:
+        account: The account whose responses are cached. Defaults to the
+                 default account.
+
+    Returns:
+        An `HttpCache`, or None if the cache is disabled.
+    """
+    if not get_env_flag("ZENDESK_HTTP_CACHE"):
+        return None
+    return HttpCache(
+        (account or get_default_account()).path(HTTP_CACHE_PATH, "ZENDESK_HTTP_CACHE_PATH"),
+        max_bytes=get_env_int("ZENDESK_HTTP_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+    )
+
+
+def get_people_cache(account: Optional[Account] = None) -> Optional[PeopleCache]:
+    """Opens the people cache for a run from the environment.
+
+    Tickets are enriched with the names, emails and organizations of their
+    people when ZENDESK_ENRICH_PEOPLE is set to a true value. The lookups are
+    cached in ZENDESK_PEOPLE_CACHE_PATH, `output/people.db` by default, for
+    ZENDESK_PEOPLE_CACHE_TTL seconds, a week by default.
+
+    Args:
+        account: The account whose people are cached. Defaults to the default
+                 account.
+
+    Returns:
+        A `PeopleCache`, or None if enrichment is disabled.
+    """
+    if not get_env_flag("ZENDESK_ENRICH_PEOPLE"):
+        return None
+    return PeopleCache(
+        (account or get_default_account()).path(PEOPLE_CACHE_PATH, "ZENDESK_PEOPLE_CACHE_PATH"),
+        ttl=get_env_int("ZENDESK_PEOPLE_CACHE_TTL", DEFAULT_TTL_SECONDS),
+    )
+
+
+def get_shard_writer(account: Optional[Account] = None) -> Optional[ShardWriter]:
+    """Creates the shard writer for a run from the environment.
+
+    Tickets are written to shards when ZENDESK_OUTPUT_MODE is "shards". The
+    shards are compressed according to ZENDESK_SHARD_COMPRESSION ("gzip" or
+    "zstd") and rotated after ZENDESK_SHARD_MAX_BYTES bytes or
+    ZENDESK_SHARD_MAX_TICKETS tickets.
+
+    Args:
+        account: The account whose shards are written. Defaults to the
+                 default account.
+
+    Returns:
+        A `ShardWriter`, or None if tickets are saved one file per ticket.
+
+    Raises:
+        ZendeskExtractorError: If the output mode or compression is invalid.
+    """
+    mode = os.getenv("ZENDESK_OUTPUT_MODE", "files").strip().lower()
+    if mode not in OUTPUT_MODES:
+        raise ZendeskExtractorError(f"Unknown ZENDESK_OUTPUT_MODE {mode!r}. Use one of: {', '.join(OUTPUT_MODES)}.")
+    if mode != "shards":
+        return None
+    compression = os.getenv("ZENDESK_SHARD_COMPRESSION", "").strip().lower()
+    return ShardWriter(
+        directory=(account or get_default_account()).path(SHARD_DIRECTORY),
+        compression=None if compression in ("", "none") else compression,
+        max_bytes=get_env_int("ZENDESK_SHARD_MAX_BYTES", DEFAULT_SHARD_MAX_BYTES),
+        max_tickets=get_env_int("ZENDESK_SHARD_MAX_TICKETS", DEFAULT_SHARD_MAX_TICKETS),
+    )
+
+
+def get_columnar_writer(account: Optional[Account] = None) -> Optional[ColumnarWriter]:
+    """Creates the Parquet writer for a run from the environment.
+
+    Tickets are exported to Parquet when ZENDESK_PARQUET is set to a true
+    value, in row groups of ZENDESK_PARQUET_ROW_GROUP_SIZE rows.
+
+    Args:
+        account: The account whose tickets are exported. Defaults to the
+                 default account.
+
+    Returns:
+        A `ColumnarWriter` for a new partition, or None if the Parquet export
+        is disabled.
+
+    Raises:
+        ZendeskExtractorError: If pyarrow is not installed.
+    """
+    if not get_env_flag("ZENDESK_PARQUET"):
+        return None
+    return ColumnarWriter(
+        directory=(account or get_default_account()).path(PARQUET_DIRECTORY),
+        row_group_size=get_env_int("ZENDESK_PARQUET_ROW_GROUP_SIZE", DEFAULT_ROW_GROUP_SIZE),
+    )
+
+
+def get_ticket_store(account: Optional[Account] = None) -> Optional[TicketStore]:
+    """Opens the ticket store for a run from the environment.
+
+    The store is used when ZENDESK_STORE is set to a true value. It is kept in
+    ZENDESK_STORE_PATH, `output/tickets.db` by default.
+
+    Args:
+        account: The account whose tickets are stored. Defaults to the
+                 default account.
+
+    Returns:
+        A `TicketStore`, or None if the store is disabled.
+
+    Raises:
+        FileSaveError: If the database cannot be opened.
+    """
+    if not get_env_flag("ZENDESK_STORE"):
+        return None
+    return TicketStore((account or get_default_account()).path(STORE_PATH, "ZENDESK_STORE_PATH"))
+
+
+def get_ticket_index(account: Optional[Account] = None) -> Optional[TicketIndex]:
+    """Returns the index searched by the web interface, unless it is disabled.
+
+    The index is kept in ZENDESK_INDEX_PATH, `output/index.db` by default, and
+    is not maintained if ZENDESK_INDEX is set to a false value. Each named
+    account has an index of its own.
+    """
+    if not get_env_flag("ZENDESK_INDEX", default=True):
+        return None
+    return TicketIndex((account or get_default_account()).path(INDEX_PATH, "ZENDESK_INDEX_PATH"))
+
+
+def get_ticket_journal(account: Optional[Account] = None, skip_completed: bool = True) -> TicketJournal:
+    """Opens the journal of the run, kept in ZENDESK_JOURNAL_PATH (`run_journal.jsonl` by default).
+
+    Named accounts keep their journals in their own directories.
+
+    Args:
+        account: The account of the run. Defaults to the default account.
+        skip_completed: Whether a restarted run skips the tickets completed
+                        on pages that were not checkpointed. Runs exporting
+                        to Parquet turn this off, since their rows are only
+                        durable at checkpoints.
+
+    Raises:
+        FileSaveError: If the journal cannot be opened.
+    """
+    return TicketJournal((account or get_default_account()).path(JOURNAL_PATH, "ZENDESK_JOURNAL_PATH"), skip_completed=skip_completed)
+
+
+def get_process_pool() -> Optional[BatchProcessPool]:
+    """Starts the worker processes tickets are transformed and written in, if they are enabled.
+
+    Set ZENDESK_PROCESS_WORKERS to the number of worker processes to move
+    transforming tickets and writing their JSON and XML files off the threads
+    that fetch them. Tickets are sent to the workers in batches of
+    ZENDESK_PROCESS_BATCH_SIZE.
+
+    Returns:
+        A `BatchProcessPool`, or None if ZENDESK_PROCESS_WORKERS is not set or
+        is not a positive integer, in which case tickets are transformed in the
+        fetching threads.
+    """
+    if os.getenv("ZENDESK_PROCESS_WORKERS", "0").strip() == "0":
+        return None
+    workers = get_env_int("ZENDESK_PROCESS_WORKERS", 0)
+    if not workers:
+        return None
+    return BatchProcessPool(
+        render_batch,
+        workers=workers,
+        batch_size=get_env_int("ZENDESK_PROCESS_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+    )
+
+
+def get_run_output(account: Optional[Account] = None, workers: Optional[BatchProcessPool] = None) -> RunOutput:
+    """Creates the outputs of a run from the environment.
+
+    Args:
+        account: The account whose tickets are saved. Defaults to the default
+                 account.
+        workers: The worker processes tickets are transformed and written in,
+                 if any. They are shared by every account of the run.
+
+    Raises:
+        ZendeskExtractorError: If the output settings are invalid.
+    """
+    account = account or get_default_account()
+    # Checked here, so an invalid setting stops the run instead of failing every ticket.
+    get_file_compression()
+    return RunOutput(
+        shards=get_shard_writer(account), tables=get_columnar_writer(account), store=get_ticket_store(account), index=get_ticket_index(account),
+        workers=workers, directory=account.path(OUTPUT_DIRECTORY), dedup_min_bytes=get_dedup_min_bytes(), lazy_xml=get_lazy_xml(),
+        people=get_people_cache(account),
+    )
+
 
-        if not tickets:
-            logging.info("No tickets found for the specified period.")
-            return
+def read_last_run(last_run_file: str = LAST_RUN_FILE) -> str:
+    """Reads the start date of the next incremental run.
 
-        logging.info(f"Found {len(tickets)} tickets.")
+    Args:
+        last_run_file: The file the previous run wrote its timestamp to.
+
+    Returns:
+        The timestamp stored by the previous run, or the date 30 days ago if
+        there was no previous run or the file is empty.
+    """
+    try:
+        with open(last_run_file, "r") as f:
+            timestamp = f.read().strip()
+    except FileNotFoundError:
+        timestamp = ""
+    return timestamp or default_start_date()
+
+
+def default_start_date() -> str:
+    """Returns the date 30 days ago, where runs without a watermark start."""
+    return (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+
+def read_cursor(cursor_file: str = CURSOR_FILE) -> Optional[str]:
+    """Reads the export cursor checkpointed by the previous run.
+
+    Args:
+        cursor_file: The file the cursor is stored in.
+
+    Returns:
+        The stored cursor, or None if no cursor has been checkpointed yet.
+    """
+    try:
+        with open(cursor_file, "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_cursor(cursor: str, cursor_file: str = CURSOR_FILE) -> None:
+    """Atomically checkpoints the export cursor.
+
+    The cursor is written to a temporary file that then replaces the
+    checkpoint, so a crash never leaves a truncated cursor behind.
+
+    Args:
+        cursor: The opaque cursor returned by the export API.
+        cursor_file: The file the cursor is stored in.
+    """
+    tmp_file = f"{cursor_file}.tmp"
+    with open(tmp_file, "w") as f:
+        f.write(cursor)
+    os.replace(tmp_file, cursor_file)
+
+
+def write_last_run(timestamp: str, last_run_file: str = LAST_RUN_FILE) -> None:
+    """Atomically records the watermark of the run.
+
+    Args:
+        timestamp: The greatest `updated_at` of the checkpointed tickets.
+        last_run_file: The file the watermark is stored in.
+    """
+    tmp_file = f"{last_run_file}.tmp"
+    with open(tmp_file, "w") as f:
+        f.write(timestamp)
+    os.replace(tmp_file, last_run_file)
+
+
+def get_export_start_time(last_run_file: str = LAST_RUN_FILE) -> int:
+    """Converts the `last_run.txt` watermark into an export start time.
+
+    This is only used when there is no checkpointed cursor. Tickets updated
+    at the watermark itself are exported again, so none are skipped.
+
+    Args:
+        last_run_file: The file the search-based runs wrote their timestamp to.
+
+    Returns:
+        The Unix timestamp to start the first export from. A watermark that
+        cannot be parsed is logged and treated like a missing one.
+    """
+    timestamp = read_last_run(last_run_file)
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        logging.warning(f"Invalid watermark {timestamp!r} in {last_run_file}. Starting 30 days back.")
+        parsed = datetime.fromisoformat(default_start_date())
+    return int(parsed.timestamp())
+
+
+def filter_exported_tickets(tickets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drops deleted tickets, which the export API returns but search does not."""
+    return [ticket for ticket in tickets if ticket.get("status") != "deleted"]
+
+
+class RenderedTicket(NamedTuple):
+    """The result of `render_ticket`.
+
+    Attributes:
+        ticket_id: The ID of the ticket.
+        ticket: The transformed ticket, if the caller asked for it back.
+        digest: The ticket's content hash, if it was asked for.
+        unchanged: Whether the ticket matched the known hash, so nothing was
+                   written.
+        skipped: Why the ticket could not be saved, if it could not.
+        timings: The seconds spent in each stage.
+        written: The bytes written per format.
+    """
+    ticket_id: int
+    ticket: Optional[Ticket]
+    digest: Optional[str]
+    unchanged: bool
+    skipped: Optional[str]
+    timings: Dict[str, float]
+    written: Dict[str, int]
+
+
+def render_ticket(ticket: Dict[str, Any], comments: List[Dict[str, Any]], known_hash: Optional[str] = None, hash_content: bool = False,
+                  write_files: bool = True, return_ticket: bool = True, output_directory: str = OUTPUT_DIRECTORY,
+                  dedup_min_bytes: Optional[int] = None, write_xml: bool = True, people: Optional[Dict[int, Person]] = None) -> RenderedTicket:
+    """Transforms a ticket and writes its JSON and XML files.
+
+    This is the CPU-bound part of saving a ticket. It only touches the
+    ticket's own files, so it can run in a worker process.
+
+    Args:
+        ticket: The raw ticket dictionary returned by the Zendesk API.
+        comments: The raw comment dictionaries for the ticket.
+        known_hash: The content hash of the stored ticket. If the transformed
+                    ticket has the same hash, nothing is written.
+        hash_content: Whether to compute the content hash.
+        write_files: Whether to write the JSON and XML files.
+        return_ticket: Whether to include the transformed ticket in the result.
+        output_directory: The directory the `json` and `xml` directories are in.
+        dedup_min_bytes: If given, comment bodies of at least this many bytes
+                         are stored once in the `bodies` directory instead of
+                         in the ticket's files.
+        write_xml: Whether to write the XML file along with the JSON file. If
+                   not, the XML file saved by an earlier run is removed, so
+                   that it is rendered again from the new JSON file.
+        people: The resolved requester, assignee and comment authors, by user
+                ID, if tickets are enriched with them.
+
+    Returns:
+        A `RenderedTicket`.
+
+    Raises:
+        FileSaveError: If an error occurs while saving either file.
+    """
+    ticket_id = ticket["id"]
+    timings = {}
+    written = {}
+
+    def result(structured_data=None, digest=None, unchanged=False, skipped=None):
+        return RenderedTicket(ticket_id, structured_data if return_ticket else None, digest, unchanged, skipped, timings, written)
+
+    start = time.perf_counter()
+    structured_data = transform_to_structured_json(ticket, comments)
+    timings["transform"] = time.perf_counter() - start
+    if structured_data is None:
+        return result(skipped="Could not transform data")
+    if people is not None:
+        attach_people(structured_data, people)
+
+    digest = content_hash(structured_data) if hash_content or known_hash is not None else None
+    if known_hash is not None and digest == known_hash:
+        return result(structured_data, digest, unchanged=True)
+
+    if write_files:
+        body_refs = None
+        if dedup_min_bytes is not None:
+            start = time.perf_counter()
+            bodies = BodyStore(os.path.join(output_directory, BODY_DIRECTORY), get_file_compression(), dedup_min_bytes)
+            try:
+                body_refs = bodies.dedup(structured_data)
+            except OSError as e:
+                raise FileSaveError(f"Error saving comment bodies for ticket {ticket_id}: {e}")
+            finally:
+                timings["dedup"] = time.perf_counter() - start
 
-        for ticket in tickets:
-            ticket_id = ticket["id"]
-            logging.info(f"Processing ticket ID: {ticket_id}")
+        start = time.perf_counter()
+        written["json"] = save_as_json(ticket_id, structured_data, output_directory, body_refs)
+        timings["json_save"] = time.perf_counter() - start
+
+        if not write_xml:
             try:
+                remove_file(os.path.join(output_directory, "xml", f"{ticket_id}.xml"))
+            except OSError as e:
+                raise FileSaveError(f"Error removing the stale XML file for ticket {ticket_id}: {e}")
+            return result(structured_data, digest)
+
+        start = time.perf_counter()
+        try:
+            xml_data = convert_to_xml(structured_data, body_refs)
+            if xml_data is None:
+                return result(skipped="Could not convert data to XML")
+            written["xml"] = save_as_xml(ticket_id, xml_data, output_directory)
+        finally:
+            timings["xml_save"] = time.perf_counter() - start
+    return result(structured_data, digest)
+
+
+def render_batch(batch: List[Tuple[Any, ...]]) -> List[Any]:
+    """Calls `render_ticket` for each argument tuple of a batch, in a worker process.
+
+    Returns:
+        One `RenderedTicket` per ticket, or the `ZendeskExtractorError` that
+        ticket raised, so one bad ticket does not fail the batch.
+    """
+    results = []
+    for args in batch:
+        try:
+            results.append(render_ticket(*args))
+        except ZendeskExtractorError as e:
+            results.append(e)
+        except Exception as e:
+            results.append(ZendeskExtractorError(f"Unexpected error rendering ticket {args[0].get('id')}: {e}"))
+    return results
+
+
+def transform_and_save(ticket: Dict[str, Any], comments: List[Dict[str, Any]], output: Optional[RunOutput] = None, people: Optional[Dict[int, Person]] = None) -> bool:
+    """Transforms a raw ticket and its comments and saves them as JSON and XML.
+
+    Args:
+        ticket: The raw ticket dictionary returned by the Zendesk API.
+        comments: The raw comment dictionaries for the ticket.
+        output: The outputs of the run. If it has a ticket store, tickets
+                whose content has not changed since they were stored are not
+                saved again. If it has shards, the ticket is appended to them
+                instead of being saved as separate JSON and XML files. If it
+                has Parquet tables or an index, the ticket is added to them as
+                well. If it has worker processes, the ticket is transformed and
+                its files are written in one of them. If its XML is lazy, only
+                the JSON file is written.
+        people: The resolved people of the ticket, by user ID, to attach to it.
+
+    Returns:
+        True if the ticket was saved, False otherwise.
+
+    Raises:
+        FileSaveError: If an error occurs while saving either file.
+    """
+    ticket_id = ticket["id"]
+    output = output or RunOutput()
+    store = output.store
+
+    args = (
+        ticket, comments, store.get_hash(ticket_id) if store is not None else None, store is not None,
+        output.shards is None, any(sink is not None for sink in (output.shards, output.tables, store, output.index)), output.directory,
+        output.dedup_min_bytes, not output.lazy_xml, people,
+    )
+    if output.workers is not None:
+        rendered = output.workers.call(args)
+        if isinstance(rendered, Exception):
+            raise rendered
+    else:
+        rendered = render_ticket(*args)
+
+    for stage, seconds in rendered.timings.items():
+        metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+    for file_format, size in rendered.written.items():
+        metrics.BYTES_WRITTEN.inc(size, format=file_format)
+
+    if rendered.skipped:
+        logging.warning(f"{rendered.skipped} for ticket {ticket_id}. Skipping.")
+        return False
+
+    structured_data, digest = rendered.ticket, rendered.digest
+    if rendered.unchanged:
+        logging.debug(f"Ticket {ticket_id} has not changed since it was saved. Skipping.")
+        metrics.TICKETS.inc(result="unchanged")
+        if output.index is not None:
+            output.index.add(structured_data)
+        store.save(structured_data, digest)
+        return True
+
+    if output.tables is not None:
+        output.tables.write(structured_data)
+
+    if output.shards is not None:
+        with metrics.STAGE_SECONDS.time(stage="json_save"):
+            location = output.shards.write(structured_data)
+        metrics.BYTES_WRITTEN.inc(location.length, format="shard")
+
+    if output.index is not None:
+        output.index.add(structured_data)
+
+    # The store is updated last, so a ticket whose files could not be written
+    # is not mistaken for unchanged on the next run.
+    if store is not None:
+        store.save(structured_data, digest)
+    metrics.TICKETS.inc(result="saved")
+    return True
+
+
+def fetch_comments_in_bulk(session: Session, tickets: List[Dict[str, Any]], output: Optional[RunOutput] = None, stream: Optional[CommentEventStream] = None) -> Dict[int, List[Dict[str, Any]]]:
+    """Retrieves the comments of many tickets from the ticket event export.
+
+    The comments made since each ticket was last saved are read from the
+    run's ticket event stream and merged into the saved conversation. Tickets
+    that cannot be covered this way are left out of the result.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        tickets: The raw tickets of one export page.
+        output: The outputs of the run, if any, to read saved tickets from.
+        stream: The event stream shared by the pages of the run. A new one is
+                started if not given.
+
+    Returns:
+        A mapping of ticket ID to the ticket's complete list of comments.
+    """
+    stream = stream if stream is not None else CommentEventStream()
+    saved_tickets = load_saved_tickets(tickets, output)
+    end_time, ticket_ids = stream.plan(tickets, saved_tickets)
+    if not ticket_ids:
+        return {}
+
+    try:
+        fetch_comment_events(session, stream, end_time)
+    except ZendeskAPIError as e:
+        logging.warning(f"Could not fetch comments in bulk, falling back to per-ticket requests: {e}")
+        return {}
+
+    logging.info(f"Fetched comments for {len(ticket_ids)} of {len(tickets)} tickets in bulk.")
+    return stream.assemble(tickets, saved_tickets, ticket_ids)
+
+
+def get_stored_ticket(ticket: Dict[str, Any], output: Optional[RunOutput] = None) -> Optional[StoredTicket]:
+    """Looks a raw ticket up in the run's ticket store, if it has one."""
+    if output is None or output.store is None:
+        return None
+    return output.store.get(ticket["id"])
+
+
+def is_unchanged(ticket: Dict[str, Any], stored: Optional[StoredTicket]) -> bool:
+    """Returns whether a raw ticket has not been updated since it was stored."""
+    return stored is not None and stored.updated_at is not None and stored.updated_at == ticket.get("updated_at")
+
+
+def process_ticket(session: Session, ticket: Dict[str, Any], comments: Optional[List[Dict[str, Any]]] = None, output: Optional[RunOutput] = None) -> bool:
+    """Fetches, transforms and saves a single ticket.
+
+    Errors raised while processing the ticket are logged and swallowed so that
+    one bad ticket never aborts the rest of the run.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        ticket: The raw ticket dictionary returned by the Zendesk API.
+        comments: The ticket's comments, if they have already been fetched in
+                  bulk. Otherwise they are fetched from the comments endpoint,
+                  or only the new ones if the ticket is in the ticket store.
+        output: The outputs of the run to save the ticket to, if any. If it
+                has a people cache, the ticket's people are resolved and
+                attached to it.
+
+    Returns:
+        True if the ticket was saved or is unchanged, False otherwise.
+    """
+    ticket_id = ticket["id"]
+    logging.debug(f"Processing ticket ID: {ticket_id}")
+    try:
+        stored = get_stored_ticket(ticket, output)
+        if is_unchanged(ticket, stored):
+            logging.debug(f"Ticket {ticket_id} has not been updated since it was saved. Skipping.")
+            metrics.TICKETS.inc(result="unchanged")
+            return True
+
+        with metrics.STAGE_SECONDS.time(stage="fetch"):
+            if comments is None and stored is not None and stored.comments:
+                new_comments = fetch_ticket_comments(session, ticket_id, after_id=stored.last_comment_id)
+                comments = merge_comments(stored.comments, new_comments or [])
+            if comments is None:
                 comments = fetch_ticket_comments(session, ticket_id)
-                if comments is None:
-                    logging.warning(f"Could not fetch comments for ticket {ticket_id}. Skipping.")
-                    continue
+        if comments is None:
+            logging.warning(f"Could not fetch comments for ticket {ticket_id}. Skipping.")
+            metrics.TICKETS.inc(result="failed")
+            return False
+
+        people = None
+        if output is not None and output.people is not None:
+            with metrics.STAGE_SECONDS.time(stage="people"):
+                people = resolve_people(session, output.people, ticket_user_ids([ticket], comments))
+
+        if not transform_and_save(ticket, comments, output, people):
+            metrics.TICKETS.inc(result="failed")
+            return False
+
+        logging.debug(f"Successfully processed and saved ticket ID: {ticket_id}")
+        return True
 
-                structured_data = transform_to_structured_json(ticket, comments)
-                if structured_data is None:
-                    logging.warning(f"Could not transform data for ticket {ticket_id}. Skipping.")
-                    continue
+    except ZendeskExtractorError as e:
+        logging.error(f"An error occurred while processing ticket {ticket_id}: {e}")
+        metrics.TICKETS.inc(result="failed")
+        return False
+
+
+def prepare_pages(session: Session, pages: Iterable[Tuple[List[Dict[str, Any]], str]], bulk_comments: bool = False, output: Optional[RunOutput] = None, progress: Optional[Progress] = None) -> Iterator[Tuple[List[Dict[str, Any]], str, Dict[int, List[Dict[str, Any]]]]]:
+    """Drops deleted tickets from export pages and prefetches their comments in bulk.
+
+    If the run enriches tickets with their people, the people of each page are
+    looked up together, so the tickets only look up the comment authors that
+    were not fetched in bulk.
+
+    Args:
+        session: The requests.Session object for making API calls.
+        pages: Tuples of (tickets, after_cursor) from `fetch_ticket_export`.
+        bulk_comments: Whether to fetch each page's comments in bulk.
+        output: The outputs of the run, if any.
+        progress: The progress of the run, which counts the tickets fetched.
+
+    Yields:
+        Tuples of (tickets, after_cursor, prefetched_comments).
+    """
+    stream = CommentEventStream() if bulk_comments else None
+    for tickets, after_cursor in pages:
+        tickets = filter_exported_tickets(tickets)
+        if tickets:
+            logging.info(f"Found {len(tickets)} tickets.")
+        if progress is not None:
+            progress.add_fetched(len(tickets))
+        prefetched = fetch_comments_in_bulk(session, tickets, output, stream) if bulk_comments and tickets else {}
+        if output is not None and output.people is not None and tickets:
+            comments = [comment for ticket_comments in prefetched.values() for comment in ticket_comments]
+            with metrics.STAGE_SECONDS.time(stage="people"):
+                resolve_people(session, output.people, ticket_user_ids(tickets, comments))
+        yield tickets, after_cursor, prefetched
+
+
+def checkpoint_cursor(output: RunOutput, cursor: str, cursor_file: str = CURSOR_FILE) -> None:
+    """Writes the cursor of the checkpointed pages once the run's outputs hold their tickets durably.
+
+    Raises:
+        FileSaveError: If the outputs cannot be made durable. The cursor is
+                       then left where it was.
+    """
+    output.checkpoint()
+    write_cursor(cursor, cursor_file)
+
+
+def record_checkpoint(journal: TicketJournal, page: int, last_run_file: str = LAST_RUN_FILE) -> None:
+    """Drops the checkpointed pages from the journal and records the watermark.
+
+    This runs after the cursor has been written, so a crash in between only
+    repeats work.
+    """
+    watermark = journal.checkpoint(page)
+    if watermark:
+        write_last_run(watermark, last_run_file)
+
+
+def log_progress(progress: Progress, done: int) -> None:
+    """Logs a summary of the run every PROGRESS_LOG_INTERVAL tickets."""
+    if done % PROGRESS_LOG_INTERVAL == 0:
+        log_summary(progress)
+
+
+def log_summary(progress: Progress) -> None:
+    """Logs the counters of a run."""
+    snapshot = progress.snapshot()
+    logging.info(
+        f"Processed {snapshot['processed']} tickets ({snapshot['failed']} failed) in {snapshot['elapsed_seconds']:.1f}s, "
+        f"{snapshot['current_tickets_per_second']} tickets/s."
+    )
+
+
+def run_accounts(accounts: List[Account], extract: Callable[[Account], int]) -> int:
+    """Extracts several accounts at the same time, each in a thread of its own.
+
+    An account that fails does not stop the others.
+
+    Args:
+        accounts: The accounts of the run.
+        extract: Extracts one account and returns the number of its tickets.
+
+    Returns:
+        The number of tickets of all the accounts.
+
+    Raises:
+        ZendeskExtractorError: If any account failed, once the others are done.
+    """
+    if len(accounts) == 1:
+        return extract(accounts[0])
+
+    def run(account: Account) -> Tuple[int, Optional[str]]:
+        try:
+            return extract(account), None
+        except ZendeskExtractorError as e:
+            logging.error(f"An unrecoverable error occurred in account {account.label}: {e}")
+            return 0, f"{account.label}: {e}"
+
+    with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+        results = list(executor.map(run, accounts))
+    errors = [error for _, error in results if error]
+    if errors:
+        raise ZendeskExtractorError("; ".join(errors))
+    return sum(total for total, _ in results)
+
+
+def prepare_account(account: Account) -> Tuple[str, str]:
+    """Creates the directory of a named account and returns its cursor and watermark files."""
+    if account.name is not None:
+        logging.info(f"Extracting account {account.name} ({account.domain}.zendesk.com).")
+        os.makedirs(account.path(""), exist_ok=True)
+    return account.path(CURSOR_FILE), account.path(LAST_RUN_FILE)
+
+
+def process_pages(session: Session, pages: Iterable[Tuple[List[Dict[str, Any]], str, Dict[int, List[Dict[str, Any]]]]], output: RunOutput, journal: TicketJournal,
+                  tracker: PageTracker, max_workers: int, progress: Progress) -> int:
+    """Processes the tickets of an export, skipping those the journal has, then closes the journal and the outputs.
+
+    Args:
+        session: The session the comments are fetched with.
+        pages: Tuples of (tickets, after_cursor, prefetched_comments) from
+               `prepare_pages`.
+        output: The outputs of the run.
+        journal: The journal of the export.
+        tracker: Checkpoints the cursor of each page once its tickets are done.
+        max_workers: The maximum number of tickets processed concurrently.
+        progress: Counts the tickets processed and failed.
+
+    Returns:
+        The number of tickets handled.
+
+    Raises:
+        ZendeskExtractorError: If the export cannot continue.
+    """
+    def handle(item: PipelineItem) -> None:
+        success = False
+        try:
+            if journal.skip(item.ticket, item.page):
+                logging.debug(f"Ticket {item.ticket['id']} was completed before the previous run stopped. Skipping.")
+                metrics.TICKETS.inc(result="unchanged")
+                success = True
+            else:
+                success = process_ticket(session, item.ticket, comments=item.comments, output=output)
+                if success:
+                    journal.record(item.ticket, item.page)
+        finally:
+            log_progress(progress, progress.ticket_done(bool(success)))
+            tracker.complete(item.page)
+
+    finished = False
+    try:
+        total = run_bounded(stream_pages(pages, tracker), handle, max_workers)
+        finished = True
+    finally:
+        try:
+            journal.close(finished=finished)
+        finally:
+            output.close()
+    return total
+
+
+def extract_account(account: Account, max_workers: int, bulk_comments: bool, progress: Progress, workers: Optional[BatchProcessPool] = None) -> int:
+    """Extracts the tickets of one account, continuing from its checkpoint.
+
+    Args:
+        account: The account to extract.
+        max_workers: The maximum number of the account's tickets processed
+                     concurrently.
+        bulk_comments: Whether to fetch comments in bulk from the ticket event
+                       export.
+        progress: Counts the tickets fetched, processed and failed. It may be
+                  shared with other accounts.
+        workers: The worker processes shared by the accounts of the run, if
+                 tickets are transformed in worker processes.
+
+    Returns:
+        The number of tickets handled.
+
+    Raises:
+        ZendeskExtractorError: If the extraction cannot continue.
+    """
+    cursor_file, last_run_file = prepare_account(account)
+    session = get_zendesk_session(pool_size=max(max_workers, 10), account=account, http_cache=get_http_cache(account))
+    output = get_run_output(account, workers)
+
+    cursor = read_cursor(cursor_file)
+    start_time = None if cursor else get_export_start_time(last_run_file)
+
+    journal = get_ticket_journal(account, skip_completed=output.tables is None)
+    tracker = PageTracker(lambda cursor: checkpoint_cursor(output, cursor, cursor_file), on_checkpoint=lambda page: record_checkpoint(journal, page, last_run_file))
+    pages = prepare_pages(session, fetch_ticket_export(session, cursor=cursor, start_time=start_time), bulk_comments, output, progress)
+    total = process_pages(session, pages, output, journal, tracker, max_workers, progress)
+
+    if not total:
+        logging.info(f"No tickets found for the specified period{f' in account {account.name}' if account.name else ''}.")
+    return total
+
+
+def get_backfill_coordinator(account: Optional[Account] = None) -> Optional[BackfillCoordinator]:
+    """Opens the backfill of an account configured in the environment.
+
+    A run backfills instead of continuing from its checkpoint when
+    ZENDESK_BACKFILL_START is set to an ISO 8601 date. The backfill ends at
+    ZENDESK_BACKFILL_END, or at the time it was first started, and is split
+    into slices of ZENDESK_BACKFILL_SLICE_DAYS days (DEFAULT_SLICE_DAYS by
+    default). Its state is kept in the account's `backfill` directory.
+
+    Args:
+        account: The account to backfill. Defaults to the default account.
+
+    Returns:
+        A `BackfillCoordinator`, or None if no backfill is configured.
+
+    Raises:
+        ZendeskExtractorError: If the settings are invalid, or do not match
+                               the backfill already started.
+    """
+    start = os.getenv("ZENDESK_BACKFILL_START", "").strip()
+    if not start:
+        return None
+    if os.getenv("ZENDESK_OUTPUT_MODE", "files").strip().lower() == "shards":
+        raise ZendeskExtractorError("A backfill saves one file per ticket. Unset ZENDESK_OUTPUT_MODE=shards to run it.")
+    end = os.getenv("ZENDESK_BACKFILL_END", "").strip()
+    # Unlike most settings, an invalid slice length is refused rather than
+    # replaced by the default, since the slices of a backfill cannot change.
+    value = os.getenv("ZENDESK_BACKFILL_SLICE_DAYS", "").strip()
+    slice_days = int(value) if value.isdigit() else (0 if value else DEFAULT_SLICE_DAYS)
+    if slice_days < 1:
+        raise ZendeskExtractorError(f"ZENDESK_BACKFILL_SLICE_DAYS must be a positive number of days, not {value!r}.")
+    return BackfillCoordinator(
+        (account or get_default_account()).path(BACKFILL_DIRECTORY),
+        start=parse_time(start),
+        end=parse_time(end) if end else None,
+        slice_seconds=slice_days * 86400,
+    )
+
+
+def extract_slice(session: Session, account: Account, coordinator: BackfillCoordinator, backfill_slice: Slice, max_workers: int, bulk_comments: bool,
+                  progress: Progress, workers: Optional[BatchProcessPool] = None) -> int:
+    """Exports the tickets of one backfill slice, continuing from the slice's checkpoint.
+
+    Args:
+        session: The account's session.
+        account: The account being backfilled.
+        coordinator: The backfill.
+        backfill_slice: The slice to export.
+        max_workers: The maximum number of tickets processed concurrently.
+        bulk_comments: Whether to fetch comments in bulk from the ticket event
+                       export.
+        progress: Counts the tickets fetched, processed and failed.
+        workers: The worker processes tickets are transformed in, if any.
+
+    Returns:
+        The number of tickets handled.
+
+    Raises:
+        ZendeskExtractorError: If the slice cannot be exported.
+    """
+    cursor_file = coordinator.path(backfill_slice, "cursor")
+    cursor = read_cursor(cursor_file)
+    output = get_run_output(account, workers)
+    journal = TicketJournal(coordinator.path(backfill_slice, "journal.jsonl"), skip_completed=output.tables is None)
+    tracker = PageTracker(lambda cursor: checkpoint_cursor(output, cursor, cursor_file), on_checkpoint=journal.checkpoint)
+    export = fetch_ticket_export(session, cursor=cursor, start_time=None if cursor else backfill_slice.start)
+    pages = prepare_pages(session, clip_pages(export, backfill_slice.end), bulk_comments, output, progress)
+    return process_pages(session, pages, output, journal, tracker, max_workers, progress)
+
+
+def run_backfill_process(account: Account, max_workers: int, bulk_comments: bool, progress: Optional[Progress] = None) -> int:
+    """Exports backfill slices of an account until none is left.
 
-                save_as_json(ticket_id, structured_data)
+    This is what each process of a backfill runs, including processes on
+    other machines sharing the output directory.
 
-                xml_data = convert_to_xml(structured_data)
-                if xml_data is None:
-                    logging.warning(f"Could not convert data to XML for ticket {ticket_id}. Skipping.")
-                    continue
+    Returns:
+        The number of tickets this process exported.
+
+    Raises:
+        ZendeskExtractorError: If the backfill cannot be opened.
+    """
+    progress = progress or Progress()
+    coordinator = get_backfill_coordinator(account)
+    session = get_zendesk_session(pool_size=max(max_workers, 10), account=account, http_cache=get_http_cache(account))
+    workers = get_process_pool()
+    try:
+        return run_backfill_worker(
+            coordinator,
+            lambda backfill_slice: extract_slice(session, account, coordinator, backfill_slice, max_workers, bulk_comments, progress, workers),
+        )
+    finally:
+        if workers is not None:
+            workers.close()
+
+
+def backfill_account(account: Account, max_workers: int, bulk_comments: bool, progress: Progress) -> int:
+    """Backfills an account in ZENDESK_BACKFILL_PROCESSES processes.
+
+    Once every slice is done, the end of the backfill becomes the account's
+    watermark, unless a later one is recorded, so the regular runs continue
+    from there.
+
+    Returns:
+        The number of tickets exported by this machine.
+
+    Raises:
+        ZendeskExtractorError: If the backfill cannot be run, or slices are
+                               left failed after their last attempt.
+    """
+    _, last_run_file = prepare_account(account)
+    coordinator = get_backfill_coordinator(account)
+    logging.info(f"Backfilling {format_time(coordinator.start)}..{format_time(coordinator.end)} in {len(coordinator.slices)} slices{f' in account {account.name}' if account.name else ''}.")
+    processes = get_env_int("ZENDESK_BACKFILL_PROCESSES", 1)
+    if processes <= 1:
+        total = run_backfill_process(account, max_workers, bulk_comments, progress)
+    else:
+        # Spawned processes share no state with this one but the environment.
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(run_backfill_process, account, max_workers, bulk_comments) for _ in range(processes)]
+            total = sum(future.result() for future in futures)
+
+    status = coordinator.status()
+    if status["failed"]:
+        raise ZendeskExtractorError(f"{status['failed']} backfill slices failed {coordinator.max_attempts} times. Their errors are in {coordinator.directory}.")
+    watermark = coordinator.watermark()
+    if watermark is not None:
+        try:
+            later = os.path.exists(last_run_file) and get_export_start_time(last_run_file) >= coordinator.end
+        except ValueError:
+            later = False
+        if not later:
+            write_last_run(watermark, last_run_file)
+        logging.info(f"Backfill complete. The next runs continue from {watermark}; unset ZENDESK_BACKFILL_START to run them.")
+    return total
+
+
+def main(max_workers: Optional[int] = None, bulk_comments: Optional[bool] = None, progress: Optional[Progress] = None) -> None:
+    """Main function to orchestrate the Zendesk ticket processing.
+
+    This function orchestrates the entire process of fetching tickets from Zendesk,
+    transforming them into structured JSON and XML formats, and saving them to files.
+    It handles errors gracefully and logs the progress.
+
+    Tickets are streamed from the Incremental Ticket Export API to a bounded
+    pool of workers, so the first files are written while later pages are still
+    being fetched and memory use does not grow with the size of the export.
+    The export cursor is checkpointed once every ticket of a page has been
+    handled, so the next run continues exactly where this one stopped.
+    Tickets completed on pages that are not checkpointed yet are kept in a
+    journal, so a run that is interrupted does not process them again, and
+    the greatest `updated_at` of the checkpointed tickets is written to
+    `last_run.txt`.
 
-                save_as_xml(ticket_id, xml_data)
+    When ZENDESK_ACCOUNTS lists several accounts, they are extracted at the
+    same time, each with its own session, checkpoint and output directory.
 
-                logging.info(f"Successfully processed and saved ticket ID: {ticket_id}")
+    When ZENDESK_BACKFILL_START is set, the accounts are backfilled in time
+    slices instead (see `backfill_account`).
 
-            except ZendeskExtractorError as e:
-                logging.error(f"An error occurred while processing ticket {ticket_id}: {e}")
-                continue
+    Args:
+        max_workers: The maximum number of tickets processed concurrently per
+                     account. If not given, it is read from the
+                     ZENDESK_MAX_WORKERS environment variable and defaults to
+                     DEFAULT_MAX_WORKERS.
+        bulk_comments: Whether to fetch comments in bulk from the ticket event
+                       export. If not given, it is read from the
+                       ZENDESK_BULK_COMMENTS environment variable.
+        progress: Counts the tickets fetched, processed and failed as the run
+                  goes on. It is marked finished when the run ends.
+    """
+    progress = progress or Progress()
+    try:
+        if max_workers is None:
+            max_workers = get_max_workers()
+        if bulk_comments is None:
+            bulk_comments = get_bulk_comments()
+
+        accounts = get_accounts()
+        if os.getenv("ZENDESK_BACKFILL_START", "").strip():
+            total = run_accounts(accounts, lambda account: backfill_account(account, max_workers, bulk_comments, progress))
+        else:
+            workers = get_process_pool()
+            try:
+                total = run_accounts(accounts, lambda account: extract_account(account, max_workers, bulk_comments, progress, workers))
+            finally:
+                if workers is not None:
+                    workers.close()
 
-        with open(last_run_file, "w") as f:
-            f.write(datetime.now().isoformat())
+        progress.finish()
+        if total:
+            log_summary(progress)
 
     except ZendeskExtractorError as e:
         logging.error(f"An unrecoverable error occurred: {e}")
+        progress.finish(error=str(e))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+"""Process-wide metrics of the extraction, in the Prometheus text format.
+
+The extraction records where its time goes (per-stage timings and HTTP
+latencies) and counts retries, rate-limit pauses, bytes written and failed
+tickets. The metrics live for the whole process, so the web application's
+`/metrics` endpoint reports every run it started, and Prometheus can scrape
+it as usual.
+
+Counters and histograms are kept in memory and are safe to update from any
+thread. No client library is needed.
+"""
+import time
+import math
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Registry:
+    """The metrics exposed together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Clears every metric."""
+        for metric in self._metrics:
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """A value that only goes up, such as the number of retried requests."""
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Adds `amount` to the counter with the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Returns the current value of the counter with the given labels."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    """The distribution of observed durations, such as HTTP latencies."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Records one observation."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the wall-clock seconds spent in the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Returns the number of observations with the given labels."""
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels)) or ([0], 0.0)
+            return sum(counts)
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+STAGE_SECONDS = Histogram("zendesk_stage_seconds", "Seconds spent in each stage of processing a ticket.", ("stage",))
+HTTP_REQUEST_SECONDS = Histogram("zendesk_http_request_seconds", "Latency of each attempt of a request to the Zendesk API.")
+HTTP_REQUESTS = Counter("zendesk_http_requests_total", "Attempts of requests to the Zendesk API, by response status.", ("status",))
+HTTP_RETRIES = Counter("zendesk_http_retries_total", "Requests sent again after a transient failure, by reason.", ("reason",))
+RATE_LIMIT_WAITS = Counter("zendesk_rate_limit_waits_total", "Responses with status 429 that paused all requests.")
+RATE_LIMIT_WAIT_SECONDS = Counter("zendesk_rate_limit_wait_seconds_total", "Seconds all requests were paused by 429 responses.")
+BYTES_WRITTEN = Counter("zendesk_bytes_written_total", "Bytes of ticket data written, by format.", ("format",))
+TICKETS = Counter("zendesk_tickets_total", "Tickets handled, by result.", ("result",))
+HTTP_CACHE_REQUESTS = Counter("zendesk_http_cache_requests_total", "GET requests to the Zendesk API, by whether a 304 response was answered from the HTTP cache.", ("result",))
+HTTP_CACHE_EVICTIONS = Counter("zendesk_http_cache_evictions_total", "Responses evicted from the HTTP cache to keep it under its maximum size.")
+XML_CACHE_REQUESTS = Counter("zendesk_xml_cache_requests_total", "XML documents rendered on request from the JSON files, by whether they were cached.", ("result",))
@@ -1,7 +1,49 @@
+import json
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
-@dataclass
+@dataclass(slots=True)
+class Person:
+    """A Zendesk user a ticket refers to, as resolved by the people enrichment.
+
+    Attributes:
+        user_id: The ID of the user.
+        name: The name of the user.
+        email: The email address of the user.
+        organization_id: The ID of the user's organization, if any.
+        organization: The name of the user's organization, if any.
+    """
+    user_id: int
+    name: Optional[str] = None
+    email: Optional[str] = None
+    organization_id: Optional[int] = None
+    organization: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the person as a dictionary with the same keys as `asdict`."""
+        return {
+            "user_id": self.user_id,
+            "name": self.name,
+            "email": self.email,
+            "organization_id": self.organization_id,
+            "organization": self.organization,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["Person"]:
+        """Creates a person from a dictionary produced by `to_dict`, or returns None for None."""
+        if data is None:
+            return None
+        return cls(
+            user_id=data.get("user_id"),
+            name=data.get("name"),
+            email=data.get("email"),
+            organization_id=data.get("organization_id"),
+            organization=data.get("organization"),
+        )
+
+
+@dataclass(slots=True)
 class Comment:
     """Represents a single comment in a Zendesk ticket.
 
@@ -10,13 +52,43 @@ class Comment:
         author_id: The ID of the author of the comment.
         body: The content of the comment.
         created_at: The timestamp when the comment was created.
+        author: The author, if people are enriched.
     """
     comment_id: int
     author_id: int
     body: str
     created_at: str
+    author: Optional[Person] = None
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the comment as a dictionary with the same keys as `asdict`.
+
+        Unlike `dataclasses.asdict`, the values are not deep-copied. The
+        `author` is left out when it is None, so comments saved without people
+        enrichment keep their format.
+        """
+        data = {
+            "comment_id": self.comment_id,
+            "author_id": self.author_id,
+            "body": self.body,
+            "created_at": self.created_at,
+        }
+        if self.author is not None:
+            data["author"] = self.author.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Comment":
+        """Creates a comment from a dictionary produced by `to_dict`."""
+        return cls(
+            comment_id=data.get("comment_id"),
+            author_id=data.get("author_id"),
+            body=data.get("body"),
+            created_at=data.get("created_at"),
+            author=Person.from_dict(data.get("author")),
+        )
+
+@dataclass(slots=True)
 class Ticket:
     """Represents a Zendesk ticket, including its conversation history.
 
@@ -31,6 +103,8 @@ class Ticket:
         tags: A list of tags associated with the ticket.
         conversation: A list of `Comment` objects representing the ticket's
                       conversation history.
+        requester: The requester, if people are enriched.
+        assignee: The assignee, if people are enriched.
     """
     ticket_id: int
     created_at: str
@@ -41,3 +115,51 @@ class Ticket:
     assignee_id: int
     tags: List[str]
     conversation: List[Comment] = field(default_factory=list)
+    requester: Optional[Person] = None
+    assignee: Optional[Person] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the ticket as a dictionary with the same keys as `asdict`.
+
+        Unlike `dataclasses.asdict`, the values are not deep-copied: the
+        returned dictionary shares the `tags` list and the comment bodies with
+        the ticket. The `requester` and `assignee` are left out when they are
+        None, like the comments' `author`.
+        """
+        data = {
+            "ticket_id": self.ticket_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "subject": self.subject,
+            "status": self.status,
+            "requester_id": self.requester_id,
+            "assignee_id": self.assignee_id,
+            "tags": self.tags,
+            "conversation": [comment.to_dict() for comment in self.conversation],
+        }
+        if self.requester is not None:
+            data["requester"] = self.requester.to_dict()
+        if self.assignee is not None:
+            data["assignee"] = self.assignee.to_dict()
+        return data
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """Returns the ticket as a JSON string in the format of the saved files."""
+        return json.dumps(self.to_dict(), indent=indent)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Ticket":
+        """Creates a ticket from a dictionary produced by `to_dict`, such as a saved JSON file."""
+        return cls(
+            ticket_id=data.get("ticket_id"),
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at"),
+            subject=data.get("subject"),
+            status=data.get("status"),
+            requester_id=data.get("requester_id"),
+            assignee_id=data.get("assignee_id"),
+            tags=data.get("tags"),
+            conversation=[Comment.from_dict(comment) for comment in data.get("conversation") or []],
+            requester=Person.from_dict(data.get("requester")),
+            assignee=Person.from_dict(data.get("assignee")),
+        )
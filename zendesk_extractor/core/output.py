@@ -0,0 +1,83 @@
+"""The destinations of one extraction run besides the per-ticket files."""
+from typing import Any, Optional
+from zendesk_extractor.core.shards import ShardWriter
+from zendesk_extractor.core.columnar import ColumnarWriter
+from zendesk_extractor.core.store import TicketStore
+from zendesk_extractor.core.ticket_index import TicketIndex
+from zendesk_extractor.core.process_pool import BatchProcessPool
+from zendesk_extractor.core.people import PeopleCache
+
+OUTPUT_DIRECTORY = "output"
+
+class RunOutput:
+    """Holds the writers a run saves its tickets to.
+
+    Attributes:
+        shards: The shard writer, if tickets are appended to JSON Lines shards
+                instead of being saved one file per ticket.
+        tables: The Parquet writer, if tickets are also exported to Parquet.
+        store: The ticket store, if unchanged tickets are skipped.
+        index: The index searched by the web interface, if it is maintained.
+        workers: The worker processes tickets are transformed and written in,
+                 if they are not transformed in the calling thread. They may
+                 be shared with other runs, so they are not closed with the
+                 writers.
+        directory: The directory the per-ticket `json` and `xml` files are
+                   saved in.
+        dedup_min_bytes: The size from which comment bodies are stored once
+                         in `bodies` instead of in the per-ticket files, or
+                         None if bodies are not deduplicated.
+        lazy_xml: Whether the XML files are left to the web interface, which
+                  renders them from the JSON files on request.
+        people: The cache of the users and organizations tickets refer to, if
+                tickets are enriched with their names, emails and
+                organizations.
+    """
+
+    def __init__(self, shards: Optional[ShardWriter] = None, tables: Optional[ColumnarWriter] = None, store: Optional[TicketStore] = None, index: Optional[TicketIndex] = None, workers: Optional[BatchProcessPool] = None, directory: str = OUTPUT_DIRECTORY, dedup_min_bytes: Optional[int] = None, lazy_xml: bool = False, people: Optional[PeopleCache] = None):
+        self.shards = shards
+        self.tables = tables
+        self.store = store
+        self.index = index
+        self.workers = workers
+        self.directory = directory
+        self.dedup_min_bytes = dedup_min_bytes
+        self.lazy_xml = lazy_xml
+        self.people = people
+
+    def checkpoint(self) -> None:
+        """Makes the tickets saved so far durable, before the export cursor moves past them.
+
+        The per-ticket files, shards and SQLite databases are durable as
+        each ticket is written; the Parquet export completes its part files.
+
+        Raises:
+            FileSaveError: If the Parquet files cannot be written.
+        """
+        if self.tables is not None:
+            self.tables.checkpoint()
+
+    def close(self) -> None:
+        """Closes the writers, finishing the run's shards and Parquet files.
+
+        Raises:
+            FileSaveError: If the Parquet files cannot be written.
+        """
+        try:
+            if self.shards is not None:
+                self.shards.close()
+            if self.store is not None:
+                self.store.close()
+            if self.index is not None:
+                self.index.close()
+            if self.people is not None:
+                self.people.close()
+        finally:
+            if self.tables is not None:
+                self.tables.close()
+
+    def __enter__(self) -> "RunOutput":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,227 @@
+"""Names, emails and organizations of the people tickets refer to.
+
+With people enrichment enabled, the requester and assignee of each ticket and
+the author of each comment are saved with their name, email and organization
+along with their IDs. The users and organizations are looked up with the
+`show_many` endpoints, up to SHOW_MANY_LIMIT at a time, for every user of an
+export page at once.
+
+What was looked up is kept in an SQLite cache, `output/people.db` by default,
+for a time to live of a week by default. The same agents and customers appear
+on ticket after ticket, so after the first pages most lookups are answered by
+the cache, and later runs do not look them up again until they expire. Users
+and organizations that do not exist any more are cached as such, so they are
+not looked up on every ticket either.
+
+This module does not make requests. `PeopleCache` answers which IDs are
+missing and takes the lookup results, and the extraction loops fetch them.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from zendesk_extractor.core.models import Person, Ticket
+from zendesk_extractor.core.exceptions import FileSaveError
+
+PEOPLE_CACHE_PATH = "output/people.db"
+DEFAULT_TTL_SECONDS = 7 * 86400
+SHOW_MANY_LIMIT = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS organizations (
+    organization_id INTEGER PRIMARY KEY,
+    data TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+def chunked(ids: List[int], size: int = SHOW_MANY_LIMIT) -> Iterator[List[int]]:
+    """Splits IDs into lists of at most `size`, the most one `show_many` request takes."""
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def ticket_user_ids(tickets: Iterable[Dict[str, Any]], comments: Iterable[Dict[str, Any]] = ()) -> List[int]:
+    """Returns the unique IDs of the requesters, assignees and comment authors, sorted.
+
+    Args:
+        tickets: Raw tickets from the Zendesk API.
+        comments: Raw comments from the Zendesk API.
+    """
+    ids = set()
+    for ticket in tickets:
+        ids.add(ticket.get("requester_id"))
+        ids.add(ticket.get("assignee_id"))
+    for comment in comments:
+        ids.add(comment.get("author_id"))
+    ids.discard(None)
+    return sorted(ids)
+
+
+def attach_people(ticket: Ticket, people: Dict[int, Person]) -> Ticket:
+    """Sets the requester, assignee and comment authors of a ticket from resolved people, in place.
+
+    Returns:
+        `ticket`, for convenience.
+    """
+    ticket.requester = people.get(ticket.requester_id)
+    ticket.assignee = people.get(ticket.assignee_id)
+    for comment in ticket.conversation:
+        comment.author = people.get(comment.author_id)
+    return ticket
+
+
+class PeopleCache:
+    """The users and organizations looked up so far, in memory and in SQLite.
+
+    The cache is safe to share between threads. Entries read from or written
+    to the database are also kept in memory for the rest of the run, so each
+    user is read from the database at most once. Two threads may look up the
+    same missing user at the same time; the second result replaces the first.
+    """
+
+    def __init__(self, path: str = PEOPLE_CACHE_PATH, ttl: float = DEFAULT_TTL_SECONDS, clock: Callable[[], float] = time.time):
+        """Initializes the cache.
+
+        Args:
+            path: The SQLite database of the cache.
+            ttl: The number of seconds after which an entry is looked up again.
+            clock: Returns the current Unix time.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._users: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._organizations: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database and creates its tables on first use. Call with the lock held."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _missing(self, table: str, column: str, memory: Dict[int, Optional[Dict[str, Any]]], ids: Iterable[int]) -> List[int]:
+        """Loads the fresh entries of `ids` from the database and returns the IDs still unknown."""
+        with self._lock:
+            unknown = sorted({entry_id for entry_id in ids if entry_id is not None and entry_id not in memory})
+            if not unknown:
+                return []
+            try:
+                connection = self._connect()
+                for chunk in chunked(unknown, 500):
+                    rows = connection.execute(
+                        f"SELECT {column}, data FROM {table} WHERE fetched_at >= ? AND {column} IN ({', '.join('?' * len(chunk))})",
+                        [self.clock() - self.ttl, *chunk],
+                    )
+                    for entry_id, data in rows:
+                        memory[entry_id] = json.loads(data) if data is not None else None
+            except (sqlite3.Error, OSError) as e:
+                raise FileSaveError(f"Error reading the people cache {self.path}: {e}")
+            return [entry_id for entry_id in unknown if entry_id not in memory]
+
+    def _add(self, table: str, column: str, memory: Dict[int, Optional[Dict[str, Any]]], requested: Iterable[int], found: Dict[int, Dict[str, Any]]) -> None:
+        """Stores the entries that were looked up. The requested IDs not found are stored as None."""
+        entries = {entry_id: found.get(entry_id) for entry_id in requested}
+        entries.update(found)
+        now = self.clock()
+        with self._lock:
+            memory.update(entries)
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        f"INSERT OR REPLACE INTO {table} ({column}, data, fetched_at) VALUES (?, ?, ?)",
+                        [(entry_id, json.dumps(data) if data is not None else None, now) for entry_id, data in entries.items()],
+                    )
+            except (sqlite3.Error, OSError) as e:
+                raise FileSaveError(f"Error writing the people cache {self.path}: {e}")
+
+    def missing_users(self, user_ids: Iterable[int]) -> List[int]:
+        """Returns the users that need to be looked up, sorted.
+
+        Raises:
+            FileSaveError: If the database cannot be read.
+        """
+        return self._missing("users", "user_id", self._users, user_ids)
+
+    def add_users(self, requested: Iterable[int], users: List[Dict[str, Any]]) -> None:
+        """Stores the result of a `show_many` request for users.
+
+        Args:
+            requested: The IDs that were looked up. Those not in `users` do
+                       not exist any more.
+            users: The raw users from the Zendesk API.
+
+        Raises:
+            FileSaveError: If the database cannot be written.
+        """
+        found = {
+            user["id"]: {"name": user.get("name"), "email": user.get("email"), "organization_id": user.get("organization_id")}
+            for user in users
+        }
+        self._add("users", "user_id", self._users, requested, found)
+
+    def missing_organizations(self, user_ids: Iterable[int]) -> List[int]:
+        """Returns the organizations of known users that need to be looked up, sorted.
+
+        Raises:
+            FileSaveError: If the database cannot be read.
+        """
+        with self._lock:
+            organization_ids = [(self._users.get(user_id) or {}).get("organization_id") for user_id in user_ids]
+        return self._missing("organizations", "organization_id", self._organizations, organization_ids)
+
+    def add_organizations(self, requested: Iterable[int], organizations: List[Dict[str, Any]]) -> None:
+        """Stores the result of a `show_many` request for organizations, like `add_users`.
+
+        Raises:
+            FileSaveError: If the database cannot be written.
+        """
+        found = {organization["id"]: {"name": organization.get("name")} for organization in organizations}
+        self._add("organizations", "organization_id", self._organizations, requested, found)
+
+    def people(self, user_ids: Iterable[int]) -> Dict[int, Person]:
+        """Returns the known users among `user_ids`, by ID.
+
+        Users that have not been looked up, or do not exist any more, are left
+        out. A user whose organization is unknown gets its ID without a name.
+        """
+        people = {}
+        with self._lock:
+            for user_id in user_ids:
+                user = self._users.get(user_id)
+                if user is None:
+                    continue
+                organization_id = user.get("organization_id")
+                organization = self._organizations.get(organization_id) if organization_id is not None else None
+                people[user_id] = Person(
+                    user_id=user_id,
+                    name=user.get("name"),
+                    email=user.get("email"),
+                    organization_id=organization_id,
+                    organization=organization.get("name") if organization else None,
+                )
+        return people
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,195 @@
+"""Streaming building blocks shared by the threaded and asyncio engines.
+
+Tickets flow from the export pages through a bounded queue to a fixed number
+of workers, so fetching, transforming and writing overlap and no more than a
+few tickets are buffered ahead of the workers. `PageTracker` checkpoints each
+page's cursor once every ticket of that page, and of all earlier pages, has
+been handled.
+"""
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+class PipelineItem(NamedTuple):
+    """A ticket on its way through the pipeline.
+
+    Attributes:
+        page: The index of the export page the ticket came from.
+        ticket: The raw ticket dictionary returned by the Zendesk API.
+        comments: The ticket's comments if they were fetched in bulk, or None.
+    """
+    page: int
+    ticket: Dict[str, Any]
+    comments: Optional[List[Dict[str, Any]]]
+
+
+class PageTracker:
+    """Checkpoints page cursors in order as the pages' tickets complete.
+
+    Tickets from several pages can be in flight at once. A page's cursor is
+    only passed to `checkpoint` once all of its tickets and every earlier
+    page have completed, so a checkpoint never skips unfinished work. Once the
+    cursor is stored, `on_checkpoint` is called with the index of the last
+    checkpointed page.
+    """
+
+    def __init__(self, checkpoint: Callable[[str], None], on_checkpoint: Optional[Callable[[int], None]] = None):
+        self._checkpoint = checkpoint
+        self._on_checkpoint = on_checkpoint
+        self._pending = {}
+        self._cursors = {}
+        self._next_page = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, page: int, count: int, cursor: str) -> None:
+        """Registers a page before any of its tickets are handed out."""
+        with self._lock:
+            self._pending[page] = count
+            self._cursors[page] = cursor
+            self._advance()
+
+    def complete(self, page: int) -> None:
+        """Marks one ticket of a page as done."""
+        with self._lock:
+            self._pending[page] -= 1
+            self._advance()
+
+    def _advance(self) -> None:
+        """Checkpoints the newest cursor whose page and predecessors are done."""
+        cursor = None
+        while self._pending.get(self._next_page) == 0:
+            del self._pending[self._next_page]
+            cursor = self._cursors.pop(self._next_page)
+            self._next_page += 1
+        if cursor is not None:
+            try:
+                self._checkpoint(cursor)
+            except (OSError, ZendeskExtractorError) as e:
+                logging.error(f"Could not checkpoint cursor: {e}")
+                return
+            if self._on_checkpoint is not None:
+                try:
+                    self._on_checkpoint(self._next_page - 1)
+                except (OSError, ZendeskExtractorError) as e:
+                    logging.error(f"Could not record checkpoint: {e}")
+
+
+def stream_pages(pages: Iterable[Tuple[List[Dict[str, Any]], str, Dict[int, List[Dict[str, Any]]]]], tracker: PageTracker) -> Iterator[PipelineItem]:
+    """Flattens export pages into pipeline items, registering each page first.
+
+    Args:
+        pages: Tuples of (tickets, after_cursor, prefetched_comments).
+        tracker: The tracker that checkpoints the pages.
+
+    Yields:
+        One `PipelineItem` per ticket.
+    """
+    for page, (tickets, cursor, prefetched) in enumerate(pages):
+        tracker.add_page(page, len(tickets), cursor)
+        for ticket in tickets:
+            yield PipelineItem(page, ticket, prefetched.get(ticket["id"]))
+
+
+async def stream_pages_async(pages: AsyncIterable[Tuple[List[Dict[str, Any]], str, Dict[int, List[Dict[str, Any]]]]], tracker: PageTracker) -> AsyncIterator[PipelineItem]:
+    """Asyncio counterpart of `stream_pages`. Pages are registered in a worker thread, since they may checkpoint."""
+    page = 0
+    async for tickets, cursor, prefetched in pages:
+        await asyncio.to_thread(tracker.add_page, page, len(tickets), cursor)
+        for ticket in tickets:
+            yield PipelineItem(page, ticket, prefetched.get(ticket["id"]))
+        page += 1
+
+
+def run_bounded(items: Iterable[Any], handle: Callable[[Any], Any], max_workers: int, buffer_size: Optional[int] = None) -> int:
+    """Handles items on a fixed pool of threads fed through a bounded queue.
+
+    The items are pulled from `items` in the calling thread, which blocks once
+    `buffer_size` items are waiting. Errors raised by `handle` are logged and
+    do not stop the other items.
+
+    Args:
+        items: The items to handle. Can be a lazy generator.
+        handle: Called once per item on a worker thread.
+        max_workers: The number of worker threads.
+        buffer_size: The most items queued ahead of the workers. Defaults to
+                     twice the number of workers.
+
+    Returns:
+        The number of items read from `items`.
+
+    Raises:
+        Exception: Whatever `items` raises. Items already queued are still
+                   handled before the error propagates.
+    """
+    max_workers = max(max_workers, 1)
+    items_queue = queue.Queue(maxsize=buffer_size or max_workers * 2)
+
+    def worker() -> None:
+        while True:
+            item = items_queue.get()
+            if item is None:
+                return
+            try:
+                handle(item)
+            except Exception:
+                logging.exception("Unexpected error in pipeline worker")
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+    for thread in workers:
+        thread.start()
+
+    count = 0
+    try:
+        for item in items:
+            items_queue.put(item)
+            count += 1
+    finally:
+        for _ in workers:
+            items_queue.put(None)
+        for thread in workers:
+            thread.join()
+    return count
+
+
+async def run_bounded_async(items: AsyncIterable[Any], handle: Callable[[Any], Awaitable[Any]], max_workers: int, buffer_size: Optional[int] = None) -> int:
+    """Asyncio counterpart of `run_bounded`, using worker tasks instead of threads.
+
+    On cancellation the worker tasks are cancelled as well instead of finishing
+    the queued items.
+    """
+    max_workers = max(max_workers, 1)
+    items_queue = asyncio.Queue(maxsize=buffer_size or max_workers * 2)
+
+    async def worker() -> None:
+        while True:
+            item = await items_queue.get()
+            if item is None:
+                return
+            try:
+                await handle(item)
+            except Exception:
+                logging.exception("Unexpected error in pipeline worker")
+
+    async def stop_workers() -> None:
+        for _ in workers:
+            await items_queue.put(None)
+        await asyncio.gather(*workers)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max_workers)]
+    count = 0
+    try:
+        async for item in items:
+            await items_queue.put(item)
+            count += 1
+    except asyncio.CancelledError:
+        for task in workers:
+            task.cancel()
+        raise
+    except Exception:
+        await stop_workers()
+        raise
+    await stop_workers()
+    return count
@@ -0,0 +1,143 @@
+"""Worker processes for the CPU-bound stage of saving tickets.
+
+Fetching is I/O-bound and runs on threads or tasks, but transforming tickets
+and serializing them to JSON and XML holds the GIL, so with enough fetchers
+that stage saturates one core. `BatchProcessPool` moves it to worker
+processes. Callers on any number of threads hand it one ticket at a time and
+block until that ticket is done. The pool groups the tickets into batches,
+so each trip to a worker process carries several tickets.
+
+A batch is sent when it is full, or once its first ticket has waited
+`max_delay` seconds, so tickets are not held back when fetching is slow.
+The worker function returns one result per ticket, so a ticket that fails
+does not fail the others. If a worker process dies, only the tickets of its
+batches fail, and the pool starts new processes for later batches.
+"""
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_DELAY = 0.05
+
+class _Call:
+    """One ticket waiting for its batch."""
+    __slots__ = ("args", "done", "result", "error")
+
+    def __init__(self, args: Any):
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchProcessPool:
+    """Runs a batch function in worker processes for callers that submit one item at a time."""
+
+    def __init__(self, function: Callable[[List[Any]], List[Any]], workers: int, batch_size: int = DEFAULT_BATCH_SIZE, max_delay: float = DEFAULT_MAX_DELAY):
+        """Starts the pool.
+
+        Args:
+            function: A module-level function that takes a list of items and
+                      returns one result per item, in the same order.
+            workers: The number of worker processes.
+            batch_size: The most items sent to a worker at once.
+            max_delay: The most seconds an item waits for its batch to fill.
+        """
+        self.function = function
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        # Worker processes are spawned rather than forked, since the calling
+        # process runs threads that may hold locks.
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = self._new_executor()
+        self._batch: List[_Call] = []
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context)
+
+    def call(self, args: Any) -> Any:
+        """Processes one item in a worker and returns its result.
+
+        Raises:
+            ZendeskExtractorError: If the pool is closed or the worker running
+                                   the item's batch failed.
+        """
+        call = _Call(args)
+        with self._lock:
+            if self._closed:
+                raise ZendeskExtractorError("The worker pool is closed.")
+            self._batch.append(call)
+            if len(self._batch) >= self.batch_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def flush(self) -> None:
+        """Sends the waiting items without waiting for the batch to fill."""
+        with self._lock:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        executor = self._executor
+        try:
+            future = executor.submit(self.function, [call.args for call in batch])
+        except Exception as e:
+            # Every caller of the batch is waiting, so none may be left without a result.
+            self._fail(batch, executor, e)
+            return
+        future.add_done_callback(lambda future: self._deliver(batch, executor, future))
+
+    def _deliver(self, batch: List[_Call], executor: ProcessPoolExecutor, future: Future) -> None:
+        try:
+            results = future.result()
+        except Exception as e:
+            with self._lock:
+                self._fail(batch, executor, e)
+            return
+        for call, result in zip(batch, results):
+            call.result = result
+            call.done.set()
+
+    def _fail(self, batch: List[_Call], executor: ProcessPoolExecutor, error: BaseException) -> None:
+        logging.error(f"A worker process failed on a batch of {len(batch)} tickets: {error!r}")
+        if isinstance(error, BrokenProcessPool) and executor is self._executor and not self._closed:
+            self._executor = self._new_executor()
+            executor.shutdown(wait=False)
+        for call in batch:
+            call.error = ZendeskExtractorError(f"The worker process failed: {error!r}")
+            call.done.set()
+
+    def close(self) -> None:
+        """Sends the waiting items and shuts the workers down once they are done."""
+        with self._lock:
+            self._dispatch()
+            self._closed = True
+            executor = self._executor
+        executor.shutdown(wait=True)
+
+    def __enter__(self) -> "BatchProcessPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,72 @@
+"""Live progress counters for an extraction run."""
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+THROUGHPUT_WINDOW = 10.0
+
+class Progress:
+    """Counts the tickets of a run as they are fetched and processed.
+
+    The counters can be updated from worker threads and read at any time, for
+    example by the web interface while the run is going on.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.fetched = 0
+        self.processed = 0
+        self.failed = 0
+        self.error = None
+        self._clock = clock
+        self._started = clock()
+        self._finished = None
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def add_fetched(self, count: int) -> None:
+        """Records tickets read from the export."""
+        with self._lock:
+            self.fetched += count
+
+    def ticket_done(self, success: bool) -> int:
+        """Records a ticket that was saved (or skipped as unchanged), or that failed.
+
+        Returns:
+            The number of tickets done so far, including this one.
+        """
+        with self._lock:
+            if success:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self._recent.append(self._clock())
+            return self.processed + self.failed
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """Marks the run as finished, with the error that stopped it, if any."""
+        with self._lock:
+            self._finished = self._clock()
+            self.error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the counters and throughput as a dictionary.
+
+        `tickets_per_second` is the average since the start of the run and
+        `current_tickets_per_second` the rate over the last THROUGHPUT_WINDOW
+        seconds.
+        """
+        with self._lock:
+            now = self._finished if self._finished is not None else self._clock()
+            while self._recent and self._recent[0] < now - THROUGHPUT_WINDOW:
+                self._recent.popleft()
+            elapsed = now - self._started
+            done = self.processed + self.failed
+            return {
+                "fetched": self.fetched,
+                "processed": self.processed,
+                "failed": self.failed,
+                "elapsed_seconds": round(elapsed, 3),
+                "tickets_per_second": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+                "current_tickets_per_second": round(len(self._recent) / min(THROUGHPUT_WINDOW, elapsed), 2) if elapsed > 0 else 0.0,
+            }
@@ -0,0 +1,306 @@
+"""Rate-limit-aware request scheduling for the Zendesk API.
+
+A scheduler is shared by every request made through one session. It limits
+the number of requests in flight, reads Zendesk's rate-limit headers to pace
+requests as the per-minute budget runs low, pauses all requests when a 429
+arrives until its Retry-After has passed, and retries transient failures with
+jittered exponential backoff.
+
+The scheduler sits beneath the HTTP clients: `RateLimitedAdapter` plugs it into
+a requests.Session and `RateLimitedTransport` into an httpx.AsyncClient, so the
+fetch functions see only the final response.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+import httpx
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Mapping, Optional, Tuple, Type
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from zendesk_extractor.core import metrics
+
+RETRY_STATUSES = {500, 502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RATE_LIMIT_WINDOW = 60.0
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given either in seconds or as an HTTP date.
+
+    Args:
+        value: The header value, if present.
+
+    Returns:
+        The number of seconds to wait, or None if the header is missing or
+        cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    """Returns the first of the given headers that holds a number."""
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+def record_attempt(start: float, status_code: Optional[int]) -> None:
+    """Records the latency and outcome of one attempt of a request."""
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start)
+    metrics.HTTP_REQUESTS.inc(status=str(status_code) if status_code is not None else "error")
+
+
+def retry_reason(status_code: int) -> str:
+    """Returns the `reason` label of a request retried after a response."""
+    return "rate_limited" if status_code == 429 else "server_error"
+
+
+class _RateLimitPolicy:
+    """The scheduling decisions shared by the threaded and asyncio schedulers.
+
+    Concurrency follows an additive-increase/multiplicative-decrease rule: it is
+    halved on every 429 and grows by one after a full round of successful
+    requests, up to `max_concurrency`. Once the remaining budget reported by
+    the rate-limit headers drops below `headroom` of the limit, requests are
+    spaced evenly over the time left in the rate-limit window.
+    """
+
+    def __init__(self, max_concurrency: int = 10, max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = 1.0, backoff_max: float = 60.0, headroom: float = 0.1, clock: Callable[[], float] = time.monotonic):
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headroom = headroom
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.next_request_at = 0.0
+        self.interval = 0.0
+        self._successes = 0
+        self._clock = clock
+
+    def backoff(self, attempt: int) -> float:
+        """Returns a full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _start_delay(self) -> Optional[float]:
+        """Returns how long until a request may start, or None if no slot is free."""
+        if self.in_flight >= self.concurrency:
+            return None
+        now = self._clock()
+        delay = max(self.paused_until, self.next_request_at) - now
+        if delay <= 0:
+            self.in_flight += 1
+            self.next_request_at = now + self.interval
+            return 0.0
+        return delay
+
+    def observe(self, status_code: int, headers: Mapping[str, str], attempt: int) -> Optional[float]:
+        """Updates the schedule from a response.
+
+        Args:
+            status_code: The HTTP status code of the response.
+            headers: The response headers.
+            attempt: The number of retries already made for this request.
+
+        Returns:
+            How long to wait before retrying the request, or None if the
+            response should be returned to the caller.
+        """
+        now = self._clock()
+        limit = _header_number(headers, "ratelimit-limit", "x-rate-limit")
+        remaining = _header_number(headers, "ratelimit-remaining", "x-rate-limit-remaining")
+        window = _header_number(headers, "ratelimit-reset") or DEFAULT_RATE_LIMIT_WINDOW
+
+        if status_code == 429:
+            retry_after = parse_retry_after(headers.get("retry-after"))
+            if retry_after is None:
+                retry_after = window
+            metrics.RATE_LIMIT_WAITS.inc()
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(max(0.0, now + retry_after - max(self.paused_until, now)))
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.concurrency = max(1, self.concurrency // 2)
+            self._successes = 0
+            logging.warning(f"Rate limited by Zendesk. Pausing requests for {retry_after:.1f}s at concurrency {self.concurrency}.")
+            return 0.0  # The shared pause already delays the retry
+
+        if limit and remaining is not None:
+            if remaining <= limit * self.headroom:
+                self.interval = window / max(remaining, 1)
+            else:
+                self.interval = 0.0
+
+        if status_code in RETRY_STATUSES:
+            return self.backoff(attempt)
+
+        if status_code < 400:
+            self._successes += 1
+            if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+        return None
+
+
+class RateLimitScheduler(_RateLimitPolicy):
+    """Schedules requests made from any number of threads."""
+
+    def __init__(self, *args: Any, sleep: Callable[[float], None] = time.sleep, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._sleep = sleep
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent and reserves a slot for it."""
+        with self._condition:
+            while True:
+                delay = self._start_delay()
+                if delay == 0.0:
+                    return
+                self._condition.wait(delay)
+
+    def release(self) -> None:
+        """Frees the slot reserved by `acquire`."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def send(self, send: Callable[[], Any], retryable: bool = True, retry_exceptions: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """Sends a request under the schedule, retrying transient failures.
+
+        Args:
+            send: Sends the request once and returns the response.
+            retryable: Whether the request may safely be sent more than once.
+            retry_exceptions: Exceptions raised by `send` that are retried.
+
+        Returns:
+            The final response. Once the retries are exhausted the last
+            response is returned, so callers see the original error status.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            start = time.perf_counter()
+            try:
+                response = send()
+            except retry_exceptions as e:
+                record_attempt(start, None)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logging.warning(f"Request failed ({e}). Retrying in {delay:.1f}s.")
+                metrics.HTTP_RETRIES.inc(reason="error")
+            else:
+                record_attempt(start, response.status_code)
+                with self._condition:
+                    delay = self.observe(response.status_code, response.headers, attempt)
+                if delay is None or not retryable or attempt >= self.max_retries:
+                    return response
+                metrics.HTTP_RETRIES.inc(reason=retry_reason(response.status_code))
+                response.close()
+            finally:
+                self.release()
+            self._sleep(delay)
+            attempt += 1
+
+
+class AsyncRateLimitScheduler(_RateLimitPolicy):
+    """Schedules requests made from tasks on a single event loop."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Waits until a request may be sent and reserves a slot for it."""
+        async with self._condition:
+            while True:
+                delay = self._start_delay()
+                if delay == 0.0:
+                    return
+                try:
+                    await asyncio.wait_for(self._condition.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self) -> None:
+        """Frees the slot reserved by `acquire`."""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def send(self, send: Callable[[], Awaitable[Any]], retryable: bool = True, retry_exceptions: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """Asyncio counterpart of `RateLimitScheduler.send`."""
+        attempt = 0
+        while True:
+            await self.acquire()
+            start = time.perf_counter()
+            try:
+                response = await send()
+            except retry_exceptions as e:
+                record_attempt(start, None)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logging.warning(f"Request failed ({e}). Retrying in {delay:.1f}s.")
+                metrics.HTTP_RETRIES.inc(reason="error")
+            else:
+                record_attempt(start, response.status_code)
+                delay = self.observe(response.status_code, response.headers, attempt)
+                if delay is None or not retryable or attempt >= self.max_retries:
+                    return response
+                metrics.HTTP_RETRIES.inc(reason=retry_reason(response.status_code))
+                await response.aclose()
+            finally:
+                await self.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """A requests transport adapter that sends every request through a scheduler."""
+
+    def __init__(self, scheduler: RateLimitScheduler, **kwargs: Any):
+        self.scheduler = scheduler
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        return self.scheduler.send(
+            lambda: super(RateLimitedAdapter, self).send(request, **kwargs),
+            retryable=request.method in RETRY_METHODS,
+            retry_exceptions=(ConnectionError, Timeout),
+        )
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """An httpx transport that sends every request through a scheduler."""
+
+    def __init__(self, scheduler: AsyncRateLimitScheduler, transport: httpx.AsyncBaseTransport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.scheduler.send(
+            lambda: self.transport.handle_async_request(request),
+            retryable=request.method in RETRY_METHODS,
+            retry_exceptions=(httpx.TransportError,),
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
@@ -0,0 +1,45 @@
+"""JSON encoding for the saved ticket files.
+
+orjson is used when it is installed and the standard library `json` module
+otherwise. Both backends write UTF-8 with the same layout: two-space
+indentation by default, or no whitespace at all in compact mode. Either way
+the files stay plain JSON, so any reader of `output/json/{id}.json` can load
+them.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+def dumps(data: Any, compact: bool = False) -> bytes:
+    """Encodes data as UTF-8 JSON.
+
+    Args:
+        data: The data to encode, made of dicts, lists, strings, numbers,
+              booleans and None.
+        compact: Whether to leave out all indentation and whitespace.
+
+    Returns:
+        The encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(data) if compact else orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodes a JSON document written by `dumps` or by any other encoder.
+
+    Raises:
+        ValueError: If the document is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
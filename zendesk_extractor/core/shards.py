@@ -0,0 +1,223 @@
+"""Sharded JSON Lines output.
+
+Instead of one JSON and one XML file per ticket, tickets can be appended to a
+few large JSON Lines files ("shards") in `output/shards`. A shard is closed
+and a new one started once it reaches a size or ticket count, and every run
+starts a new shard, so existing shards are never rewritten.
+
+Shards can be compressed with gzip or, if the `zstandard` package is
+installed, zstd. Each ticket is compressed as its own gzip member or zstd
+frame. The shard is still a regular `.jsonl.gz`/`.jsonl.zst` file that the
+standard tools decompress as a whole, and a single ticket can be read by
+seeking to its offset.
+
+`index.jsonl` records where each ticket was written, one line per write.
+When a ticket is written again in a later run, its newest line wins.
+"""
+import os
+import re
+import logging
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+from zendesk_extractor.core import serializers
+from zendesk_extractor.core.models import Ticket
+from zendesk_extractor.core.compression import check_compression, compress, decompress
+from zendesk_extractor.core.exceptions import FileSaveError, ZendeskExtractorError
+
+SHARD_DIRECTORY = "output/shards"
+INDEX_FILE = "index.jsonl"
+DEFAULT_SHARD_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_SHARD_MAX_TICKETS = 100000
+SHARD_EXTENSIONS = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+_SHARD_NAME = re.compile(r"^tickets-(\d+)\.jsonl")
+
+class ShardLocation(NamedTuple):
+    """Where a ticket is stored.
+
+    Attributes:
+        shard: The file name of the shard, relative to the shard directory.
+        offset: The byte offset of the ticket's record in the shard.
+        length: The length in bytes of the record, compressed if the shard is.
+    """
+    shard: str
+    offset: int
+    length: int
+
+
+def compress_record(record: bytes, compression: Optional[str]) -> bytes:
+    """Compresses one record as a standalone gzip member or zstd frame."""
+    return compress(record, compression)
+
+
+def decompress_record(data: bytes, shard: str) -> bytes:
+    """Decompresses one record, picking the codec from the shard's file name."""
+    return decompress(data, shard)
+
+
+def load_index(directory: str = SHARD_DIRECTORY) -> Dict[int, ShardLocation]:
+    """Loads the shard index.
+
+    Args:
+        directory: The shard directory.
+
+    Returns:
+        A mapping of ticket ID to the location of its newest record. Lines
+        that cannot be parsed, such as a line cut short by a crash, are
+        skipped.
+    """
+    index = {}
+    try:
+        with open(os.path.join(directory, INDEX_FILE), "rb") as f:
+            for line in f:
+                try:
+                    entry = serializers.loads(line)
+                    index[entry["ticket_id"]] = ShardLocation(entry["shard"], entry["offset"], entry["length"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return index
+
+
+def read_record(location: ShardLocation, directory: str = SHARD_DIRECTORY) -> Dict[str, Any]:
+    """Reads one ticket from a shard.
+
+    Args:
+        location: The location of the ticket's record, from the index.
+        directory: The shard directory.
+
+    Returns:
+        The ticket as a dictionary, in the format of `Ticket.to_dict`.
+
+    Raises:
+        OSError: If the shard cannot be read.
+        ValueError: If the record is not valid JSON.
+    """
+    with open(os.path.join(directory, location.shard), "rb") as f:
+        f.seek(location.offset)
+        data = f.read(location.length)
+    return serializers.loads(decompress_record(data, location.shard))
+
+
+class ShardWriter:
+    """Appends tickets to rotating JSON Lines shards and indexes them.
+
+    The writer is safe to share between threads. Shards are opened lazily, so
+    a run without tickets creates no files.
+    """
+
+    def __init__(self, directory: str = SHARD_DIRECTORY, compression: Optional[str] = None, max_bytes: int = DEFAULT_SHARD_MAX_BYTES, max_tickets: int = DEFAULT_SHARD_MAX_TICKETS):
+        """Initializes the writer.
+
+        Args:
+            directory: The directory the shards and the index are written to.
+            compression: None, "gzip" or "zstd".
+            max_bytes: The size at which a shard is closed and the next one
+                       started.
+            max_tickets: The number of tickets after which a shard is closed.
+
+        Raises:
+            ZendeskExtractorError: If the compression is unknown, or is "zstd"
+                                   and the zstandard package is not installed.
+        """
+        check_compression(compression, "shard")
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_tickets = max_tickets
+        self.index = load_index(directory)
+        self._lock = threading.Lock()
+        self._shard = None
+        self._shard_name = None
+        self._shard_tickets = 0
+        self._index_file = None
+        self._next_number = self._last_shard_number() + 1
+
+    def _last_shard_number(self) -> int:
+        """Returns the number of the newest existing shard, or 0 if there are none."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        numbers = [int(match.group(1)) for match in map(_SHARD_NAME.match, names) if match]
+        return max(numbers, default=0)
+
+    def _open_shard(self) -> None:
+        """Closes the current shard, if any, and starts the next one."""
+        if self._shard is not None:
+            self._shard.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._shard_name = f"tickets-{self._next_number:05d}{SHARD_EXTENSIONS[self.compression]}"
+        self._shard = open(os.path.join(self.directory, self._shard_name), "ab")
+        self._shard_tickets = 0
+        self._next_number += 1
+        if self._index_file is None:
+            self._index_file = open(os.path.join(self.directory, INDEX_FILE), "ab")
+        logging.info(f"Writing tickets to shard {self._shard_name}.")
+
+    def write(self, ticket: Ticket) -> ShardLocation:
+        """Appends a ticket to the current shard and records it in the index.
+
+        Args:
+            ticket: The ticket to write.
+
+        Returns:
+            The location of the ticket's record.
+
+        Raises:
+            FileSaveError: If the shard or the index cannot be written.
+        """
+        record = compress_record(serializers.dumps(ticket.to_dict(), compact=True) + b"\n", self.compression)
+        try:
+            with self._lock:
+                if self._shard is None or self._shard.tell() >= self.max_bytes or self._shard_tickets >= self.max_tickets:
+                    self._open_shard()
+                location = ShardLocation(self._shard_name, self._shard.tell(), len(record))
+                self._shard.write(record)
+                self._shard.flush()
+                self._shard_tickets += 1
+                # The index line is written after the record, so the index
+                # never points at data that is not on disk yet.
+                entry = {"ticket_id": ticket.ticket_id, "shard": location.shard, "offset": location.offset, "length": location.length}
+                self._index_file.write(serializers.dumps(entry, compact=True) + b"\n")
+                self._index_file.flush()
+                self.index[ticket.ticket_id] = location
+        except (IOError, OSError) as e:
+            raise FileSaveError(f"Error writing ticket {ticket.ticket_id} to shard: {e}")
+        return location
+
+    def load(self, ticket_id: int) -> Optional[Dict[str, Any]]:
+        """Reads the newest record of a ticket.
+
+        Args:
+            ticket_id: The ID of the ticket.
+
+        Returns:
+            The ticket as a dictionary, or None if it has not been written or
+            its record cannot be read.
+        """
+        location = self.index.get(ticket_id)
+        if location is None:
+            return None
+        try:
+            return read_record(location, self.directory)
+        except (OSError, ValueError, ZendeskExtractorError) as e:
+            logging.warning(f"Could not read ticket {ticket_id} from shard {location.shard}: {e}")
+            return None
+
+    def close(self) -> None:
+        """Closes the current shard and the index."""
+        with self._lock:
+            if self._shard is not None:
+                self._shard.close()
+                self._shard = None
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
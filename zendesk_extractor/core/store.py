@@ -0,0 +1,209 @@
+"""Local SQLite store of extracted tickets, used to skip unchanged work.
+
+The store keeps every saved ticket and comment, keyed by `ticket_id` and
+`comment_id`, together with a content hash of each record. Before a ticket is
+processed, its `updated_at` is compared with the stored one: if it has not
+moved, the ticket is skipped without fetching its comments. Otherwise only the
+comments newer than the last stored comment are fetched and appended to the
+stored conversation. After transformation, the ticket's content hash tells
+whether anything the extractor saves has actually changed; if not, its files
+are left alone.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+from zendesk_extractor.core import serializers
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.exceptions import FileSaveError
+
+STORE_PATH = "output/tickets.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id INTEGER PRIMARY KEY,
+    created_at TEXT,
+    updated_at TEXT,
+    subject TEXT,
+    status TEXT,
+    requester_id INTEGER,
+    assignee_id INTEGER,
+    tags TEXT,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    author_id INTEGER,
+    body TEXT,
+    created_at TEXT,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_by_ticket ON comments (ticket_id, position);
+"""
+
+class StoredTicket(NamedTuple):
+    """What the store knows about a ticket before it is processed again.
+
+    Attributes:
+        updated_at: The `updated_at` of the ticket when it was last saved.
+        content_hash: The content hash of the saved ticket.
+        comments: The saved comments, in the shape of the comments endpoint.
+    """
+    updated_at: Optional[str]
+    content_hash: str
+    comments: List[Dict[str, Any]]
+
+    @property
+    def last_comment_id(self) -> Optional[int]:
+        """The ID of the newest saved comment, or None if there are none."""
+        return max((comment["id"] for comment in self.comments), default=None)
+
+
+def _digest(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(serializers.dumps(data, compact=True)).hexdigest()
+
+
+def content_hash(ticket: Ticket) -> str:
+    """Hashes everything the extractor saves about a ticket except `updated_at`.
+
+    Zendesk bumps `updated_at` for changes to fields the extractor does not
+    save, so it is left out: such updates do not rewrite the ticket's files.
+    """
+    data = ticket.to_dict()
+    del data["updated_at"]
+    return _digest(data)
+
+
+def comment_hash(comment: Comment) -> str:
+    """Hashes a comment, so redacted comments are detected."""
+    return _digest(comment.to_dict())
+
+
+class TicketStore:
+    """An SQLite database of saved tickets and comments.
+
+    The store is safe to share between threads. Every `save` is committed on
+    its own, so the store never runs ahead of the checkpointed cursor by more
+    than the tickets in flight.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        """Opens the store, creating the database if needed.
+
+        Args:
+            path: The path of the SQLite database file.
+
+        Raises:
+            FileSaveError: If the database cannot be opened.
+        """
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+        except (sqlite3.Error, OSError) as e:
+            raise FileSaveError(f"Could not open the ticket store {path}: {e}")
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, ticket_id: int) -> Optional[StoredTicket]:
+        """Returns the stored state of a ticket, or None if it was never saved."""
+        with self._lock:
+            row = self._connection.execute("SELECT updated_at, content_hash FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            if row is None:
+                return None
+            comments = self._connection.execute(
+                "SELECT comment_id, author_id, body, created_at FROM comments WHERE ticket_id = ? ORDER BY position", (ticket_id,)
+            ).fetchall()
+        return StoredTicket(row[0], row[1], [
+            {"id": comment_id, "author_id": author_id, "body": body, "created_at": created_at}
+            for comment_id, author_id, body, created_at in comments
+        ])
+
+    def get_hash(self, ticket_id: int) -> Optional[str]:
+        """Returns the content hash of a stored ticket, or None if it was never saved."""
+        with self._lock:
+            row = self._connection.execute("SELECT content_hash FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, ticket_id: int) -> Optional[Dict[str, Any]]:
+        """Returns a stored ticket in the format of `Ticket.to_dict`, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT ticket_id, created_at, updated_at, subject, status, requester_id, assignee_id, tags FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            comments = self._connection.execute(
+                "SELECT comment_id, author_id, body, created_at FROM comments WHERE ticket_id = ? ORDER BY position", (ticket_id,)
+            ).fetchall()
+        return {
+            "ticket_id": row[0],
+            "created_at": row[1],
+            "updated_at": row[2],
+            "subject": row[3],
+            "status": row[4],
+            "requester_id": row[5],
+            "assignee_id": row[6],
+            "tags": json.loads(row[7]) if row[7] is not None else None,
+            "conversation": [
+                {"comment_id": comment_id, "author_id": author_id, "body": body, "created_at": created_at}
+                for comment_id, author_id, body, created_at in comments
+            ],
+        }
+
+    def save(self, ticket: Ticket, digest: Optional[str] = None) -> None:
+        """Inserts or updates a ticket and its comments.
+
+        Comments are upserted by `comment_id`; unchanged comments are not
+        rewritten. Comments no longer in the conversation are removed.
+
+        Args:
+            ticket: The ticket to save.
+            digest: The ticket's `content_hash`, if it has already been
+                    computed.
+
+        Raises:
+            FileSaveError: If the ticket cannot be written.
+        """
+        digest = digest or content_hash(ticket)
+        comments = [
+            (comment.comment_id, ticket.ticket_id, position, comment.author_id, comment.body, comment.created_at, comment_hash(comment))
+            for position, comment in enumerate(ticket.conversation)
+        ]
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    """INSERT INTO tickets (ticket_id, created_at, updated_at, subject, status, requester_id, assignee_id, tags, content_hash)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (ticket_id) DO UPDATE SET
+                           created_at = excluded.created_at, updated_at = excluded.updated_at, subject = excluded.subject,
+                           status = excluded.status, requester_id = excluded.requester_id, assignee_id = excluded.assignee_id,
+                           tags = excluded.tags, content_hash = excluded.content_hash""",
+                    (ticket.ticket_id, ticket.created_at, ticket.updated_at, ticket.subject, ticket.status,
+                     ticket.requester_id, ticket.assignee_id, json.dumps(ticket.tags), digest),
+                )
+                self._connection.executemany(
+                    """INSERT INTO comments (comment_id, ticket_id, position, author_id, body, created_at, content_hash)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (comment_id) DO UPDATE SET
+                           ticket_id = excluded.ticket_id, position = excluded.position, author_id = excluded.author_id,
+                           body = excluded.body, created_at = excluded.created_at, content_hash = excluded.content_hash
+                       WHERE content_hash != excluded.content_hash OR position != excluded.position""",
+                    comments,
+                )
+                self._connection.execute("DELETE FROM comments WHERE ticket_id = ? AND position >= ?", (ticket.ticket_id, len(comments)))
+        except sqlite3.Error as e:
+            raise FileSaveError(f"Error saving ticket {ticket.ticket_id} to the ticket store: {e}")
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,38 @@
+import os
+import unittest
+from unittest.mock import patch
+from zendesk_extractor.core.accounts import Account, get_accounts
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+class TestAccounts(unittest.TestCase):
+
+    @patch.dict(os.environ, {"ZENDESK_DOMAIN": "single", "ZENDESK_EMAIL": "me@example.com", "ZENDESK_API_TOKEN": "t"}, clear=True)
+    def test_default_account_keeps_files_in_working_directory(self):
+        account, = get_accounts()
+        self.assertEqual(account, Account(None, "single", "me@example.com", "t"))
+        self.assertEqual(account.path("last_cursor.txt"), "last_cursor.txt")
+        with patch.dict(os.environ, {"ZENDESK_JOURNAL_PATH": "/tmp/journal.jsonl"}):
+            self.assertEqual(account.path("run_journal.jsonl", "ZENDESK_JOURNAL_PATH"), "/tmp/journal.jsonl")
+
+    @patch.dict(os.environ, {
+        "ZENDESK_ACCOUNTS": "acme, Globex-EU", "ZENDESK_EMAIL": "me@example.com", "ZENDESK_API_TOKEN": "shared",
+        "ZENDESK_GLOBEX_EU_DOMAIN": "globex", "ZENDESK_GLOBEX_EU_API_TOKEN": "own",
+    }, clear=True)
+    def test_named_accounts(self):
+        acme, globex = get_accounts()
+        self.assertEqual(acme, Account("acme", "acme", "me@example.com", "shared"))
+        self.assertEqual(globex, Account("globex-eu", "globex", "me@example.com", "own"))
+        self.assertEqual(globex.path("output/shards"), os.path.join("accounts", "globex-eu", "output/shards"))
+        # Overrides of the default account's files do not apply to named accounts.
+        with patch.dict(os.environ, {"ZENDESK_JOURNAL_PATH": "/tmp/journal.jsonl"}):
+            self.assertEqual(acme.path("run_journal.jsonl", "ZENDESK_JOURNAL_PATH"), os.path.join("accounts", "acme", "run_journal.jsonl"))
+
+    def test_invalid_account_names(self):
+        for names in ("acme,../etc", "acme,acme", "a-b,a_b"):
+            with patch.dict(os.environ, {"ZENDESK_ACCOUNTS": names}):
+                with self.assertRaises(ZendeskExtractorError):
+                    get_accounts()
+
+
+if __name__ == '__main__':
+    unittest.main()
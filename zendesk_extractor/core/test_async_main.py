@@ -0,0 +1,175 @@
+import os
+import tempfile
+import asyncio
+import unittest
+from unittest.mock import patch
+import httpx
+from zendesk_extractor.core.async_main import get_async_zendesk_session, fetch_tickets_async, fetch_ticket_export_async, fetch_ticket_comments_async, process_tickets_async, main_async, resolve_people_async
+from zendesk_extractor.core.exceptions import ZendeskAPIError
+from zendesk_extractor.core.models import Person
+from zendesk_extractor.core.people import PeopleCache
+from zendesk_extractor.core.progress import Progress
+
+BASE_URL = "https://my_domain.zendesk.com/api/v2"
+
+def make_client(handler):
+    return httpx.AsyncClient(base_url=BASE_URL, transport=httpx.MockTransport(handler))
+
+class TestAsyncZendeskExtractor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        # Keep runs of main() from creating the ticket index and the journal in the working directory.
+        patcher = patch.dict(os.environ, {"ZENDESK_INDEX": "false", "ZENDESK_JOURNAL_PATH": os.path.join(tempfile.mkdtemp(), "journal.jsonl")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('os.getenv')
+    async def test_get_async_zendesk_session_success(self, mock_getenv):
+        mock_getenv.side_effect = ['my_domain', 'my_email', 'my_token']
+        async with get_async_zendesk_session() as client:
+            self.assertIsInstance(client, httpx.AsyncClient)
+            self.assertEqual(str(client.base_url), BASE_URL + "/")
+
+    @patch('os.getenv')
+    async def test_get_async_zendesk_session_missing_credentials(self, mock_getenv):
+        mock_getenv.return_value = None
+        with self.assertRaises(ZendeskAPIError):
+            get_async_zendesk_session()
+
+    async def test_fetch_tickets_async_paginates(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if len(requests) > 2:
+                return httpx.Response(500)
+            if request.url.params.get("page") == "2":
+                return httpx.Response(200, json={"results": [{"id": 2}], "meta": {"has_more": False}})
+            return httpx.Response(200, json={"results": [{"id": 1}], "meta": {"has_more": True}, "links": {"next": BASE_URL + "/search.json?page=2&query=abc"}})
+
+        async with make_client(handler) as client:
+            tickets = [ticket async for ticket in fetch_tickets_async(client, start_time="2023-01-01")]
+        self.assertEqual([ticket["id"] for ticket in tickets], [1, 2])
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(dict(requests[0].url.params), {"query": "type:ticket updated>=2023-01-01"})
+        self.assertEqual(dict(requests[1].url.params), {"page": "2", "query": "abc"})
+
+    async def test_fetch_tickets_async_http_error(self):
+        async with make_client(lambda request: httpx.Response(500)) as client:
+            with self.assertRaises(ZendeskAPIError):
+                [ticket async for ticket in fetch_tickets_async(client)]
+
+    async def test_fetch_ticket_export_async_follows_after_url(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if len(requests) > 2:
+                return httpx.Response(500)
+            if request.url.params.get("cursor") == "c1":
+                return httpx.Response(200, json={"tickets": [{"id": 2}], "after_cursor": "c2", "after_url": None, "end_of_stream": True})
+            return httpx.Response(200, json={"tickets": [{"id": 1}], "after_cursor": "c1", "after_url": BASE_URL + "/incremental/tickets/cursor.json?cursor=c1&per_page=1000", "end_of_stream": False})
+
+        async with make_client(handler) as client:
+            pages = [page async for page in fetch_ticket_export_async(client, start_time=1700000000)]
+        self.assertEqual(pages, [([{"id": 1}], "c1"), ([{"id": 2}], "c2")])
+        self.assertEqual(dict(requests[0].url.params), {"per_page": "1000", "start_time": "1700000000"})
+        self.assertEqual(dict(requests[1].url.params), {"cursor": "c1", "per_page": "1000"})
+
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.async_main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.async_main.get_async_zendesk_session')
+    @patch('zendesk_extractor.core.async_main.process_ticket_async')
+    async def test_main_async_checkpoints_after_each_page(self, mock_process_ticket, mock_get_session, mock_read_cursor, mock_write_cursor):
+        calls = []
+
+        def handler(request):
+            if request.url.params.get("cursor") == "c1":
+                return httpx.Response(200, json={"tickets": [{"id": 3}], "after_cursor": "c2", "after_url": None, "end_of_stream": True})
+            return httpx.Response(200, json={"tickets": [{"id": 1}, {"id": 2, "status": "deleted"}], "after_cursor": "c1", "after_url": BASE_URL + "/incremental/tickets/cursor.json?cursor=c1", "end_of_stream": False})
+
+        async def process(client, ticket, comments=None, output=None):
+            calls.append(("process", ticket["id"]))
+            return True
+
+        mock_get_session.return_value = make_client(handler)
+        mock_process_ticket.side_effect = process
+        mock_write_cursor.side_effect = lambda cursor, cursor_file: calls.append(("checkpoint", cursor))
+        await main_async(max_concurrency=2)
+        self.assertEqual(calls, [("process", 1), ("checkpoint", "c1"), ("process", 3), ("checkpoint", "c2")])
+
+    @patch.dict(os.environ, {"ZENDESK_BACKFILL_START": "2020-01-01"})
+    @patch('zendesk_extractor.core.async_main.extract_account_async')
+    @patch('zendesk_extractor.core.async_main.backfill_account', return_value=4)
+    async def test_main_async_runs_the_backfill(self, mock_backfill_account, mock_extract_account):
+        progress = Progress()
+        await main_async(max_concurrency=2, bulk_comments=False, progress=progress)
+        self.assertEqual(mock_backfill_account.call_args.args[1:], (2, False, progress))
+        mock_extract_account.assert_not_called()
+        self.assertIsNone(progress.error)
+
+    async def test_fetch_ticket_comments_async_success(self):
+        handler = lambda request: httpx.Response(200, json={"comments": [{"id": 1, "body": "a comment"}]})
+        async with make_client(handler) as client:
+            comments = await fetch_ticket_comments_async(client, 123)
+        self.assertEqual(comments, [{"id": 1, "body": "a comment"}])
+
+    async def test_fetch_ticket_comments_async_not_found(self):
+        async with make_client(lambda request: httpx.Response(404)) as client:
+            with self.assertRaisesRegex(ZendeskAPIError, "not found"):
+                await fetch_ticket_comments_async(client, 123)
+
+    async def test_resolve_people_async(self):
+        requests = []
+
+        def handler(request):
+            requests.append((request.url.path, request.url.params["ids"]))
+            if request.url.path.endswith("/users/show_many.json"):
+                return httpx.Response(200, json={"users": [{"id": 1, "name": "Ann", "organization_id": 5}]})
+            return httpx.Response(200, json={"organizations": [{"id": 5, "name": "Acme"}]})
+
+        people = PeopleCache(os.path.join(tempfile.mkdtemp(), "people.db"))
+        self.addCleanup(people.close)
+        async with make_client(handler) as client:
+            self.assertEqual(await resolve_people_async(client, people, [1, 2]), {1: Person(1, "Ann", None, 5, "Acme")})
+            await resolve_people_async(client, people, [1, 2])
+        self.assertEqual(requests, [("/api/v2/users/show_many.json", "1,2"), ("/api/v2/organizations/show_many.json", "5")])
+
+    @patch('zendesk_extractor.core.async_main.process_ticket_async')
+    async def test_process_tickets_async_bounds_concurrency(self, mock_process_ticket):
+        active = 0
+        peak = 0
+
+        async def process(client, ticket, comments=None):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.001)
+            active -= 1
+            return True
+
+        async def tickets():
+            for i in range(20):
+                yield {"id": i}
+
+        mock_process_ticket.side_effect = process
+        count = await process_tickets_async(None, tickets(), max_concurrency=3)
+        self.assertEqual(count, 20)
+        self.assertEqual(mock_process_ticket.call_count, 20)
+        self.assertLessEqual(peak, 3)
+
+    @patch('zendesk_extractor.core.async_main.process_ticket_async')
+    async def test_process_tickets_async_survives_unexpected_errors(self, mock_process_ticket):
+        mock_process_ticket.side_effect = KeyError("id")
+
+        async def tickets():
+            for i in range(10):
+                yield {"id": i}
+
+        count = await asyncio.wait_for(process_tickets_async(None, tickets(), max_concurrency=2), timeout=5)
+        self.assertEqual(count, 10)
+        self.assertEqual(mock_process_ticket.call_count, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from zendesk_extractor.core.backfill import BackfillCoordinator, Slice, clip_pages, parse_time, plan_slices, run_backfill_worker, ticket_timestamp
+from zendesk_extractor.core.exceptions import ZendeskAPIError, ZendeskExtractorError
+
+DAY = 86400
+START = parse_time("2020-01-01")
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.now = [float(START + 10 * DAY)]
+
+    def open(self, **kwargs):
+        kwargs.setdefault("slice_seconds", 3 * DAY)
+        return BackfillCoordinator(self.directory, START, clock=lambda: self.now[0], **kwargs)
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time("2020-01-01"), 1577836800)
+        self.assertEqual(parse_time("2020-01-01T01:00:00Z"), 1577836800 + 3600)
+        with self.assertRaises(ZendeskExtractorError):
+            parse_time("last year")
+
+    def test_plan_slices(self):
+        self.assertEqual(plan_slices(0, 10, 4), [Slice(0, 4), Slice(4, 8), Slice(8, 10)])
+
+    def test_clip_pages_stops_at_the_end_of_the_slice(self):
+        pages = iter([
+            ([{"id": 1, "updated_at": "2020-01-01T00:00:00Z"}, {"id": 2, "generated_timestamp": START + 10}], "c1"),
+            ([{"id": 3, "generated_timestamp": START + 20}, {"id": 4, "generated_timestamp": START + 100}], "c2"),
+            ([{"id": 5, "generated_timestamp": START + 200}], "c3"),
+        ])
+        clipped = list(clip_pages(pages, START + 100))
+        self.assertEqual([[ticket["id"] for ticket in tickets] for tickets, _ in clipped], [[1, 2], [3]])
+        self.assertEqual(ticket_timestamp({"id": 1}), None)
+        # The rest of the export is not requested.
+        self.assertEqual(len(list(pages)), 1)
+
+    def test_plan_is_kept_across_processes(self):
+        first = self.open()
+        self.assertEqual(first.slices, [Slice(START, START + 3 * DAY), Slice(START + 3 * DAY, START + 6 * DAY), Slice(START + 6 * DAY, START + 9 * DAY), Slice(START + 9 * DAY, START + 10 * DAY)])
+        # A process started later does not move the end of the backfill.
+        self.now[0] += DAY
+        self.assertEqual(self.open().end, first.end)
+        with self.assertRaises(ZendeskExtractorError):
+            self.open(slice_seconds=DAY)
+
+    def test_slices_are_claimed_once(self):
+        first, second = self.open(), self.open()
+        self.assertEqual(first.claim(), first.slices[0])
+        self.assertEqual(second.claim(), first.slices[1])
+        first.complete(first.slices[0], tickets=5)
+        self.assertTrue(second.is_done(first.slices[0]))
+        self.assertEqual(first.status(), {"done": 1, "failed": 0, "running": 1, "pending": 2})
+
+    def test_expired_lease_is_taken_over(self):
+        first, second = self.open(lease_seconds=60), self.open(lease_seconds=60)
+        taken = first.claim()
+        self.assertEqual(second.claim(), first.slices[1])
+        # The first process stopped refreshing its lease two minutes ago.
+        os.utime(first.path(taken, "lease"), (self.now[0] - 120, self.now[0] - 120))
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(second.claim(), taken)
+        self.assertFalse(first.refresh(taken))
+        self.assertTrue(second.refresh(taken))
+
+    def test_failed_slices_are_retried_then_left_failed(self):
+        coordinator = self.open(max_attempts=2)
+        backfill_slice = coordinator.claim()
+        coordinator.fail(backfill_slice, "Unauthorized")
+        self.assertEqual(coordinator.claim(), backfill_slice)
+        coordinator.fail(backfill_slice, "Unauthorized")
+        self.assertEqual(coordinator.attempts(backfill_slice), 2)
+        self.assertNotEqual(coordinator.claim(), backfill_slice)
+        self.assertEqual(coordinator.status()["failed"], 1)
+
+    def test_run_backfill_worker(self):
+        coordinator = self.open()
+        failures = []
+
+        def extract(backfill_slice):
+            if backfill_slice == coordinator.slices[1] and not failures:
+                failures.append(backfill_slice)
+                raise ZendeskAPIError("Service Unavailable")
+            return 2
+
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(run_backfill_worker(coordinator, extract, poll_interval=0), 8)
+        self.assertEqual(coordinator.status(), {"done": 4, "failed": 0, "running": 0, "pending": 0})
+        self.assertEqual(coordinator.watermark(), "2020-01-11T00:00:00Z")
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if not name.endswith(".done")), ["plan.json"])
+
+    def test_watermark_waits_for_every_slice(self):
+        coordinator = self.open()
+        coordinator.complete(coordinator.claim(), tickets=1)
+        self.assertIsNone(coordinator.watermark())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from zendesk_extractor.core.bodies import BodyStore, apply_body_refs
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.transformation import convert_to_xml
+
+QUOTED = "Thanks!\n\n> On Monday the customer wrote:\n> " + "The printer is still jammed. " * 40
+
+def make_ticket():
+    return Ticket(
+        ticket_id=1, created_at="c", updated_at="u", subject="Printer", status="open", requester_id=1, assignee_id=2, tags=[],
+        conversation=[
+            Comment(comment_id=10, author_id=1, body=QUOTED, created_at="c"),
+            Comment(comment_id=11, author_id=2, body="Short & sweet", created_at="c"),
+            Comment(comment_id=12, author_id=1, body=QUOTED, created_at="c"),
+        ],
+    )
+
+
+class TestBodyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), "bodies")
+
+    def test_identical_bodies_are_stored_once(self):
+        store = BodyStore(self.directory, compression="gzip", min_bytes=100)
+        refs = store.dedup(make_ticket())
+        self.assertEqual(sorted(refs), [0, 2])
+        self.assertEqual(refs[0], refs[2])
+        files = [name for _, _, names in os.walk(self.directory) for name in names]
+        self.assertEqual(files, [f"{refs[0]}.txt.gz"])
+        self.assertEqual(store.get(refs[0]), QUOTED)
+
+    def test_restore_round_trips_json_and_xml(self):
+        ticket = make_ticket()
+        store = BodyStore(self.directory, min_bytes=100)
+        refs = store.dedup(ticket)
+
+        data = apply_body_refs(ticket.to_dict(), refs)
+        self.assertNotIn("body", data["conversation"][0])
+        self.assertEqual(data["conversation"][1]["body"], "Short & sweet")
+        self.assertEqual(store.restore(data), ticket.to_dict())
+        self.assertEqual(list(data["conversation"][0]), ["comment_id", "author_id", "body", "created_at"])
+
+        xml = convert_to_xml(ticket, refs)
+        self.assertIn(f"<body_ref>{refs[0]}</body_ref>", xml)
+        self.assertEqual(store.restore_xml(xml), convert_to_xml(ticket))
+
+    def test_missing_body_raises(self):
+        with self.assertRaises(OSError):
+            BodyStore(self.directory).get("0" * 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+import requests
+from zendesk_extractor.core.bulk_comments import group_comment_events, plan_comment_window, merge_comments, assemble_comments, fetch_comment_events, CommentEventStream
+from zendesk_extractor.core.main import fetch_comments_in_bulk
+from zendesk_extractor.core.exceptions import ZendeskAPIError
+
+def timestamp(value):
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+TICKET_EVENTS = [
+    {"ticket_id": 1, "updater_id": 7, "created_at": "2023-01-02T00:00:00Z", "child_events": [
+        {"id": 11, "event_type": "Comment", "author_id": 7, "body": "first"},
+        {"id": 12, "event_type": "Change", "field_name": "status"},
+    ]},
+    {"ticket_id": 2, "updater_id": 8, "created_at": "2023-01-03T00:00:00Z", "child_events": [
+        {"id": 21, "event_type": "Comment", "author_id": 8, "body": "second", "created_at": "2023-01-03T00:00:01Z"},
+    ]},
+    {"ticket_id": 1, "updater_id": 9, "created_at": "2023-01-04T00:00:00Z", "child_events": [
+        {"id": 13, "event_type": "Comment", "body": "third"},
+    ]},
+]
+
+class TestBulkComments(unittest.TestCase):
+
+    def test_group_comment_events_by_ticket(self):
+        comments = group_comment_events(TICKET_EVENTS)
+        self.assertEqual(comments[1], [
+            {"id": 11, "author_id": 7, "body": "first", "created_at": "2023-01-02T00:00:00Z"},
+            {"id": 13, "author_id": 9, "body": "third", "created_at": "2023-01-04T00:00:00Z"},
+        ])
+        self.assertEqual(comments[2], [{"id": 21, "author_id": 8, "body": "second", "created_at": "2023-01-03T00:00:01Z"}])
+
+    def test_plan_comment_window(self):
+        tickets = [
+            {"id": 1, "created_at": "2022-01-01T00:00:00Z", "updated_at": "2023-01-04T00:00:00Z"},
+            {"id": 2, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"},
+            {"id": 3, "created_at": "2020-01-01T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"},
+        ]
+        saved = {1: {"updated_at": "2023-01-01T00:00:00Z"}}
+        start, end, ticket_ids = plan_comment_window(tickets, saved)
+        self.assertEqual(start, timestamp("2023-01-01T00:00:00"))
+        self.assertEqual(end, timestamp("2023-01-04T00:00:00"))
+        self.assertEqual(ticket_ids, {1, 2})
+
+    def test_plan_comment_window_nothing_covered(self):
+        tickets = [{"id": 3, "created_at": "2020-01-01T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"}]
+        self.assertEqual(plan_comment_window(tickets, {}), (None, None, set()))
+
+    def test_merge_comments_skips_duplicates(self):
+        previous = [{"id": 1}, {"id": 2}]
+        self.assertEqual(merge_comments(previous, [{"id": 2}, {"id": 3}]), [{"id": 1}, {"id": 2}, {"id": 3}])
+
+    def test_assemble_comments_merges_saved_conversation(self):
+        tickets = [{"id": 1}, {"id": 2}]
+        saved = {1: {"conversation": [{"comment_id": 10, "author_id": 7, "body": "old", "created_at": "2022-12-31T00:00:00Z"}]}}
+        events = group_comment_events(TICKET_EVENTS)
+        comments = assemble_comments(tickets, saved, {1}, events)
+        self.assertEqual(list(comments), [1])
+        self.assertEqual([comment["id"] for comment in comments[1]], [10, 11, 13])
+
+    @patch('requests.Session')
+    def test_fetch_comment_events_stops_after_end_time(self, mock_session):
+        mock_session.base_url = "https://my_domain.zendesk.com/api/v2"
+        first = MagicMock()
+        first.json.return_value = {"ticket_events": TICKET_EVENTS[:2], "next_page": "https://next", "end_time": 100, "end_of_stream": False}
+        second = MagicMock()
+        second.json.return_value = {"ticket_events": TICKET_EVENTS[2:], "next_page": "https://later", "end_time": 300, "end_of_stream": False}
+        mock_session.get.side_effect = [first, second]
+        stream = CommentEventStream()
+        stream.start_time = 50
+        fetch_comment_events(mock_session, stream, 200)
+        self.assertEqual(mock_session.get.call_count, 2)
+        self.assertEqual(mock_session.get.call_args_list[0].kwargs["params"], {"start_time": 50, "include": "comment_events"})
+        self.assertEqual(len(stream.comments[1]), 2)
+
+        # The stream already covers earlier times, and continues from where it stopped.
+        fetch_comment_events(mock_session, stream, 250)
+        self.assertEqual(mock_session.get.call_count, 2)
+        third = MagicMock()
+        third.json.return_value = {"ticket_events": [], "next_page": "https://last", "end_time": 500, "end_of_stream": False}
+        mock_session.get.side_effect = [third]
+        fetch_comment_events(mock_session, stream, 400)
+        self.assertEqual(mock_session.get.call_args.args[0], "https://later")
+        self.assertIsNone(mock_session.get.call_args.kwargs["params"])
+
+    @patch('requests.Session')
+    def test_fetch_comment_events_request_exception(self, mock_session):
+        mock_session.get.side_effect = requests.exceptions.RequestException("Test Exception")
+        stream = CommentEventStream()
+        stream.start_time = 0
+        with self.assertRaises(ZendeskAPIError):
+            fetch_comment_events(mock_session, stream, 1)
+
+    @patch('requests.Session')
+    def test_event_stream_is_read_once_across_pages(self, mock_session):
+        mock_session.base_url = "https://my_domain.zendesk.com/api/v2"
+        first = MagicMock()
+        first.json.return_value = {"ticket_events": TICKET_EVENTS[:2], "next_page": "https://next", "end_time": timestamp("2023-01-03T12:00:00"), "end_of_stream": False}
+        second = MagicMock()
+        second.json.return_value = {"ticket_events": TICKET_EVENTS[2:], "next_page": "https://next2", "end_time": timestamp("2023-01-05T00:00:00"), "end_of_stream": True}
+        mock_session.get.side_effect = [first, second]
+        stream = CommentEventStream()
+
+        page = [{"id": 2, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"}]
+        end_time, ticket_ids = stream.plan(page, {})
+        self.assertEqual((stream.start_time, ticket_ids), (timestamp("2023-01-02T00:00:00"), {2}))
+        fetch_comment_events(mock_session, stream, end_time)
+        self.assertEqual([comment["id"] for comment in stream.assemble(page, {}, ticket_ids)[2]], [21])
+
+        # The next page continues the stream instead of opening a new window.
+        page = [
+            {"id": 1, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-04T00:00:00Z"},
+            {"id": 3, "created_at": "2023-01-01T00:00:00Z", "updated_at": "2023-01-04T00:00:00Z"},
+        ]
+        end_time, ticket_ids = stream.plan(page, {})
+        self.assertEqual(ticket_ids, {1})  # Ticket 3 needs events from before the stream started
+        fetch_comment_events(mock_session, stream, end_time)
+        self.assertEqual(mock_session.get.call_count, 2)
+        self.assertEqual(mock_session.get.call_args.args[0], "https://next")
+        self.assertEqual([comment["id"] for comment in stream.assemble(page, {}, ticket_ids)[1]], [11, 13])
+
+        # Events already assembled are gone, so a ticket saved in between falls back.
+        self.assertEqual(stream.plan([{"id": 2, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-04T00:00:00Z"}], {}), (None, set()))
+
+    @patch('zendesk_extractor.core.main.fetch_comment_events')
+    @patch('zendesk_extractor.core.main.load_saved_ticket', return_value=None)
+    def test_fetch_comments_in_bulk_falls_back_on_error(self, mock_load_saved, mock_fetch_events):
+        mock_fetch_events.side_effect = ZendeskAPIError("Test Exception")
+        tickets = [{"id": 2, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"}]
+        self.assertEqual(fetch_comments_in_bulk(MagicMock(), tickets), {})
+
+    @patch('zendesk_extractor.core.main.fetch_comment_events')
+    @patch('zendesk_extractor.core.main.load_saved_ticket', return_value=None)
+    def test_fetch_comments_in_bulk(self, mock_load_saved, mock_fetch_events):
+        mock_fetch_events.side_effect = lambda session, stream, end_time: stream.add_page({"ticket_events": TICKET_EVENTS, "end_time": end_time, "end_of_stream": True})
+        tickets = [{"id": 2, "created_at": "2023-01-02T00:00:00Z", "updated_at": "2023-01-03T00:00:00Z"}]
+        comments = fetch_comments_in_bulk(MagicMock(), tickets)
+        self.assertEqual([comment["id"] for comment in comments[2]], [21])
+
+
+if __name__ == '__main__':
+    unittest.main()
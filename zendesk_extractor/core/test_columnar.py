@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from zendesk_extractor.core.columnar import ColumnarWriter
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.exceptions import FileSaveError
+
+try:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    ds = pq = None
+
+def make_ticket(ticket_id: int, comments: int = 2) -> Ticket:
+    return Ticket(
+        ticket_id=ticket_id, created_at="2023-10-27T10:30:00Z", updated_at="2023-10-27T10:35:00Z", subject=f"Ticket {ticket_id}",
+        status="open", requester_id=1, assignee_id=None, tags=["billing"],
+        conversation=[Comment(comment_id=ticket_id * 100 + i, author_id=1, body=f"Comment {i}", created_at="2023-10-27T10:35:00Z") for i in range(comments)],
+    )
+
+@unittest.skipIf(ds is None, "pyarrow is not installed")
+class TestColumnarWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def read(self, table):
+        return ds.dataset(os.path.join(self.directory, table), format="parquet", partitioning="hive").to_table()
+
+    def test_writes_typed_tickets_and_comments(self):
+        with ColumnarWriter(self.directory, run_id="r1", row_group_size=2) as writer:
+            for ticket_id in range(1, 4):
+                writer.write(make_ticket(ticket_id))
+
+        tickets = self.read("tickets")
+        self.assertEqual(tickets.column("ticket_id").to_pylist(), [1, 2, 3])
+        self.assertEqual(tickets.column("updated_at")[0].as_py(), datetime(2023, 10, 27, 10, 35, tzinfo=timezone.utc))
+        self.assertEqual(tickets.column("tags")[0].as_py(), ["billing"])
+        self.assertIsNone(tickets.column("assignee_id")[0].as_py())
+        self.assertEqual(tickets.column("run").to_pylist(), ["r1"] * 3)
+
+        comments = self.read("comments")
+        self.assertEqual(comments.num_rows, 6)
+        self.assertEqual(comments.column("ticket_id").to_pylist(), [1, 1, 2, 2, 3, 3])
+
+        self.assertEqual(pq.ParquetFile(os.path.join(self.directory, "tickets", "run=r1", "part-00000.parquet")).num_row_groups, 2)
+
+    def test_runs_add_partitions(self):
+        with ColumnarWriter(self.directory, run_id="r1") as writer:
+            writer.write(make_ticket(1))
+        with ColumnarWriter(self.directory, run_id="r2") as writer:
+            writer.write(make_ticket(1))
+            writer.write(make_ticket(2))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, "tickets"))), ["run=r1", "run=r2"])
+        self.assertEqual(self.read("tickets").num_rows, 3)
+
+    def test_empty_run_creates_no_partition(self):
+        ColumnarWriter(self.directory).close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_unfinished_file_is_hidden(self):
+        writer = ColumnarWriter(self.directory, run_id="r1", row_group_size=1)
+        writer.write(make_ticket(1))
+        self.assertEqual(os.listdir(os.path.join(self.directory, "tickets", "run=r1")), [".part-00000.parquet.inprogress"])
+        writer.close()
+        self.assertEqual(os.listdir(os.path.join(self.directory, "tickets", "run=r1")), ["part-00000.parquet"])
+
+    def test_checkpoint_completes_the_part_files(self):
+        writer = ColumnarWriter(self.directory, run_id="r1")
+        writer.write(make_ticket(1))
+        writer.checkpoint()
+        # The checkpointed rows are readable while the run goes on.
+        self.assertEqual(self.read("tickets").num_rows, 1)
+        writer.checkpoint()
+        writer.write(make_ticket(2))
+        writer.close()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, "comments", "run=r1"))), ["part-00000.parquet", "part-00001.parquet"])
+        self.assertEqual(self.read("tickets").column("ticket_id").to_pylist(), [1, 2])
+
+    def test_write_error_fails_later_tickets_and_checkpoints(self):
+        writer = ColumnarWriter(self.directory, run_id="r1", row_group_size=2)
+        writer.write(make_ticket(1))
+        writer.checkpoint()
+        with patch.object(pq.ParquetWriter, "write_table", side_effect=OSError("disk full")):
+            with self.assertRaises(FileSaveError):
+                writer.write(make_ticket(2))
+        # The rows of the tickets after the checkpoint are not all written, so
+        # neither later tickets nor the next checkpoint may succeed.
+        with self.assertRaises(FileSaveError):
+            writer.write(make_ticket(3))
+        with self.assertRaises(FileSaveError):
+            writer.checkpoint()
+        with self.assertRaises(FileSaveError):
+            writer.close()
+        self.assertEqual(os.listdir(os.path.join(self.directory, "tickets", "run=r1")), ["part-00000.parquet"])
+        self.assertEqual(self.read("tickets").column("ticket_id").to_pylist(), [1])
+
+    def test_new_run_ids_do_not_collide(self):
+        first = ColumnarWriter(self.directory)
+        first.write(make_ticket(1))
+        first.close()
+        second = ColumnarWriter(self.directory)
+        self.assertNotEqual(first.run_id, second.run_id)
+
+    @patch('zendesk_extractor.core.columnar.datetime')
+    def test_writers_started_in_the_same_second_get_their_own_partitions(self, mock_datetime):
+        mock_datetime.now.return_value = datetime(2023, 10, 27, 10, 30, tzinfo=timezone.utc)
+        first = ColumnarWriter(self.directory)
+        second = ColumnarWriter(self.directory)
+        self.assertEqual((first.run_id, second.run_id), ("20231027T103000Z", "20231027T103000Z-1"))
+        first.write(make_ticket(1))
+        second.write(make_ticket(2))
+        first.close()
+        second.close()
+        self.assertEqual(sorted(self.read("tickets").column("ticket_id").to_pylist()), [1, 2])
+
+    def test_taken_run_id_is_refused(self):
+        ColumnarWriter(self.directory, run_id="r1")
+        with self.assertRaises(FileSaveError):
+            ColumnarWriter(self.directory, run_id="r1")
+
+
+if __name__ == '__main__':
+    unittest.main()
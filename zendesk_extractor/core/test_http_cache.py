@@ -0,0 +1,112 @@
+import os
+import gzip
+import tempfile
+import unittest
+from unittest.mock import patch
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from zendesk_extractor.core import metrics
+from zendesk_extractor.core.http_cache import HttpCache, CachedResponse, CachingAdapter, CachingTransport
+from zendesk_extractor.core.scheduler import RateLimitScheduler, AsyncRateLimitScheduler, RateLimitedTransport
+
+URL = "https://my_domain.zendesk.com/api/v2/tickets/1/comments.json"
+
+def make_response(request, status_code, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response._content = body
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    return response
+
+class TestHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "http_cache.db")
+        self.now = [1000.0]
+
+    def open(self, max_bytes=1000):
+        cache = HttpCache(self.path, max_bytes=max_bytes, clock=lambda: self.now[0])
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_responses_are_kept_across_runs(self):
+        self.open().put(URL, CachedResponse('W/"abc"', None, {"Content-Type": "application/json"}, b"{}"))
+        cached = self.open().get(URL)
+        self.assertEqual(cached.body, b"{}")
+        self.assertEqual(cached.conditional_headers(), {"If-None-Match": 'W/"abc"'})
+        self.assertIsNone(self.open().get(URL + "?page=2"))
+
+    def test_least_recently_used_responses_are_evicted(self):
+        cache = self.open(max_bytes=250)
+        for page in range(3):
+            self.now[0] += 1
+            cache.put(f"{URL}?page={page}", CachedResponse('"e"', None, {}, b"x" * 100))
+        self.assertIsNone(cache.get(f"{URL}?page=0"))
+
+        self.now[0] += 1
+        cache.touch(f"{URL}?page=1")
+        self.now[0] += 1
+        cache.put(f"{URL}?page=3", CachedResponse('"e"', None, {}, b"x" * 100))
+        self.assertEqual([cache.get(f"{URL}?page={page}") is not None for page in range(4)], [False, True, False, True])
+
+        # A body larger than the whole cache is not cached.
+        cache.put(URL, CachedResponse('"e"', None, {}, b"x" * 300))
+        self.assertIsNone(cache.get(URL))
+
+    @patch.object(HTTPAdapter, 'send')
+    def test_adapter_replays_not_modified_responses(self, mock_send):
+        sent = []
+
+        def send(request, **kwargs):
+            sent.append(dict(request.headers))
+            if request.headers.get("If-None-Match") == '"v1"':
+                return make_response(request, 304, headers={"ETag": '"v1"', "X-Rate-Limit-Remaining": "99"})
+            return make_response(request, 200, b'{"comments": []}', {"ETag": '"v1"', "Content-Type": "application/json", "Content-Encoding": "gzip"})
+
+        mock_send.side_effect = send
+        session = requests.Session()
+        session.mount("https://", CachingAdapter(self.open(), RateLimitScheduler(sleep=lambda delay: None)))
+        hits = metrics.HTTP_CACHE_REQUESTS.value(result="hit")
+
+        self.assertEqual(session.get(URL).json(), {"comments": []})
+        response = session.get(URL)
+        self.assertEqual((response.status_code, response.json()), (200, {"comments": []}))
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["X-Rate-Limit-Remaining"], "99")
+        self.assertNotIn("If-None-Match", sent[0])
+        self.assertEqual(sent[1]["If-None-Match"], '"v1"')
+        self.assertEqual(metrics.HTTP_CACHE_REQUESTS.value(result="hit"), hits + 1)
+
+        # Other methods are not cached.
+        session.post(URL)
+        self.assertNotIn("If-None-Match", sent[2])
+
+
+class TestCachingTransport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_transport_replays_not_modified_responses(self):
+        statuses = []
+
+        def handler(request):
+            if request.headers.get("If-Modified-Since") == "Mon, 01 Jan 2024 00:00:00 GMT":
+                statuses.append(304)
+                return httpx.Response(304)
+            statuses.append(200)
+            return httpx.Response(200, headers={"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT", "Content-Encoding": "gzip"}, content=gzip.compress(b'{"comments": []}'))
+
+        cache = HttpCache(os.path.join(tempfile.mkdtemp(), "http_cache.db"))
+        transport = CachingTransport(cache, RateLimitedTransport(AsyncRateLimitScheduler(), httpx.MockTransport(handler)))
+        async with httpx.AsyncClient(transport=transport) as client:
+            first = await client.get(URL)
+            second = await client.get(URL)
+        self.assertEqual(statuses, [200, 304])
+        self.assertEqual(first.json(), {"comments": []})
+        self.assertEqual((second.status_code, second.json()), (200, {"comments": []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
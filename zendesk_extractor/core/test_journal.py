@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from zendesk_extractor.core.journal import TicketJournal
+
+class TestTicketJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "journal.jsonl")
+
+    def open(self, **kwargs):
+        journal = TicketJournal(self.path, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_entries_survive_a_restart(self):
+        journal = self.open(batch_size=2)
+        journal.record({"id": 1, "updated_at": "2023-10-27T10:00:00Z"}, page=0)
+        journal.record({"id": 2, "updated_at": "2023-10-27T11:00:00Z"}, page=0)
+        journal.record({"id": 3, "updated_at": "2023-10-27T12:00:00Z"}, page=0)
+        # Only full batches are on disk until the journal is flushed.
+        with open(self.path) as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+        journal.flush()
+
+        restarted = self.open()
+        self.assertTrue(restarted.skip({"id": 1, "updated_at": "2023-10-27T10:00:00Z"}, page=0))
+        self.assertTrue(restarted.skip({"id": 3, "updated_at": "2023-10-27T12:00:00Z"}, page=0))
+        # A ticket updated since it was completed is processed again.
+        self.assertFalse(restarted.skip({"id": 2, "updated_at": "2023-10-28T09:00:00Z"}, page=0))
+        self.assertFalse(restarted.skip({"id": 4, "updated_at": "2023-10-27T12:00:00Z"}, page=0))
+
+    def test_flushes_after_interval(self):
+        now = [0.0]
+        journal = self.open(batch_size=100, flush_interval=1.0, clock=lambda: now[0])
+        journal.record({"id": 1, "updated_at": "a"}, page=0)
+        now[0] = 2.0
+        journal.record({"id": 2, "updated_at": "b"}, page=0)
+        with open(self.path) as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+    def test_torn_line_is_ignored(self):
+        with open(self.path, "w") as f:
+            f.write('{"ticket_id": 1, "updated_at": "a"}\n{"ticket_id": 2, "upd')
+        with self.assertLogs(level="WARNING"):
+            journal = self.open()
+        self.assertTrue(journal.skip({"id": 1, "updated_at": "a"}, page=0))
+        self.assertFalse(journal.skip({"id": 2, "updated_at": "a"}, page=0))
+
+    def test_checkpoint_compacts_and_returns_watermark(self):
+        journal = self.open(batch_size=1)
+        journal.record({"id": 1, "updated_at": "2023-10-27T12:00:00Z"}, page=0)
+        journal.record({"id": 2, "updated_at": "2023-10-27T10:00:00Z"}, page=0)
+        journal.record({"id": 3, "updated_at": "2023-10-27T13:00:00Z"}, page=1)
+        self.assertEqual(journal.checkpoint(0), "2023-10-27T12:00:00Z")
+        journal.record({"id": 4, "updated_at": "2023-10-27T14:00:00Z"}, page=1)
+        with open(self.path) as f:
+            self.assertEqual([line for line in f.read().splitlines()], [
+                '{"ticket_id": 3, "updated_at": "2023-10-27T13:00:00Z"}',
+                '{"ticket_id": 4, "updated_at": "2023-10-27T14:00:00Z"}',
+            ])
+        self.assertEqual(journal.checkpoint(1), "2023-10-27T14:00:00Z")
+
+    def test_journal_without_skipping_only_keeps_the_watermark(self):
+        self.open(batch_size=1).record({"id": 1, "updated_at": "a"}, page=0)
+
+        journal = self.open(batch_size=1, skip_completed=False)
+        self.assertFalse(journal.skip({"id": 1, "updated_at": "a"}, page=0))
+        journal.record({"id": 2, "updated_at": "2023-10-27T10:00:00Z"}, page=0)
+        journal.record({"id": 3, "updated_at": "2023-10-27T13:00:00Z"}, page=1)
+        self.assertEqual(journal.checkpoint(0), "2023-10-27T10:00:00Z")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "")
+
+    def test_finished_run_removes_the_journal(self):
+        journal = TicketJournal(self.path)
+        journal.record({"id": 1, "updated_at": "a"}, page=0)
+        journal.close(finished=True)
+        self.assertFalse(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,34 @@
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock, mock_open, ANY
 import requests
 import os
-from zendesk_extractor.core.main import get_zendesk_session, fetch_tickets, fetch_ticket_comments, save_as_json, save_as_xml, main
-from zendesk_extractor.core.exceptions import ZendeskAPIError, FileSaveError
-from zendesk_extractor.core.models import Ticket, Comment
+import json
+import gzip
+import tempfile
+from datetime import datetime, timedelta, timezone
+from zendesk_extractor.core.main import (
+    get_zendesk_session, fetch_tickets, fetch_ticket_comments, save_as_json, save_as_xml, process_ticket, get_max_workers, DEFAULT_MAX_WORKERS, main,
+    fetch_ticket_export, iter_tickets, read_cursor, write_cursor, get_export_start_time, write_last_run, get_shard_writer, transform_and_save,
+    get_process_pool, RenderedTicket, load_saved_ticket, get_run_output, resolve_people, get_people_cache, prepare_pages, get_http_cache,
+    checkpoint_cursor,
+)
+from zendesk_extractor.core.accounts import Account
+from zendesk_extractor.core.http_cache import CachingAdapter
+from zendesk_extractor.core.exceptions import ZendeskAPIError, FileSaveError, ZendeskExtractorError
+from zendesk_extractor.core.models import Ticket, Comment, Person
+from zendesk_extractor.core.people import PeopleCache
+from zendesk_extractor.core.output import RunOutput
+from zendesk_extractor.core.progress import Progress
+from zendesk_extractor.core.store import TicketStore, StoredTicket
 
 class TestZendeskExtractor(unittest.TestCase):
 
+    def setUp(self):
+        # Keep runs of main() from creating the ticket index and the journal in the working directory.
+        patcher = patch.dict(os.environ, {"ZENDESK_INDEX": "false", "ZENDESK_JOURNAL_PATH": os.path.join(tempfile.mkdtemp(), "journal.jsonl")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('os.getenv')
     def test_get_zendesk_session_success(self, mock_getenv):
         mock_getenv.side_effect = ['my_domain', 'my_email', 'my_token']
@@ -68,20 +89,33 @@ class TestZendeskExtractor(unittest.TestCase):
         ticket = Ticket(ticket_id=1, created_at="2023-01-01", updated_at="2023-01-01", subject="Test", status="open", requester_id=1, assignee_id=1, tags=[])
         save_as_json(1, ticket)
         mock_makedirs.assert_called_once_with("output/json", exist_ok=True)
-        mock_file.assert_called_once_with(os.path.join("output/json", "1.json"), "w")
+        mock_file.assert_called_once_with(os.path.join("output/json", "1.json"), "wb")
+        self.assertEqual(json.loads(mock_file().write.call_args[0][0]), ticket.to_dict())
+
+    @patch.dict(os.environ, {"ZENDESK_JSON_COMPACT": "true"})
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('os.makedirs')
+    def test_save_as_json_compact(self, mock_makedirs, mock_file):
+        ticket = Ticket(ticket_id=1, created_at="2023-01-01", updated_at="2023-01-01", subject="Test", status="open", requester_id=1, assignee_id=1, tags=[])
+        save_as_json(1, ticket)
+        written = mock_file().write.call_args[0][0]
+        self.assertNotIn(b"\n", written)
+        self.assertEqual(json.loads(written), ticket.to_dict())
 
     @patch('builtins.open', new_callable=mock_open)
     def test_save_as_json_io_error(self, mock_open):
         mock_open.side_effect = IOError("Test IOError")
+        ticket = Ticket(ticket_id=123, created_at="2023-01-01", updated_at="2023-01-01", subject="Test", status="open", requester_id=1, assignee_id=1, tags=[])
         with self.assertRaises(FileSaveError):
-            save_as_json(123, MagicMock())
+            save_as_json(123, ticket)
 
     @patch('builtins.open', new_callable=mock_open)
     @patch('os.makedirs')
     def test_save_as_xml_success(self, mock_makedirs, mock_file):
         save_as_xml(1, "<xml></xml>")
         mock_makedirs.assert_called_once_with("output/xml", exist_ok=True)
-        mock_file.assert_called_once_with(os.path.join("output/xml", "1.xml"), "w")
+        mock_file.assert_called_once_with(os.path.join("output/xml", "1.xml"), "wb")
+        mock_file().write.assert_called_once_with(b"<xml></xml>")
 
 
     @patch('builtins.open', new_callable=mock_open)
@@ -91,21 +125,457 @@ class TestZendeskExtractor(unittest.TestCase):
             save_as_xml(123, "<xml></xml>")
 
     @patch('zendesk_extractor.core.main.get_zendesk_session')
-    @patch('zendesk_extractor.core.main.fetch_tickets')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.process_ticket', return_value=True)
+    def test_main_backfills_in_slices(self, mock_process_ticket, mock_fetch_export, mock_get_session):
+        directory = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(directory)
+        self.addCleanup(os.chdir, cwd)
+        start = int(datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp())
+
+        def fetch_export(session, cursor=None, start_time=None):
+            # Each slice starts its own export, which runs on past the end of the slice.
+            ticket_ids = range(start_time // 86400, start_time // 86400 + 4)
+            return iter([([{"id": ticket_id, "generated_timestamp": ticket_id * 86400, "updated_at": "u"} for ticket_id in ticket_ids], f"c{start_time}")])
+
+        mock_fetch_export.side_effect = fetch_export
+        progress = Progress()
+        env = {"ZENDESK_BACKFILL_START": "2020-01-01", "ZENDESK_BACKFILL_END": "2020-01-05", "ZENDESK_BACKFILL_SLICE_DAYS": "2"}
+        with patch.dict(os.environ, env):
+            main(max_workers=2, progress=progress)
+
+        self.assertIsNone(progress.error)
+        self.assertEqual(sorted(call.args[1]["id"] for call in mock_process_ticket.call_args_list), [start // 86400 + day for day in range(4)])
+        self.assertEqual([call.kwargs["start_time"] for call in mock_fetch_export.call_args_list], [start, start + 2 * 86400])
+        with open("last_run.txt") as f:
+            self.assertEqual(f.read(), "2020-01-05T00:00:00Z")
+        self.assertFalse(os.path.exists("last_cursor.txt"))
+
+        # A backfill of another range is refused while this one is kept.
+        with patch.dict(os.environ, dict(env, ZENDESK_BACKFILL_SLICE_DAYS="1")):
+            main(max_workers=2, progress=progress)
+        self.assertIn("holds a backfill", progress.error)
+
+        # An invalid slice length is refused rather than replaced by the default.
+        with patch.dict(os.environ, dict(env, ZENDESK_BACKFILL_SLICE_DAYS="-2")):
+            main(max_workers=2, progress=progress)
+        self.assertIn("ZENDESK_BACKFILL_SLICE_DAYS", progress.error)
+
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
     @patch('zendesk_extractor.core.main.fetch_ticket_comments')
     @patch('zendesk_extractor.core.main.transform_to_structured_json')
     @patch('zendesk_extractor.core.main.convert_to_xml')
     @patch('zendesk_extractor.core.main.save_as_json')
     @patch('zendesk_extractor.core.main.save_as_xml')
-    def test_main_success(self, mock_save_xml, mock_save_json, mock_convert_xml, mock_transform_json, mock_fetch_comments, mock_fetch_tickets, mock_get_session):
+    def test_main_success(self, mock_save_xml, mock_save_json, mock_convert_xml, mock_transform_json, mock_fetch_comments, mock_fetch_export, mock_get_session, mock_read_cursor, mock_write_cursor):
         mock_get_session.return_value = MagicMock()
-        mock_fetch_tickets.return_value = [{"id": 1}]
+        mock_fetch_export.return_value = iter([([{"id": 1}], "next")])
         mock_fetch_comments.return_value = [{"id": 1, "body": "a comment"}]
         mock_transform_json.return_value = MagicMock()
         mock_convert_xml.return_value = "<xml></xml>"
         main()
         mock_save_json.assert_called_once()
         mock_save_xml.assert_called_once()
+        mock_fetch_export.assert_called_once_with(mock_get_session.return_value, cursor="abc", start_time=None)
+        mock_write_cursor.assert_called_once_with("next", "last_cursor.txt")
+
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.process_ticket')
+    def test_main_checkpoints_after_each_page(self, mock_process_ticket, mock_fetch_export, mock_get_session, mock_read_cursor, mock_write_cursor):
+        calls = []
+        mock_process_ticket.side_effect = lambda session, ticket, comments=None, output=None: calls.append(("process", [ticket["id"]]))
+        mock_write_cursor.side_effect = lambda cursor, cursor_file: calls.append(("checkpoint", cursor))
+        mock_fetch_export.return_value = iter([
+            ([{"id": 1}, {"id": 2, "status": "deleted"}], "c1"),
+            ([{"id": 3}], "c2"),
+        ])
+        main(max_workers=1)
+        self.assertEqual(calls, [("process", [1]), ("checkpoint", "c1"), ("process", [3]), ("checkpoint", "c2")])
+
+    @patch('zendesk_extractor.core.main.write_last_run')
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.process_ticket', return_value=True)
+    def test_main_resumes_from_journal(self, mock_process_ticket, mock_fetch_export, mock_get_session, mock_read_cursor, mock_write_cursor, mock_write_last_run):
+        journal_path = os.environ["ZENDESK_JOURNAL_PATH"]
+        with open(journal_path, "w") as f:
+            f.write('{"ticket_id": 1, "updated_at": "2023-10-27T10:00:00Z"}\n')
+        mock_fetch_export.return_value = iter([
+            ([{"id": 1, "updated_at": "2023-10-27T10:00:00Z"}, {"id": 2, "updated_at": "2023-10-27T11:00:00Z"}], "c1"),
+        ])
+        main(max_workers=1)
+        self.assertEqual([call.args[1]["id"] for call in mock_process_ticket.call_args_list], [2])
+        mock_write_cursor.assert_called_once_with("c1", "last_cursor.txt")
+        mock_write_last_run.assert_called_once_with("2023-10-27T11:00:00Z", "last_run.txt")
+        self.assertFalse(os.path.exists(journal_path))
+
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.process_ticket')
+    def test_main_does_not_checkpoint_failed_page(self, mock_process_ticket, mock_fetch_export, mock_get_session, mock_read_cursor, mock_write_cursor):
+        def pages():
+            yield [{"id": 1}], "c1"
+            raise ZendeskAPIError("Test Exception")
+        mock_fetch_export.return_value = pages()
+        main()
+        mock_write_cursor.assert_called_once_with("c1", "last_cursor.txt")
+
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.process_ticket', return_value=True)
+    def test_main_extracts_several_accounts(self, mock_process_ticket, mock_fetch_export, mock_get_session):
+        directory = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(directory)
+        self.addCleanup(os.chdir, cwd)
+
+        def get_session(pool_size, account, http_cache=None):
+            session = MagicMock()
+            session.account = account.name
+            return session
+
+        def fetch_export(session, cursor=None, start_time=None):
+            if session.account == "broken":
+                raise ZendeskAPIError("Unauthorized")
+            return iter([([{"id": 1, "updated_at": "2023-10-27T10:00:00Z"}], f"{session.account}-c1")])
+
+        mock_get_session.side_effect = get_session
+        mock_fetch_export.side_effect = fetch_export
+        progress = Progress()
+        with patch.dict(os.environ, {"ZENDESK_ACCOUNTS": "acme,globex,broken", "ZENDESK_EMAIL": "e", "ZENDESK_API_TOKEN": "t"}):
+            main(max_workers=1, progress=progress)
+
+        for name in ("acme", "globex"):
+            self.assertEqual(read_cursor(os.path.join("accounts", name, "last_cursor.txt")), f"{name}-c1")
+        self.assertFalse(os.path.exists("last_cursor.txt"))
+        self.assertEqual(progress.processed, 2)
+        self.assertEqual(progress.error, "broken: Unauthorized")
+
+    @patch('zendesk_extractor.core.main.write_cursor')
+    @patch('zendesk_extractor.core.main.read_cursor', return_value="abc")
+    @patch('zendesk_extractor.core.main.get_zendesk_session')
+    @patch('zendesk_extractor.core.main.fetch_ticket_export')
+    @patch('zendesk_extractor.core.main.run_bounded')
+    def test_main_uses_configured_workers(self, mock_run_bounded, mock_fetch_export, mock_get_session, mock_read_cursor, mock_write_cursor):
+        mock_fetch_export.return_value = iter([([{"id": 1}], "next")])
+        main(max_workers=4)
+        self.assertEqual(mock_run_bounded.call_args.args[2], 4)
+        mock_get_session.assert_called_once_with(pool_size=10, account=ANY, http_cache=None)
+
+    @patch('requests.Session')
+    def test_iter_tickets_is_lazy(self, mock_session):
+        first = MagicMock()
+        first.json.return_value = {"results": [{"id": 1}], "meta": {"has_more": True}, "links": {"next": "https://next"}}
+        second = MagicMock()
+        second.json.return_value = {"results": [{"id": 2}], "meta": {"has_more": False}}
+        mock_session.get.side_effect = [first, second]
+        tickets = iter_tickets(mock_session, start_time="2023-01-01")
+        self.assertEqual(next(tickets), {"id": 1})
+        self.assertEqual(mock_session.get.call_count, 1)
+        self.assertEqual(list(tickets), [{"id": 2}])
+
+    @patch('requests.Session')
+    def test_fetch_ticket_export_follows_after_url(self, mock_session):
+        mock_session.base_url = "https://my_domain.zendesk.com/api/v2"
+        first = MagicMock()
+        first.json.return_value = {"tickets": [{"id": 1}], "after_cursor": "c1", "after_url": "https://next", "end_of_stream": False}
+        second = MagicMock()
+        second.json.return_value = {"tickets": [{"id": 2}], "after_cursor": "c2", "after_url": None, "end_of_stream": True}
+        mock_session.get.side_effect = [first, second]
+        pages = list(fetch_ticket_export(mock_session, start_time=1700000000))
+        self.assertEqual(pages, [([{"id": 1}], "c1"), ([{"id": 2}], "c2")])
+        self.assertEqual(mock_session.get.call_args_list[0].kwargs["params"], {"per_page": 1000, "start_time": 1700000000})
+        self.assertEqual(mock_session.get.call_args_list[1].args[0], "https://next")
+
+    @patch('requests.Session')
+    def test_fetch_ticket_export_request_exception(self, mock_session):
+        mock_session.get.side_effect = requests.exceptions.RequestException("Test Exception")
+        with self.assertRaises(ZendeskAPIError):
+            list(fetch_ticket_export(mock_session, cursor="abc"))
+
+    def test_write_and_read_cursor(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cursor_file = os.path.join(tmp, "cursor.txt")
+            self.assertIsNone(read_cursor(cursor_file))
+            write_cursor("abc", cursor_file)
+            write_cursor("def", cursor_file)
+            self.assertEqual(read_cursor(cursor_file), "def")
+            self.assertEqual(os.listdir(tmp), ["cursor.txt"])
+
+    def test_checkpoint_cursor_waits_for_durable_outputs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cursor_file = os.path.join(tmp, "cursor.txt")
+            tables = MagicMock()
+            checkpoint_cursor(RunOutput(tables=tables), "abc", cursor_file)
+            tables.checkpoint.assert_called_once_with()
+            self.assertEqual(read_cursor(cursor_file), "abc")
+
+            tables.checkpoint.side_effect = FileSaveError("disk full")
+            with self.assertRaises(FileSaveError):
+                checkpoint_cursor(RunOutput(tables=tables), "def", cursor_file)
+            self.assertEqual(read_cursor(cursor_file), "abc")
+
+    def test_get_export_start_time_from_last_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            last_run_file = os.path.join(tmp, "last_run.txt")
+            with open(last_run_file, "w") as f:
+                f.write("2023-01-01T00:00:00")
+            self.assertEqual(get_export_start_time(last_run_file), int(datetime(2023, 1, 1).timestamp()))
+
+    def test_get_export_start_time_from_empty_or_invalid_last_run(self):
+        thirty_days_ago = int(datetime.fromisoformat((datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')).timestamp())
+        with tempfile.TemporaryDirectory() as tmp:
+            last_run_file = os.path.join(tmp, "last_run.txt")
+            open(last_run_file, "w").close()
+            self.assertEqual(get_export_start_time(last_run_file), thirty_days_ago)
+            with open(last_run_file, "w") as f:
+                f.write("yesterday")
+            with self.assertLogs(level="WARNING"):
+                self.assertEqual(get_export_start_time(last_run_file), thirty_days_ago)
+
+    def test_watermark_is_the_next_export_start_time(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            last_run_file = os.path.join(tmp, "last_run.txt")
+            write_last_run("2023-10-27T10:35:00Z", last_run_file)
+            self.assertEqual(get_export_start_time(last_run_file), int(datetime(2023, 10, 27, 10, 35, tzinfo=timezone.utc).timestamp()))
+            self.assertEqual(os.listdir(tmp), ["last_run.txt"])
+
+    @patch.dict(os.environ, {"ZENDESK_MAX_WORKERS": "8"})
+    def test_get_max_workers_from_env(self):
+        self.assertEqual(get_max_workers(), 8)
+
+    @patch.dict(os.environ, {"ZENDESK_MAX_WORKERS": "eight"})
+    def test_get_max_workers_invalid_value(self):
+        self.assertEqual(get_max_workers(), DEFAULT_MAX_WORKERS)
+
+    @patch.dict(os.environ, {"ZENDESK_OUTPUT_MODE": "shards", "ZENDESK_SHARD_COMPRESSION": "gzip", "ZENDESK_SHARD_MAX_TICKETS": "50"})
+    def test_get_shard_writer_from_env(self):
+        with patch('zendesk_extractor.core.main.ShardWriter') as mock_writer:
+            get_shard_writer()
+        mock_writer.assert_called_once()
+        self.assertEqual(mock_writer.call_args.kwargs["compression"], "gzip")
+        self.assertEqual(mock_writer.call_args.kwargs["max_tickets"], 50)
+
+    @patch.dict(os.environ, {"ZENDESK_OUTPUT_MODE": "tarball"})
+    def test_get_shard_writer_invalid_mode(self):
+        with self.assertRaises(ZendeskExtractorError):
+            get_shard_writer()
+
+    def test_get_shard_writer_defaults_to_files(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_shard_writer())
+
+    @patch('zendesk_extractor.core.main.save_as_xml')
+    @patch('zendesk_extractor.core.main.save_as_json')
+    def test_transform_and_save_to_shards(self, mock_save_json, mock_save_xml):
+        output = RunOutput(shards=MagicMock(), tables=MagicMock())
+        ticket = {"id": 1, "created_at": "c", "updated_at": "u", "subject": "s", "status": "open", "requester_id": 1, "assignee_id": 2, "tags": []}
+        self.assertTrue(transform_and_save(ticket, [], output))
+        self.assertEqual(output.shards.write.call_args[0][0].ticket_id, 1)
+        self.assertEqual(output.tables.write.call_args[0][0].ticket_id, 1)
+        mock_save_json.assert_not_called()
+        mock_save_xml.assert_not_called()
+
+    def test_transform_and_save_in_worker_process(self):
+        output = RunOutput(tables=MagicMock(), workers=MagicMock())
+        structured = MagicMock()
+        output.workers.call.return_value = RenderedTicket(1, structured, None, False, None, {"transform": 0.1}, {"json": 10, "xml": 20})
+        ticket = {"id": 1, "updated_at": "u"}
+        self.assertTrue(transform_and_save(ticket, [], output))
+        self.assertEqual(output.workers.call.call_args[0][0][:2], (ticket, []))
+        output.tables.write.assert_called_once_with(structured)
+
+        output.workers.call.return_value = FileSaveError("Disk full")
+        with self.assertRaises(FileSaveError):
+            transform_and_save(ticket, [], output)
+
+    @patch.dict(os.environ, {"ZENDESK_FILE_COMPRESSION": "gzip"})
+    def test_transform_and_save_compressed_and_deduplicated(self):
+        directory = tempfile.mkdtemp()
+        body = "> quoted reply chain " * 50
+        output = RunOutput(directory=directory, dedup_min_bytes=100)
+        ticket = {"id": 1, "created_at": "c", "updated_at": "u", "subject": "s", "status": "open", "requester_id": 1, "assignee_id": 2, "tags": []}
+        comments = [{"id": 5, "author_id": 1, "body": body, "created_at": "c"}, {"id": 6, "author_id": 2, "body": "ok", "created_at": "c"}]
+        self.assertTrue(transform_and_save(ticket, comments, output))
+
+        self.assertEqual(sorted(os.listdir(os.path.join(directory, "json"))), ["1.json.gz"])
+        self.assertEqual(sorted(os.listdir(os.path.join(directory, "xml"))), ["1.xml.gz"])
+        with gzip.open(os.path.join(directory, "json", "1.json.gz")) as f:
+            self.assertNotIn(body.encode(), f.read())
+        saved = load_saved_ticket(1, output)
+        self.assertEqual([comment["body"] for comment in saved["conversation"]], [body, "ok"])
+
+        # Saving the ticket uncompressed replaces the compressed files.
+        with patch.dict(os.environ, {"ZENDESK_FILE_COMPRESSION": "none"}):
+            self.assertTrue(transform_and_save(ticket, comments, output))
+        self.assertEqual(os.listdir(os.path.join(directory, "json")), ["1.json"])
+
+    def test_transform_and_save_lazy_xml(self):
+        directory = tempfile.mkdtemp()
+        ticket = {"id": 1, "created_at": "c", "updated_at": "u", "subject": "s", "status": "open", "requester_id": 1, "assignee_id": 2, "tags": []}
+        comments = [{"id": 5, "author_id": 1, "body": "Hello", "created_at": "c"}]
+        self.assertTrue(transform_and_save(ticket, comments, RunOutput(directory=directory)))
+        self.assertEqual(os.listdir(os.path.join(directory, "xml")), ["1.xml"])
+
+        # Extracting the ticket again with lazy XML removes its stale XML file.
+        self.assertTrue(transform_and_save(dict(ticket, updated_at="u2"), comments, RunOutput(directory=directory, lazy_xml=True)))
+        self.assertEqual(os.listdir(os.path.join(directory, "json")), ["1.json"])
+        self.assertEqual(os.listdir(os.path.join(directory, "xml")), [])
+
+    @patch.dict(os.environ, {"ZENDESK_LAZY_XML": "true"})
+    def test_get_run_output_lazy_xml(self):
+        self.assertTrue(get_run_output().lazy_xml)
+
+    @patch.dict(os.environ, {"ZENDESK_FILE_COMPRESSION": "lz4"})
+    def test_get_run_output_rejects_unknown_file_compression(self):
+        with self.assertRaises(ZendeskExtractorError):
+            get_run_output()
+
+    def test_get_process_pool_is_disabled_by_default(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_process_pool())
+        with patch.dict(os.environ, {"ZENDESK_PROCESS_WORKERS": "0"}):
+            self.assertIsNone(get_process_pool())
+
+    @patch('zendesk_extractor.core.main.BatchProcessPool')
+    def test_get_process_pool_is_disabled_by_invalid_values(self, mock_pool):
+        for value in ("-2", "two", "", "1.5"):
+            with patch.dict(os.environ, {"ZENDESK_PROCESS_WORKERS": value}), self.assertLogs(level="WARNING"):
+                self.assertIsNone(get_process_pool())
+        mock_pool.assert_not_called()
+
+    @patch.dict(os.environ, {"ZENDESK_PROCESS_WORKERS": "3", "ZENDESK_PROCESS_BATCH_SIZE": "16"})
+    def test_get_process_pool_from_env(self):
+        with patch('zendesk_extractor.core.main.BatchProcessPool') as mock_pool:
+            get_process_pool()
+        self.assertEqual(mock_pool.call_args.kwargs["workers"], 3)
+        self.assertEqual(mock_pool.call_args.kwargs["batch_size"], 16)
+
+    def test_fetch_ticket_comments_after_id_stops_at_known_comment(self):
+        session = MagicMock()
+        session.base_url = "https://test.zendesk.com/api/v2"
+        first, second = MagicMock(), MagicMock()
+        first.json.return_value = {"comments": [{"id": 5}, {"id": 4}], "next_page": "https://next"}
+        second.json.return_value = {"comments": [{"id": 3}, {"id": 2}], "next_page": "https://last"}
+        session.get.side_effect = [first, second]
+        self.assertEqual(fetch_ticket_comments(session, 1, after_id=2), [{"id": 3}, {"id": 4}, {"id": 5}])
+        self.assertEqual(session.get.call_args_list[0].kwargs["params"], {"sort_order": "desc"})
+        self.assertEqual(session.get.call_count, 2)
+
+    @patch('zendesk_extractor.core.main.transform_and_save')
+    @patch('zendesk_extractor.core.main.fetch_ticket_comments')
+    def test_process_ticket_skips_tickets_not_updated(self, mock_fetch_comments, mock_transform_and_save):
+        output = RunOutput(store=MagicMock())
+        output.store.get.return_value = StoredTicket("2023-01-01T00:00:00Z", "hash", [])
+        self.assertTrue(process_ticket(MagicMock(), {"id": 1, "updated_at": "2023-01-01T00:00:00Z"}, output=output))
+        mock_fetch_comments.assert_not_called()
+        mock_transform_and_save.assert_not_called()
+
+    @patch('zendesk_extractor.core.main.transform_and_save')
+    @patch('zendesk_extractor.core.main.fetch_ticket_comments')
+    def test_process_ticket_fetches_only_new_comments(self, mock_fetch_comments, mock_transform_and_save):
+        output = RunOutput(store=MagicMock())
+        output.store.get.return_value = StoredTicket("2023-01-01T00:00:00Z", "hash", [{"id": 7}, {"id": 9}])
+        mock_fetch_comments.return_value = [{"id": 12}]
+        ticket = {"id": 1, "updated_at": "2023-01-02T00:00:00Z"}
+        self.assertTrue(process_ticket(MagicMock(), ticket, output=output))
+        mock_fetch_comments.assert_called_once_with(ANY, 1, after_id=9)
+        mock_transform_and_save.assert_called_once_with(ticket, [{"id": 7}, {"id": 9}, {"id": 12}], output, None)
+
+    def test_resolve_people_looks_up_each_user_once(self):
+        session = MagicMock()
+        session.base_url = "https://test.zendesk.com/api/v2"
+        users, organizations = MagicMock(), MagicMock()
+        users.json.return_value = {"users": [{"id": 1, "name": "Ann", "email": "ann@example.com", "organization_id": 5}, {"id": 2, "name": "Bob"}]}
+        organizations.json.return_value = {"organizations": [{"id": 5, "name": "Acme"}]}
+        session.get.side_effect = [users, organizations]
+        people = PeopleCache(os.path.join(tempfile.mkdtemp(), "people.db"))
+        self.addCleanup(people.close)
+
+        resolved = resolve_people(session, people, [1, 2, 3])
+        self.assertEqual(resolved, {1: Person(1, "Ann", "ann@example.com", 5, "Acme"), 2: Person(2, "Bob")})
+        self.assertEqual(session.get.call_args_list[0].kwargs["params"], {"ids": "1,2,3"})
+        self.assertTrue(session.get.call_args_list[1].args[0].endswith("/organizations/show_many.json"))
+        # User 3 does not exist, and is not looked up again either.
+        self.assertEqual(resolve_people(session, people, [1, 3]), {1: resolved[1]})
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_resolve_people_survives_api_errors(self):
+        session = MagicMock()
+        session.base_url = "https://test.zendesk.com/api/v2"
+        session.get.side_effect = requests.exceptions.RequestException("Timeout")
+        people = PeopleCache(os.path.join(tempfile.mkdtemp(), "people.db"))
+        self.addCleanup(people.close)
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(resolve_people(session, people, [1]), {})
+        self.assertEqual(people.missing_users([1]), [1])
+
+    @patch('zendesk_extractor.core.main.fetch_organizations', return_value=[])
+    @patch('zendesk_extractor.core.main.fetch_users')
+    def test_prepare_pages_resolves_people_per_page(self, mock_fetch_users, mock_fetch_organizations):
+        mock_fetch_users.side_effect = lambda session, ids: [{"id": user_id, "name": f"User {user_id}"} for user_id in ids]
+        directory = tempfile.mkdtemp()
+        output = RunOutput(directory=directory, people=PeopleCache(os.path.join(directory, "people.db")))
+        self.addCleanup(output.close)
+        tickets = [{"id": ticket_id, "status": "open", "requester_id": ticket_id, "assignee_id": 100} for ticket_id in (1, 2)]
+        pages = list(prepare_pages(MagicMock(), iter([(tickets, "c1")]), output=output))
+        self.assertEqual(len(pages), 1)
+        mock_fetch_users.assert_called_once_with(ANY, [1, 2, 100])
+
+        # The tickets then only look up the comment authors not seen yet.
+        comments = [{"id": 5, "author_id": 100, "body": "Hello", "created_at": "c"}, {"id": 6, "author_id": 7, "body": "Hi", "created_at": "c"}]
+        with patch('zendesk_extractor.core.main.fetch_ticket_comments', return_value=comments):
+            self.assertTrue(process_ticket(MagicMock(), dict(tickets[0], created_at="c", updated_at="u", subject="s", tags=[]), output=output))
+        self.assertEqual(mock_fetch_users.call_args_list[1].args[1], [7])
+        saved = load_saved_ticket(1, output)
+        self.assertEqual(saved["requester"]["name"], "User 1")
+        self.assertEqual(saved["assignee"]["user_id"], 100)
+        self.assertEqual([comment["author"]["name"] for comment in saved["conversation"]], ["User 100", "User 7"])
+
+    def test_get_http_cache_from_env(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_http_cache())
+        with patch.dict(os.environ, {"ZENDESK_HTTP_CACHE": "true", "ZENDESK_HTTP_CACHE_PATH": "cache/http.db", "ZENDESK_HTTP_CACHE_MAX_BYTES": "1024"}):
+            cache = get_http_cache()
+        self.assertEqual((cache.path, cache.max_bytes), ("cache/http.db", 1024))
+        session = get_zendesk_session(account=Account(None, "my_domain", "e", "t"), http_cache=cache)
+        self.assertIsInstance(session.get_adapter("https://my_domain.zendesk.com"), CachingAdapter)
+
+    def test_get_people_cache_from_env(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(get_people_cache())
+        with patch.dict(os.environ, {"ZENDESK_ENRICH_PEOPLE": "true", "ZENDESK_PEOPLE_CACHE_PATH": "cache/people.db", "ZENDESK_PEOPLE_CACHE_TTL": "60"}):
+            people = get_people_cache()
+        self.assertEqual((people.path, people.ttl), ("cache/people.db", 60))
+
+    @patch('zendesk_extractor.core.main.save_as_xml')
+    @patch('zendesk_extractor.core.main.save_as_json')
+    def test_transform_and_save_skips_unchanged_content(self, mock_save_json, mock_save_xml):
+        output = RunOutput(store=TicketStore(os.path.join(tempfile.mkdtemp(), "tickets.db")))
+        self.addCleanup(output.close)
+        ticket = {"id": 1, "created_at": "c", "updated_at": "u1", "subject": "s", "status": "open", "requester_id": 1, "assignee_id": 2, "tags": []}
+        self.assertTrue(transform_and_save(ticket, [], output))
+        self.assertTrue(transform_and_save(dict(ticket, updated_at="u2"), [], output))
+        self.assertEqual(mock_save_json.call_count, 1)
+        self.assertEqual(output.store.get(1).updated_at, "u2")
+        self.assertTrue(transform_and_save(dict(ticket, status="solved"), [], output))
+        self.assertEqual(mock_save_json.call_count, 2)
+
+    @patch('zendesk_extractor.core.main.fetch_ticket_comments')
+    def test_process_ticket_isolates_errors(self, mock_fetch_comments):
+        mock_fetch_comments.side_effect = ZendeskAPIError("Test Exception")
+        self.assertFalse(process_ticket(MagicMock(), {"id": 1}))
 
 
 if __name__ == '__main__':
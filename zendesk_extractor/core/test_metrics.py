@@ -0,0 +1,56 @@
+import unittest
+from zendesk_extractor.core.metrics import Registry, Counter, Histogram
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = Counter("tickets_total", "Tickets.", ("result",), registry=self.registry)
+        counter.inc(result="saved")
+        counter.inc(2, result="saved")
+        counter.inc(result="failed")
+        self.assertEqual(counter.value(result="saved"), 3)
+        self.assertEqual(self.registry.render(), (
+            "# HELP tickets_total Tickets.\n"
+            "# TYPE tickets_total counter\n"
+            'tickets_total{result="failed"} 1\n'
+            'tickets_total{result="saved"} 3\n'
+        ))
+
+    def test_counter_rejects_unknown_labels(self):
+        counter = Counter("tickets_total", "Tickets.", ("result",), registry=self.registry)
+        with self.assertRaises(ValueError):
+            counter.inc(status="saved")
+
+    def test_histogram(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=self.registry)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(2.5)
+        self.assertEqual(histogram.count(), 3)
+        self.assertEqual(self.registry.render(), (
+            "# HELP latency_seconds Latency.\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{le="0.1"} 1\n'
+            'latency_seconds_bucket{le="1"} 2\n'
+            'latency_seconds_bucket{le="+Inf"} 3\n'
+            "latency_seconds_sum 3.05\n"
+            "latency_seconds_count 3\n"
+        ))
+
+    def test_histogram_time(self):
+        histogram = Histogram("stage_seconds", "Stages.", ("stage",), registry=self.registry)
+        with histogram.time(stage="fetch"):
+            pass
+        self.assertEqual(histogram.count(stage="fetch"), 1)
+        self.assertEqual(histogram.count(stage="transform"), 0)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("errors_total", "Errors.", ("message",), registry=self.registry)
+        counter.inc(message='say "hi"\n')
+        self.assertIn('errors_total{message="say \\"hi\\"\\n"} 1', self.registry.render())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from zendesk_extractor.core.models import Comment, Person, Ticket
+from zendesk_extractor.core.people import PeopleCache, attach_people, chunked, ticket_user_ids
+
+class TestPeople(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "people.db")
+        self.now = [1000.0]
+
+    def open(self, ttl=60):
+        cache = PeopleCache(self.path, ttl=ttl, clock=lambda: self.now[0])
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_ticket_user_ids(self):
+        tickets = [{"requester_id": 3, "assignee_id": None}, {"requester_id": 1, "assignee_id": 3}]
+        self.assertEqual(ticket_user_ids(tickets, [{"author_id": 2}, {"author_id": 1}]), [1, 2, 3])
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(list(range(5)), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_people_are_kept_across_runs(self):
+        cache = self.open()
+        self.assertEqual(cache.missing_users([2, 1, 2, None]), [1, 2])
+        cache.add_users([1, 2], [{"id": 1, "name": "Ann", "email": "ann@example.com", "organization_id": 5}])
+        self.assertEqual(cache.missing_organizations([1, 2]), [5])
+        cache.add_organizations([5], [{"id": 5, "name": "Acme"}])
+        cache.close()
+
+        cache = self.open()
+        self.assertEqual(cache.missing_users([1, 2]), [])
+        self.assertEqual(cache.missing_organizations([1, 2]), [])
+        # User 2 was not found, so it has no person.
+        self.assertEqual(cache.people([1, 2]), {1: Person(1, "Ann", "ann@example.com", 5, "Acme")})
+
+    def test_people_expire(self):
+        self.open().add_users([1], [{"id": 1, "name": "Ann"}])
+        self.now[0] += 61
+        self.assertEqual(self.open().missing_users([1]), [1])
+        self.assertEqual(self.open(ttl=3600).missing_users([1]), [])
+
+    def test_attach_people(self):
+        ann = Person(1, "Ann")
+        ticket = Ticket(
+            ticket_id=1, created_at="c", updated_at="u", subject="s", status="open", requester_id=1, assignee_id=2, tags=[],
+            conversation=[Comment(comment_id=1, author_id=1, body="Hello", created_at="c"), Comment(comment_id=2, author_id=3, body="Hi", created_at="c")],
+        )
+        attach_people(ticket, {1: ann})
+        self.assertEqual((ticket.requester, ticket.assignee), (ann, None))
+        self.assertEqual([comment.author for comment in ticket.conversation], [ann, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
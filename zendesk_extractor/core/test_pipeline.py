@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import unittest
+from zendesk_extractor.core.pipeline import PageTracker, PipelineItem, stream_pages, stream_pages_async, run_bounded, run_bounded_async
+from zendesk_extractor.core.exceptions import FileSaveError
+
+class TestPipeline(unittest.TestCase):
+
+    def test_page_tracker_checkpoints_in_page_order(self):
+        checkpoints = []
+        tracker = PageTracker(checkpoints.append)
+        tracker.add_page(0, 2, "c0")
+        tracker.add_page(1, 1, "c1")
+        tracker.complete(1)
+        self.assertEqual(checkpoints, [])
+        tracker.complete(0)
+        tracker.complete(0)
+        self.assertEqual(checkpoints, ["c1"])
+        tracker.add_page(2, 0, "c2")
+        self.assertEqual(checkpoints, ["c1", "c2"])
+
+    def test_page_tracker_reports_checkpointed_page(self):
+        pages = []
+        tracker = PageTracker(lambda cursor: None, on_checkpoint=pages.append)
+        tracker.add_page(0, 1, "c0")
+        tracker.add_page(1, 1, "c1")
+        tracker.complete(0)
+        tracker.complete(1)
+        self.assertEqual(pages, [0, 1])
+
+    def test_page_tracker_skips_on_checkpoint_when_cursor_fails(self):
+        pages = []
+
+        def fail(cursor):
+            raise OSError("disk full")
+        tracker = PageTracker(fail, on_checkpoint=pages.append)
+        with self.assertLogs(level="ERROR"):
+            tracker.add_page(0, 0, "c0")
+        self.assertEqual(pages, [])
+
+        def fail_output(cursor):
+            raise FileSaveError("Parquet rows lost")
+        tracker = PageTracker(fail_output, on_checkpoint=pages.append)
+        with self.assertLogs(level="ERROR"):
+            tracker.add_page(0, 0, "c0")
+        self.assertEqual(pages, [])
+
+    def test_stream_pages_registers_pages_before_items(self):
+        checkpoints = []
+        tracker = PageTracker(checkpoints.append)
+        pages = [([{"id": 1}, {"id": 2}], "c0", {2: [{"id": 20}]}), ([], "c1", {})]
+        items = list(stream_pages(pages, tracker))
+        self.assertEqual(items, [PipelineItem(0, {"id": 1}, None), PipelineItem(0, {"id": 2}, [{"id": 20}])])
+        for item in items:
+            tracker.complete(item.page)
+        self.assertEqual(checkpoints, ["c1"])
+
+    def test_run_bounded_bounds_buffer(self):
+        release = threading.Event()
+        produced = []
+
+        def items():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        def handle(item):
+            release.wait(5)
+
+        thread = threading.Thread(target=run_bounded, args=(items(), handle, 2, 2))
+        thread.start()
+        try:
+            for _ in range(100):
+                if len(produced) >= 5:
+                    break
+                threading.Event().wait(0.01)
+            # Two items in the workers, two in the queue and one waiting to be queued.
+            self.assertEqual(len(produced), 5)
+        finally:
+            release.set()
+            thread.join(5)
+        self.assertEqual(len(produced), 10)
+
+    def test_run_bounded_isolates_errors_and_propagates_producer_errors(self):
+        handled = []
+
+        def items():
+            yield 1
+            yield 2
+            raise ValueError("pagination failed")
+
+        def handle(item):
+            handled.append(item)
+            raise KeyError("id")
+
+        with self.assertRaises(ValueError):
+            run_bounded(items(), handle, 2)
+        self.assertEqual(sorted(handled), [1, 2])
+
+
+class TestAsyncPipeline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_stream_pages_async_and_run_bounded_async(self):
+        checkpoints = []
+        tracker = PageTracker(checkpoints.append)
+
+        async def pages():
+            yield [{"id": 1}], "c0", {}
+            yield [{"id": 2}, {"id": 3}], "c1", {}
+
+        async def handle(item):
+            await asyncio.sleep(0.001 * (3 - item.ticket["id"]))
+            tracker.complete(item.page)
+
+        count = await run_bounded_async(stream_pages_async(pages(), tracker), handle, 3)
+        self.assertEqual(count, 3)
+        self.assertEqual(checkpoints[-1], "c1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from zendesk_extractor.core.process_pool import BatchProcessPool
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+# The batch functions run in spawned worker processes, so they must be
+# importable from this module.
+
+def square_batch(batch):
+    return [(value * value, len(batch)) for value in batch]
+
+
+def exit_batch(batch):
+    if -1 in batch:
+        os._exit(1)
+    return batch
+
+
+class TestBatchProcessPool(unittest.TestCase):
+
+    def open(self, function, **kwargs):
+        pool = BatchProcessPool(function, workers=1, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_call_returns_the_item_result(self):
+        pool = self.open(square_batch, batch_size=1)
+        self.assertEqual(pool.call(3), (9, 1))
+        self.assertEqual(pool.call(4), (16, 1))
+
+    def test_partial_batch_is_sent_after_max_delay(self):
+        pool = self.open(square_batch, batch_size=100, max_delay=0.01)
+        self.assertEqual(pool.call(5), (25, 1))
+
+    def test_items_from_several_threads_share_a_batch(self):
+        pool = self.open(square_batch, batch_size=4, max_delay=5.0)
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(pool.call, [1, 2, 3, 4]))
+        self.assertEqual(results, [(1, 4), (4, 4), (9, 4), (16, 4)])
+
+    def test_crashed_worker_fails_only_its_batch(self):
+        pool = self.open(exit_batch, batch_size=1)
+        with self.assertRaises(ZendeskExtractorError):
+            pool.call(-1)
+        self.assertEqual(pool.call(2), 2)
+
+    def test_call_after_close_raises(self):
+        pool = self.open(square_batch)
+        pool.close()
+        with self.assertRaises(ZendeskExtractorError):
+            pool.call(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from zendesk_extractor.core.progress import Progress
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.progress = Progress(clock=self.clock)
+
+    def test_counts_tickets(self):
+        self.progress.add_fetched(3)
+        self.progress.ticket_done(True)
+        self.progress.ticket_done(True)
+        self.progress.ticket_done(False)
+        snapshot = self.progress.snapshot()
+        self.assertEqual(snapshot["fetched"], 3)
+        self.assertEqual(snapshot["processed"], 2)
+        self.assertEqual(snapshot["failed"], 1)
+
+    def test_throughput(self):
+        for _ in range(20):
+            self.progress.ticket_done(True)
+        self.clock.now += 5
+        snapshot = self.progress.snapshot()
+        self.assertEqual(snapshot["elapsed_seconds"], 5)
+        self.assertEqual(snapshot["tickets_per_second"], 4.0)
+        self.assertEqual(snapshot["current_tickets_per_second"], 4.0)
+
+        # Tickets older than the window no longer count towards the current rate.
+        self.clock.now += 15
+        self.progress.ticket_done(True)
+        snapshot = self.progress.snapshot()
+        self.assertEqual(snapshot["tickets_per_second"], 1.05)
+        self.assertEqual(snapshot["current_tickets_per_second"], 0.1)
+
+    def test_finish_stops_the_clock(self):
+        self.progress.ticket_done(True)
+        self.clock.now += 2
+        self.progress.finish(error="Boom")
+        self.clock.now += 100
+        snapshot = self.progress.snapshot()
+        self.assertEqual(snapshot["elapsed_seconds"], 2)
+        self.assertEqual(self.progress.error, "Boom")
+
+if __name__ == '__main__':
+    unittest.main()
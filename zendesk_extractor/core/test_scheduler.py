@@ -0,0 +1,127 @@
+import unittest
+from email.utils import formatdate
+from time import time
+from unittest.mock import patch, MagicMock
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from zendesk_extractor.core import metrics
+from zendesk_extractor.core.scheduler import (
+    parse_retry_after, RateLimitScheduler, AsyncRateLimitScheduler, RateLimitedAdapter, RateLimitedTransport,
+)
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.is_redirect = False
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    return response
+
+class TestRateLimitScheduler(unittest.TestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("12"), 12.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertAlmostEqual(parse_retry_after(formatdate(time() + 30, usegmt=True)), 30, delta=2)
+
+    def test_429_pauses_and_halves_concurrency(self):
+        scheduler = RateLimitScheduler(max_concurrency=8, clock=lambda: 100.0)
+        delay = scheduler.observe(429, {"retry-after": "30"}, attempt=0)
+        self.assertEqual(delay, 0.0)
+        self.assertEqual(scheduler.paused_until, 130.0)
+        self.assertEqual(scheduler.concurrency, 4)
+
+    def test_429_without_retry_after_waits_for_the_window(self):
+        scheduler = RateLimitScheduler(clock=lambda: 100.0)
+        scheduler.observe(429, {"ratelimit-reset": "12"}, attempt=0)
+        self.assertEqual(scheduler.paused_until, 112.0)
+
+    def test_concurrency_recovers_after_successes(self):
+        scheduler = RateLimitScheduler(max_concurrency=8)
+        scheduler.observe(429, {"retry-after": "0"}, attempt=0)
+        for _ in range(4):
+            self.assertIsNone(scheduler.observe(200, {}, attempt=0))
+        self.assertEqual(scheduler.concurrency, 5)
+
+    def test_paces_requests_when_budget_runs_low(self):
+        scheduler = RateLimitScheduler()
+        scheduler.observe(200, {"x-rate-limit": "700", "x-rate-limit-remaining": "30", "ratelimit-reset": "15"}, attempt=0)
+        self.assertEqual(scheduler.interval, 0.5)
+        scheduler.observe(200, {"x-rate-limit": "700", "x-rate-limit-remaining": "600"}, attempt=0)
+        self.assertEqual(scheduler.interval, 0.0)
+
+    def test_transient_errors_are_backed_off(self):
+        scheduler = RateLimitScheduler(backoff_base=1.0, backoff_max=60.0)
+        for _ in range(20):
+            delay = scheduler.observe(503, {}, attempt=3)
+            self.assertTrue(0 <= delay <= 8)
+        self.assertIsNone(scheduler.observe(404, {}, attempt=0))
+
+    def test_send_retries_until_success(self):
+        sleeps = []
+        scheduler = RateLimitScheduler(sleep=sleeps.append)
+        responses = [make_response(429, {"retry-after": "0"}), make_response(502), make_response(200)]
+        response = scheduler.send(lambda: responses.pop(0))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(sleeps), 2)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_send_records_metrics(self):
+        metrics.REGISTRY.reset()
+        scheduler = RateLimitScheduler(sleep=lambda delay: None)
+        responses = [make_response(429, {"retry-after": "0"}), make_response(502), make_response(200)]
+        scheduler.send(lambda: responses.pop(0))
+        self.assertEqual(metrics.HTTP_REQUEST_SECONDS.count(), 3)
+        self.assertEqual(metrics.HTTP_REQUESTS.value(status="200"), 1)
+        self.assertEqual(metrics.HTTP_RETRIES.value(reason="rate_limited"), 1)
+        self.assertEqual(metrics.HTTP_RETRIES.value(reason="server_error"), 1)
+        self.assertEqual(metrics.RATE_LIMIT_WAITS.value(), 1)
+
+    def test_send_returns_last_response_after_max_retries(self):
+        scheduler = RateLimitScheduler(max_retries=2, sleep=lambda delay: None)
+        send = MagicMock(return_value=make_response(503))
+        self.assertEqual(scheduler.send(send).status_code, 503)
+        self.assertEqual(send.call_count, 3)
+
+    def test_send_does_not_retry_non_idempotent_requests(self):
+        scheduler = RateLimitScheduler(sleep=lambda delay: None)
+        send = MagicMock(return_value=make_response(503))
+        scheduler.send(send, retryable=False)
+        self.assertEqual(send.call_count, 1)
+
+    def test_send_retries_connection_errors(self):
+        scheduler = RateLimitScheduler(sleep=lambda delay: None)
+        send = MagicMock(side_effect=[requests.exceptions.ConnectionError("reset"), make_response(200)])
+        response = scheduler.send(send, retry_exceptions=(requests.exceptions.ConnectionError,))
+        self.assertEqual(response.status_code, 200)
+
+    @patch.object(HTTPAdapter, 'send')
+    def test_adapter_retries_through_session(self, mock_send):
+        mock_send.side_effect = [make_response(429, {"retry-after": "0"}), make_response(200)]
+        session = requests.Session()
+        session.mount("https://", RateLimitedAdapter(RateLimitScheduler(sleep=lambda delay: None)))
+        response = session.get("https://my_domain.zendesk.com/api/v2/tickets.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_send.call_count, 2)
+
+
+class TestAsyncRateLimitScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_transport_retries_rate_limited_requests(self):
+        statuses = [429, 503, 200]
+
+        def handler(request):
+            return httpx.Response(statuses.pop(0), headers={"Retry-After": "0"})
+
+        scheduler = AsyncRateLimitScheduler(backoff_base=0.0)
+        transport = RateLimitedTransport(scheduler, httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.get("https://my_domain.zendesk.com/api/v2/tickets.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statuses, [])
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import json
+import unittest
+from unittest.mock import patch
+from zendesk_extractor.core import serializers
+
+TICKET = {
+    "ticket_id": 1,
+    "subject": "Café ☃",
+    "tags": [],
+    "conversation": [{"comment_id": 1, "body": "line\nbreak \"quoted\"", "author_id": None}],
+}
+
+class TestSerializers(unittest.TestCase):
+
+    def test_dumps_indented_matches_stdlib(self):
+        self.assertEqual(serializers.dumps(TICKET), json.dumps(TICKET, indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def test_dumps_compact(self):
+        self.assertEqual(serializers.dumps(TICKET, compact=True), json.dumps(TICKET, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+    def test_loads_round_trip(self):
+        self.assertEqual(serializers.loads(serializers.dumps(TICKET)), TICKET)
+        self.assertEqual(serializers.loads(json.dumps(TICKET, indent=2)), TICKET)
+
+    def test_loads_invalid_json(self):
+        with self.assertRaises(ValueError):
+            serializers.loads(b"{not json")
+
+    @patch.object(serializers, "orjson", None)
+    def test_stdlib_backend(self):
+        self.assertEqual(serializers.loads(serializers.dumps(TICKET)), TICKET)
+        self.assertEqual(serializers.dumps(TICKET, compact=True), json.dumps(TICKET, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+if __name__ == '__main__':
+    unittest.main()
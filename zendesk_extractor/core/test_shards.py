@@ -0,0 +1,79 @@
+import os
+import gzip
+import json
+import tempfile
+import unittest
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.shards import ShardWriter, ShardLocation, load_index, read_record, INDEX_FILE
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+
+def make_ticket(ticket_id: int, subject: str = "Subject") -> Ticket:
+    return Ticket(
+        ticket_id=ticket_id, created_at="2023-10-27T10:30:00Z", updated_at="2023-10-27T10:35:00Z", subject=subject,
+        status="open", requester_id=1, assignee_id=2, tags=["a"],
+        conversation=[Comment(comment_id=ticket_id * 10, author_id=1, body="A comment", created_at="2023-10-27T10:35:00Z")],
+    )
+
+class TestShardWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_write_appends_jsonl_and_indexes_offsets(self):
+        with ShardWriter(self.directory) as writer:
+            for ticket_id in range(1, 4):
+                writer.write(make_ticket(ticket_id))
+
+        with open(os.path.join(self.directory, "tickets-00001.jsonl"), "rb") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line)["ticket_id"] for line in lines], [1, 2, 3])
+
+        index = load_index(self.directory)
+        self.assertEqual(index[2], ShardLocation("tickets-00001.jsonl", len(lines[0]) + 1, len(lines[1]) + 1))
+        self.assertEqual(read_record(index[2], self.directory), make_ticket(2).to_dict())
+
+    def test_rotates_by_ticket_count_and_size(self):
+        with ShardWriter(self.directory, max_tickets=2) as writer:
+            locations = [writer.write(make_ticket(ticket_id)) for ticket_id in range(5)]
+        self.assertEqual([location.shard for location in locations], ["tickets-00001.jsonl"] * 2 + ["tickets-00002.jsonl"] * 2 + ["tickets-00003.jsonl"])
+
+        with ShardWriter(self.directory, max_bytes=1) as writer:
+            locations = [writer.write(make_ticket(ticket_id)) for ticket_id in range(2)]
+        self.assertEqual([location.shard for location in locations], ["tickets-00004.jsonl", "tickets-00005.jsonl"])
+
+    def test_gzip_records_are_seekable_and_shard_is_valid_gzip(self):
+        with ShardWriter(self.directory, compression="gzip") as writer:
+            for ticket_id in range(1, 4):
+                writer.write(make_ticket(ticket_id))
+            self.assertEqual(writer.load(3), make_ticket(3).to_dict())
+
+        with gzip.open(os.path.join(self.directory, "tickets-00001.jsonl.gz"), "rb") as f:
+            self.assertEqual([json.loads(line)["ticket_id"] for line in f], [1, 2, 3])
+
+    def test_newest_write_wins_across_runs(self):
+        with ShardWriter(self.directory) as writer:
+            writer.write(make_ticket(1, "Old"))
+        with ShardWriter(self.directory) as writer:
+            writer.write(make_ticket(1, "New"))
+        with ShardWriter(self.directory) as writer:
+            self.assertEqual(writer.load(1)["subject"], "New")
+            self.assertIsNone(writer.load(2))
+
+    def test_load_index_skips_truncated_lines(self):
+        with ShardWriter(self.directory) as writer:
+            writer.write(make_ticket(1))
+        with open(os.path.join(self.directory, INDEX_FILE), "ab") as f:
+            f.write(b'{"ticket_id": 2, "sha')
+        self.assertEqual(list(load_index(self.directory)), [1])
+
+    def test_empty_run_creates_no_files(self):
+        ShardWriter(self.directory).close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ZendeskExtractorError):
+            ShardWriter(self.directory, compression="lz4")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.store import TicketStore, content_hash
+
+def make_ticket(comments=2, **changes) -> Ticket:
+    ticket = Ticket(
+        ticket_id=1, created_at="2023-10-27T10:30:00Z", updated_at="2023-10-27T10:35:00Z", subject="Subject",
+        status="open", requester_id=1, assignee_id=2, tags=["a"],
+        conversation=[Comment(comment_id=10 + i, author_id=1, body=f"Comment {i}", created_at="2023-10-27T10:35:00Z") for i in range(comments)],
+    )
+    return replace(ticket, **changes)
+
+class TestTicketStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TicketStore(os.path.join(tempfile.mkdtemp(), "tickets.db"))
+        self.addCleanup(self.store.close)
+
+    def test_save_and_load_round_trip(self):
+        ticket = make_ticket()
+        self.store.save(ticket)
+        self.assertEqual(self.store.load(1), ticket.to_dict())
+        stored = self.store.get(1)
+        self.assertEqual(stored.updated_at, "2023-10-27T10:35:00Z")
+        self.assertEqual(stored.content_hash, content_hash(ticket))
+        self.assertEqual([comment["id"] for comment in stored.comments], [10, 11])
+        self.assertEqual(stored.last_comment_id, 11)
+
+    def test_unknown_ticket(self):
+        self.assertIsNone(self.store.get(2))
+        self.assertIsNone(self.store.get_hash(2))
+        self.assertIsNone(self.store.load(2))
+
+    def test_content_hash_ignores_updated_at(self):
+        self.assertEqual(content_hash(make_ticket()), content_hash(make_ticket(updated_at="2023-11-01T00:00:00Z")))
+        self.assertNotEqual(content_hash(make_ticket()), content_hash(make_ticket(tags=["a", "b"])))
+        self.assertNotEqual(content_hash(make_ticket()), content_hash(make_ticket(comments=3)))
+
+    def test_upsert_updates_ticket_and_comments(self):
+        self.store.save(make_ticket(comments=3))
+        redacted = make_ticket(comments=2, status="solved")
+        redacted.conversation[0].body = "▇▇▇"
+        self.store.save(redacted)
+        self.assertEqual(self.store.load(1), redacted.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.shards import ShardWriter
+from zendesk_extractor.core.ticket_index import TicketIndex, rebuild, match_expression
+
+def make_ticket(ticket_id: int, **changes) -> Ticket:
+    ticket = Ticket(
+        ticket_id=ticket_id, created_at="2023-10-27T10:30:00Z", updated_at="2023-10-27T10:35:00Z", subject="Printer issue",
+        status="open", requester_id=1, assignee_id=2, tags=["printer"],
+        conversation=[Comment(comment_id=ticket_id, author_id=1, body="The toner is empty", created_at="2023-10-27T10:35:00Z")],
+    )
+    return replace(ticket, **changes)
+
+class TestTicketIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = TicketIndex(os.path.join(self.directory, "index.db"))
+        self.addCleanup(self.index.close)
+
+    def test_empty_index_creates_no_file(self):
+        self.assertEqual(self.index.list_tickets(), {"tickets": [], "next_cursor": None})
+        self.assertEqual(self.index.search("printer")["tickets"], [])
+        self.assertFalse(os.path.exists(self.index.path))
+
+    def test_add_replaces_earlier_version(self):
+        self.index.add(make_ticket(1))
+        self.index.add(make_ticket(1, subject="Scanner issue", tags=["scanner"], conversation=[]))
+        self.assertEqual(self.index.list_tickets(tag="printer")["tickets"], [])
+        self.assertEqual(self.index.list_tickets(tag="scanner")["tickets"][0]["subject"], "Scanner issue")
+        self.assertEqual(self.index.search("toner")["tickets"], [])
+        self.assertEqual(len(self.index.search("scanner")["tickets"]), 1)
+
+    def test_match_expression_quotes_words(self):
+        self.assertEqual(match_expression('toner "empty'), '"toner" """empty"')
+        self.assertEqual(match_expression("   "), "")
+
+    def test_rebuild_from_json_files_and_shards(self):
+        json_directory = os.path.join(self.directory, "json")
+        shard_directory = os.path.join(self.directory, "shards")
+        os.makedirs(json_directory)
+        with open(os.path.join(json_directory, "1.json"), "w") as f:
+            f.write(make_ticket(1).to_json())
+        with open(os.path.join(json_directory, "broken.json"), "w") as f:
+            f.write("{")
+        with ShardWriter(shard_directory) as writer:
+            writer.write(make_ticket(2))
+
+        self.assertEqual(rebuild(self.index, json_directory, shard_directory), 2)
+        self.assertEqual([ticket["ticket_id"] for ticket in self.index.list_tickets(sort="ticket_id")["tickets"]], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
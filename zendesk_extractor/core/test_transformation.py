@@ -1,6 +1,9 @@
 import unittest
-from zendesk_extractor.core.transformation import transform_to_structured_json, convert_to_xml
-from zendesk_extractor.core.models import Ticket, Comment
+import json
+import random
+from dataclasses import asdict
+from zendesk_extractor.core.transformation import transform_to_structured_json, convert_to_xml, _convert_to_xml_dom
+from zendesk_extractor.core.models import Ticket, Comment, Person
 
 class TestTransformation(unittest.TestCase):
 
@@ -39,5 +42,76 @@ class TestTransformation(unittest.TestCase):
         xml_string = convert_to_xml(None)
         self.assertIsNone(xml_string)
 
+    def test_convert_to_xml_matches_minidom_output(self):
+        tickets = [
+            Ticket(
+                ticket_id=1,
+                created_at=None,
+                updated_at="",
+                subject='a<b>&"c\' \r\n x\ry\t ]]> \u00e9\U0001f600',
+                status="open",
+                requester_id=1,
+                assignee_id=None,
+                tags=["", None, "x&y"],
+                conversation=[
+                    Comment(comment_id=1, author_id=2, body="", created_at="2023-01-01"),
+                    Comment(comment_id=2, author_id=None, body="line 1\n\n  line 2 </body>", created_at=None),
+                ]
+            ),
+            Ticket(ticket_id=2, created_at="c", updated_at="u", subject="s", status="new", requester_id=1, assignee_id=1, tags=None),
+            Ticket(ticket_id=3, created_at="c", updated_at="u", subject=" ", status="new", requester_id=1, assignee_id=1, tags=[]),
+        ]
+        alphabet = "ab &<>\"'\r\n\t\u00e9"
+        rng = random.Random(0)
+        for i in range(50):
+            text = lambda: "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            tickets.append(Ticket(
+                ticket_id=i, created_at=text(), updated_at=text(), subject=text(), status=text(),
+                requester_id=i, assignee_id=i, tags=[text() for _ in range(rng.randint(0, 3))],
+                conversation=[Comment(comment_id=j, author_id=j, body=text(), created_at=text()) for j in range(rng.randint(0, 3))]
+            ))
+        for ticket in tickets:
+            self.assertEqual(convert_to_xml(ticket), _convert_to_xml_dom(ticket))
+
+    def test_models_to_dict_matches_asdict(self):
+        ticket = Ticket(
+            ticket_id=1, created_at="c", updated_at="u", subject="s", status="open", requester_id=1, assignee_id=2, tags=["a"],
+            conversation=[Comment(comment_id=1, author_id=1, body="a comment", created_at="2023-01-01")]
+        )
+        # Without people enrichment, the people are left out.
+        unenriched = asdict(ticket)
+        del unenriched["requester"], unenriched["assignee"], unenriched["conversation"][0]["author"]
+        self.assertEqual(ticket.to_dict(), unenriched)
+        self.assertEqual(ticket.to_json(), json.dumps(unenriched, indent=2))
+        self.assertEqual(Ticket.from_dict(json.loads(ticket.to_json())), ticket)
+        self.assertFalse(hasattr(ticket, "__dict__"))
+
+        ticket.requester = Person(user_id=1, name="Ann", email="ann@example.com", organization_id=5, organization="Acme")
+        ticket.assignee = Person(user_id=2)
+        ticket.conversation[0].author = ticket.requester
+        self.assertEqual(ticket.to_dict(), asdict(ticket))
+        self.assertEqual(Ticket.from_dict(json.loads(ticket.to_json())), ticket)
+
+    def test_convert_to_xml_with_people(self):
+        ann = Person(user_id=1, name="Ann & co", email="ann@example.com", organization_id=5, organization="Acme")
+        ticket = Ticket(
+            ticket_id=1, created_at="c", updated_at="u", subject="s", status="open", requester_id=1, assignee_id=2, tags=["a"],
+            conversation=[
+                Comment(comment_id=1, author_id=1, body="a comment", created_at="2023-01-01", author=ann),
+                Comment(comment_id=2, author_id=3, body="unknown author", created_at="2023-01-02"),
+            ],
+            requester=ann, assignee=Person(user_id=2, name="Bob"),
+        )
+        xml = convert_to_xml(ticket)
+        self.assertEqual(xml, _convert_to_xml_dom(ticket))
+        self.assertIn("  <requester>\n    <user_id>1</user_id>\n    <name>Ann &amp; co</name>", xml)
+        self.assertIn("      <author>\n        <user_id>1</user_id>", xml)
+        self.assertEqual(xml.count("<author>"), 1)
+
+    def test_convert_to_xml_rejects_invalid_characters(self):
+        ticket = Ticket(ticket_id=1, created_at="c", updated_at="u", subject="bad \x00", status="new", requester_id=1, assignee_id=1, tags=[])
+        with self.assertRaises(ValueError):
+            convert_to_xml(ticket)
+
 if __name__ == '__main__':
     unittest.main()
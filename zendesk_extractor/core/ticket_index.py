@@ -0,0 +1,318 @@
+"""A searchable index of extracted tickets for the web interface.
+
+The index is an SQLite database with one row per ticket (its ID, status,
+tags, requester, assignee and timestamps) and an FTS5 full-text table over
+the ticket subjects and comment bodies. Extraction runs update it as they
+save each ticket, so listing and searching never touch the output
+directories.
+
+Listings are paginated with opaque keyset cursors, which stay fast however
+deep the page and do not skip or repeat tickets when new ones are indexed
+between requests. Search results are ranked by relevance and paginated by
+position.
+
+Run `python -m zendesk_extractor.core.ticket_index` to rebuild the index from
+the files already in `output/json` and `output/shards`.
+"""
+import os
+import json
+import base64
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from zendesk_extractor.core import serializers
+from zendesk_extractor.core.models import Ticket
+from zendesk_extractor.core.shards import SHARD_DIRECTORY, load_index, read_record
+from zendesk_extractor.core.bodies import BodyStore, BODY_DIRECTORY
+from zendesk_extractor.core.compression import read_file
+from zendesk_extractor.core.exceptions import FileSaveError, ZendeskExtractorError
+
+INDEX_PATH = "output/index.db"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SORT_COLUMNS = {"updated_at", "created_at", "ticket_id"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id INTEGER PRIMARY KEY,
+    status TEXT,
+    requester_id INTEGER,
+    assignee_id INTEGER,
+    created_at TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    subject TEXT,
+    tags TEXT
+);
+CREATE TABLE IF NOT EXISTS ticket_tags (
+    tag TEXT NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    PRIMARY KEY (tag, ticket_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tickets_by_updated_at ON tickets (updated_at, ticket_id);
+CREATE INDEX IF NOT EXISTS tickets_by_created_at ON tickets (created_at, ticket_id);
+CREATE INDEX IF NOT EXISTS tickets_by_status ON tickets (status, updated_at, ticket_id);
+CREATE INDEX IF NOT EXISTS tickets_by_assignee ON tickets (assignee_id, updated_at, ticket_id);
+CREATE INDEX IF NOT EXISTS tickets_by_requester ON tickets (requester_id, updated_at, ticket_id);
+CREATE INDEX IF NOT EXISTS ticket_tags_by_ticket ON ticket_tags (ticket_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(subject, comments);
+"""
+
+_COLUMNS = "ticket_id, status, requester_id, assignee_id, created_at, updated_at, subject, tags"
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encodes the position after the last result as an opaque string."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decodes a cursor returned by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def match_expression(query: str) -> str:
+    """Turns free text into an FTS5 query matching every word.
+
+    Each word is quoted, so characters with a meaning in the FTS5 query
+    syntax are searched for literally instead of raising a syntax error.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def _row_to_ticket(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    return {
+        "ticket_id": row[0],
+        "status": row[1],
+        "requester_id": row[2],
+        "assignee_id": row[3],
+        "created_at": row[4] or None,
+        "updated_at": row[5] or None,
+        "subject": row[6],
+        "tags": json.loads(row[7]) if row[7] else [],
+    }
+
+
+class TicketIndex:
+    """The SQLite index of extracted tickets.
+
+    The index is safe to share between threads. The database is opened on
+    first use, so creating an index that is never written creates no file.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database and creates its tables on first use. Call with the lock held."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(self, ticket: Ticket) -> None:
+        """Adds a ticket to the index, replacing an earlier version.
+
+        Raises:
+            FileSaveError: If the index cannot be written.
+        """
+        tags = ticket.tags or []
+        comments = "\n".join(comment.body for comment in ticket.conversation if comment.body)
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        f"INSERT OR REPLACE INTO tickets ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (ticket.ticket_id, ticket.status, ticket.requester_id, ticket.assignee_id,
+                         ticket.created_at or "", ticket.updated_at or "", ticket.subject, json.dumps(tags)),
+                    )
+                    connection.execute("DELETE FROM ticket_tags WHERE ticket_id = ?", (ticket.ticket_id,))
+                    connection.executemany("INSERT OR IGNORE INTO ticket_tags (tag, ticket_id) VALUES (?, ?)", [(tag, ticket.ticket_id) for tag in tags])
+                    connection.execute("DELETE FROM tickets_fts WHERE rowid = ?", (ticket.ticket_id,))
+                    connection.execute("INSERT INTO tickets_fts (rowid, subject, comments) VALUES (?, ?, ?)", (ticket.ticket_id, ticket.subject or "", comments))
+        except (sqlite3.Error, OSError) as e:
+            raise FileSaveError(f"Error indexing ticket {ticket.ticket_id}: {e}")
+
+    def list_tickets(self, status: Optional[str] = None, tag: Optional[str] = None, assignee_id: Optional[int] = None, requester_id: Optional[int] = None,
+                     sort: str = "-updated_at", limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, updated_since: Optional[str] = None,
+                     updated_before: Optional[str] = None, ticket_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Lists indexed tickets, filtered and sorted, one page at a time.
+
+        Args:
+            status: Only list tickets with this status.
+            tag: Only list tickets with this tag.
+            assignee_id: Only list tickets assigned to this agent.
+            requester_id: Only list tickets requested by this user.
+            sort: The column to sort by, "updated_at", "created_at" or
+                  "ticket_id", prefixed with "-" for descending order.
+            limit: The number of tickets per page, at most MAX_PAGE_SIZE.
+            cursor: The `next_cursor` of the previous page.
+            updated_since: Only list tickets updated at or after this ISO 8601
+                           date or time.
+            updated_before: Only list tickets updated before this ISO 8601
+                            date or time.
+            ticket_ids: Only list the tickets with these IDs.
+
+        Returns:
+            A dictionary with the page's `tickets` and the `next_cursor` to
+            pass for the next page, which is None on the last page.
+
+        Raises:
+            ValueError: If the sort order or the cursor is invalid.
+        """
+        descending = sort.startswith("-")
+        column = sort.lstrip("-")
+        if column not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort!r}. Use one of: {', '.join(sorted(SORT_COLUMNS))}.")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        conditions, params = [], []
+        for name, value in (("status", status), ("assignee_id", assignee_id), ("requester_id", requester_id)):
+            if value is not None:
+                conditions.append(f"{name} = ?")
+                params.append(value)
+        if tag is not None:
+            conditions.append("ticket_id IN (SELECT ticket_id FROM ticket_tags WHERE tag = ?)")
+            params.append(tag)
+        # Timestamps are stored as ISO 8601 text in UTC, which sorts like the times.
+        if updated_since is not None:
+            conditions.append("updated_at >= ?")
+            params.append(updated_since)
+        if updated_before is not None:
+            conditions.append("updated_at < ?")
+            params.append(updated_before)
+        if ticket_ids is not None:
+            # One parameter however many IDs, so long lists stay within SQLite's limit.
+            conditions.append("ticket_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(ticket_ids))
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            if len(position) != 2:
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+            conditions.append(f"({column}, ticket_id) {'<' if descending else '>'} (?, ?)")
+            params.extend(position)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        sql = f"SELECT {_COLUMNS} FROM tickets {where} ORDER BY {column} {direction}, ticket_id {direction} LIMIT ?"
+        rows = self._query(sql, params + [limit + 1])
+
+        tickets = [_row_to_ticket(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([last[_COLUMNS.split(", ").index(column)], last[0]])
+        return {"tickets": tickets, "next_cursor": next_cursor}
+
+    def search(self, query: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Searches ticket subjects and comment bodies.
+
+        Args:
+            query: The words to search for. Tickets matching all of them are
+                   returned, most relevant first.
+            limit: The number of tickets per page, at most MAX_PAGE_SIZE.
+            cursor: The `next_cursor` of the previous page.
+
+        Returns:
+            A dictionary with the page's `tickets` and the `next_cursor`.
+
+        Raises:
+            ValueError: If the cursor is invalid.
+        """
+        expression = match_expression(query)
+        if not expression:
+            return {"tickets": [], "next_cursor": None}
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = 0
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            if len(position) != 1 or not isinstance(position[0], int):
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+            offset = position[0]
+
+        columns = ", ".join(f"tickets.{name}" for name in _COLUMNS.split(", "))
+        rows = self._query(
+            f"SELECT {columns} FROM tickets_fts JOIN tickets ON tickets.ticket_id = tickets_fts.rowid "
+            "WHERE tickets_fts MATCH ? ORDER BY bm25(tickets_fts, 10.0, 1.0), tickets.ticket_id LIMIT ? OFFSET ?",
+            [expression, limit + 1, offset],
+        )
+        tickets = [_row_to_ticket(row) for row in rows[:limit]]
+        next_cursor = encode_cursor([offset + limit]) if len(rows) > limit else None
+        return {"tickets": tickets, "next_cursor": next_cursor}
+
+    def _query(self, sql: str, params: List[Any]) -> List[Tuple[Any, ...]]:
+        """Runs a read query, returning no rows if the index has not been created yet."""
+        if self._connection is None and not os.path.exists(self.path):
+            return []
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def rebuild(index: TicketIndex, json_directory: str = "output/json", shard_directory: str = SHARD_DIRECTORY) -> int:
+    """Indexes the tickets already saved as JSON files and in shards.
+
+    Args:
+        index: The index to add the tickets to.
+        json_directory: The directory of the per-ticket JSON files, which may
+                        be compressed. Deduplicated comment bodies are read
+                        from the `bodies` directory next to it.
+        shard_directory: The directory of the JSON Lines shards.
+
+    Returns:
+        The number of tickets indexed.
+    """
+    count = 0
+    bodies = BodyStore(os.path.join(os.path.dirname(json_directory), BODY_DIRECTORY))
+    if os.path.isdir(json_directory):
+        for entry in os.scandir(json_directory):
+            if not entry.name.endswith((".json", ".json.gz", ".json.zst")):
+                continue
+            try:
+                ticket = Ticket.from_dict(bodies.restore(serializers.loads(read_file(entry.path))))
+                if ticket.ticket_id is None:
+                    continue
+                index.add(ticket)
+                count += 1
+            except (OSError, ValueError, AttributeError, ZendeskExtractorError) as e:
+                logging.warning(f"Could not index {entry.path}: {e}")
+    for ticket_id, location in load_index(shard_directory).items():
+        try:
+            index.add(Ticket.from_dict(read_record(location, shard_directory)))
+            count += 1
+        except (OSError, ValueError, ZendeskExtractorError) as e:
+            logging.warning(f"Could not index ticket {ticket_id} from shard {location.shard}: {e}")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ticket_index = TicketIndex(os.getenv("ZENDESK_INDEX_PATH") or INDEX_PATH)
+    try:
+        logging.info(f"Indexed {rebuild(ticket_index)} tickets.")
+    finally:
+        ticket_index.close()
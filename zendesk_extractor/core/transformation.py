@@ -1,8 +1,12 @@
+import re
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
-from typing import Dict, Any, List, Optional
-from zendesk_extractor.core.models import Ticket, Comment
-from dataclasses import asdict
+from typing import Callable, Dict, Any, List, Optional, Iterator
+from zendesk_extractor.core.models import Ticket, Comment, Person
+from dataclasses import fields
+
+# Characters that are not allowed anywhere in an XML 1.0 document.
+_INVALID_XML_CHARS = re.compile("[^\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
 
 def transform_to_structured_json(ticket_data: Dict[str, Any], comments_data: List[Dict[str, Any]]) -> Optional[Ticket]:
     """Transforms raw ticket and comment data into a structured JSON format.
@@ -44,11 +48,154 @@ def transform_to_structured_json(ticket_data: Dict[str, Any], comments_data: Lis
     )
 
 
-def convert_to_xml(ticket: Ticket) -> Optional[str]:
+def _escape_text(text: str) -> str:
+    """Escapes element text exactly like minidom's pretty printer does.
+
+    Line endings are normalized to `\n` as an XML parser would, and `&`, `<`,
+    `"` and `>` are replaced with entity references.
+
+    Raises:
+        ValueError: If the text contains characters that XML cannot represent.
+    """
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError(f"Text contains characters that are not allowed in XML: {text!r}")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _text_element(tag: str, text: Optional[str], indent: str) -> str:
+    """Renders a leaf element on its own line, self-closing it when empty."""
+    if not text:
+        return f"{indent}<{tag}/>\n"
+    return f"{indent}<{tag}>{_escape_text(text)}</{tag}>\n"
+
+
+def _person_element(tag: str, person: Person, indent: str) -> Iterator[str]:
+    """Renders a person as an element with one child element per field."""
+    yield f"{indent}<{tag}>\n"
+    for person_field in fields(person):
+        name = person_field.name
+        yield _text_element(name, str(getattr(person, name)), indent + "  ")
+    yield f"{indent}</{tag}>\n"
+
+
+def iter_xml(ticket: Ticket, body_refs: Optional[Dict[int, str]] = None) -> Iterator[str]:
+    """Yields the XML representation of a ticket in chunks.
+
+    The ticket is written in a single pass over its fields, without copying it
+    into dictionaries or building a DOM. The people attached by the people
+    enrichment are written as nested elements, and left out when they are not
+    attached.
+
+    Args:
+        ticket: The `Ticket` object to be converted.
+        body_refs: The `body_ref` of the comments whose bodies are stored
+                   separately, by their position in the conversation. These
+                   comments get a `<body_ref>` element instead of `<body>`.
+
+    Yields:
+        Consecutive pieces of the XML document.
+
+    Raises:
+        ValueError: If a value contains characters that XML cannot represent.
+        TypeError: If a tag is neither a string nor None.
+    """
+    yield '<?xml version="1.0" ?>\n<ticket>\n'
+    for ticket_field in fields(ticket):
+        key = ticket_field.name
+        value = getattr(ticket, key)
+        if key == "conversation":
+            if not value:
+                yield "  <conversation/>\n"
+                continue
+            yield "  <conversation>\n"
+            for position, comment in enumerate(value):
+                yield "    <comment>\n"
+                for comment_field in fields(comment):
+                    name = comment_field.name
+                    if name == "body" and body_refs and position in body_refs:
+                        yield _text_element("body_ref", body_refs[position], "      ")
+                    elif name == "author":
+                        if comment.author is not None:
+                            yield from _person_element(name, comment.author, "      ")
+                    else:
+                        yield _text_element(name, str(getattr(comment, name)), "      ")
+                yield "    </comment>\n"
+            yield "  </conversation>\n"
+        elif key == "tags" and isinstance(value, list):
+            if not value:
+                yield "  <tags/>\n"
+                continue
+            yield "  <tags>\n"
+            for tag in value:
+                if tag is not None and not isinstance(tag, str):
+                    raise TypeError(f"cannot serialize {tag!r} (type {type(tag).__name__})")
+                yield _text_element("tag", tag, "    ")
+            yield "  </tags>\n"
+        elif isinstance(value, Person):
+            yield from _person_element(key, value, "  ")
+        elif value is None and key in ("requester", "assignee"):
+            continue
+        else:
+            yield _text_element(key, str(value), "  ")
+    yield "</ticket>\n"
+
+
+def convert_to_xml(ticket: Ticket, body_refs: Optional[Dict[int, str]] = None) -> Optional[str]:
     """Converts a Ticket object to an XML string.
 
     This function takes a `Ticket` object and converts it into an XML string
-    representation.
+    representation. The output is identical to pretty-printing the ticket with
+    minidom, but is produced in a single pass by `iter_xml`.
+
+    Args:
+        ticket: The `Ticket` object to be converted.
+        body_refs: The `body_ref` of the comments whose bodies are stored
+                   separately, as for `iter_xml`.
+
+    Returns:
+        An XML string representation of the ticket, or `None` if the ticket
+        object is empty.
+
+    Raises:
+        ValueError: If a value contains characters that XML cannot represent.
+    """
+    if not ticket:
+        return None
+
+    return "".join(iter_xml(ticket, body_refs))
+
+
+_BODY_REF = re.compile(r"<body_ref>([0-9a-f]{64})</body_ref>")
+
+def replace_body_refs(xml: str, lookup: Callable[[str], str]) -> str:
+    """Replaces the `<body_ref>` elements of a ticket's XML with the bodies they refer to.
+
+    The result is the document `convert_to_xml` writes without `body_refs`.
+
+    Args:
+        xml: The XML document of a ticket.
+        lookup: Returns the body with a given `body_ref`.
+    """
+    return _BODY_REF.sub(lambda match: _text_element("body", lookup(match.group(1)), "").rstrip("\n"), xml)
+
+
+def _add_dom_element(parent: ET.Element, key: str, value: Any) -> None:
+    """Adds a value to an ElementTree element, nesting the fields of dictionaries."""
+    element = ET.SubElement(parent, key)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            ET.SubElement(element, k).text = str(v)
+    else:
+        element.text = str(value)
+
+
+def _convert_to_xml_dom(ticket: Ticket) -> Optional[str]:
+    """Converts a Ticket object to an XML string through ElementTree and minidom.
+
+    This is the original implementation of `convert_to_xml`. It is kept as the
+    reference the single-pass writer is tested and benchmarked against.
 
     Args:
         ticket: The `Ticket` object to be converted.
@@ -60,7 +207,7 @@ def convert_to_xml(ticket: Ticket) -> Optional[str]:
     if not ticket:
         return None
 
-    structured_data = asdict(ticket)
+    structured_data = ticket.to_dict()
     root = ET.Element("ticket")
 
     for key, value in structured_data.items():
@@ -69,16 +216,14 @@ def convert_to_xml(ticket: Ticket) -> Optional[str]:
             for comment_data in value:
                 comment_element = ET.SubElement(conversation_element, "comment")
                 for k, v in comment_data.items():
-                    sub_element = ET.SubElement(comment_element, k)
-                    sub_element.text = str(v)
+                    _add_dom_element(comment_element, k, v)
         elif key == "tags" and isinstance(value, list):
             tags_element = ET.SubElement(root, "tags")
             for tag in value:
                 tag_element = ET.SubElement(tags_element, "tag")
                 tag_element.text = tag
         else:
-            element = ET.SubElement(root, key)
-            element.text = str(value)
+            _add_dom_element(root, key, value)
 
     # Convert the ElementTree object to a string
     xml_string = ET.tostring(root, encoding="unicode")
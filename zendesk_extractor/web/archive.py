@@ -0,0 +1,87 @@
+"""Streaming many extracted tickets as a single download.
+
+Tickets are read one at a time and written to the response as they are read,
+as newline-delimited JSON, a tar archive or a zip archive. Memory use does
+not depend on the number of tickets, and the first bytes are sent before the
+last ticket is read.
+"""
+import io
+import time
+import tarfile
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List
+from zendesk_extractor.core import serializers
+
+ARCHIVE_FORMATS = {
+    "ndjson": ("application/x-ndjson", "tickets.ndjson"),
+    "tar": ("application/x-tar", "tickets.tar"),
+    "zip": ("application/zip", "tickets.zip"),
+}
+
+class _Chunks:
+    """A write-only file that collects what is written until it is taken.
+
+    It cannot seek or tell, so tarfile and zipfile write to it as a stream.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        """Returns and forgets everything written so far."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_archive(tickets: Iterable[Dict[str, Any]], archive_format: str) -> Iterator[bytes]:
+    """Yields the bytes of an archive of tickets as the tickets come.
+
+    Args:
+        tickets: The tickets, as dictionaries in the format of the JSON files.
+        archive_format: "ndjson" for one compact JSON ticket per line, or
+                        "tar" or "zip" for an archive with one `{id}.json`
+                        file per ticket.
+
+    Yields:
+        Consecutive pieces of the archive.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format {archive_format!r}. Use one of: {', '.join(ARCHIVE_FORMATS)}.")
+    if archive_format == "ndjson":
+        for ticket in tickets:
+            yield serializers.dumps(ticket, compact=True) + b"\n"
+        return
+
+    buffer = _Chunks()
+    now = time.time()
+    if archive_format == "tar":
+        with tarfile.open(fileobj=buffer, mode="w|") as archive:
+            for ticket in tickets:
+                data = serializers.dumps(ticket)
+                info = tarfile.TarInfo(f"{ticket.get('ticket_id')}.json")
+                info.size = len(data)
+                info.mtime = now
+                archive.addfile(info, io.BytesIO(data))
+                chunk = buffer.take()
+                if chunk:
+                    yield chunk
+    else:
+        date_time = time.gmtime(now)[:6]
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for ticket in tickets:
+                info = zipfile.ZipInfo(f"{ticket.get('ticket_id')}.json", date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, serializers.dumps(ticket))
+                yield buffer.take()
+    yield buffer.take()
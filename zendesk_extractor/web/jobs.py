@@ -0,0 +1,123 @@
+"""Background extraction jobs for the web application.
+
+`POST /extract` starts the extraction as an asyncio task and returns at once
+with a job ID. Only one extraction runs at a time: starting a job while
+another is running returns the running job instead of starting a second
+extraction that would write the same files and checkpoint.
+"""
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from zendesk_extractor.core.progress import Progress
+
+MAX_FINISHED_JOBS = 20
+
+class Job:
+    """One extraction run started from the web application.
+
+    Attributes:
+        job_id: The unique ID of the job.
+        status: "running", "succeeded" or "failed".
+        progress: The live counters of the run.
+        error: Why the job failed, if it did.
+    """
+
+    def __init__(self):
+        self.job_id = uuid.uuid4().hex
+        self.status = "running"
+        self.progress = Progress()
+        self.error = None
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at = None
+        self.task = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != "running"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the job's status and progress as a dictionary."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "progress": self.progress.snapshot(),
+        }
+
+    def _finish(self, error: Optional[str]) -> None:
+        self.error = error or self.progress.error
+        self.status = "failed" if self.error else "succeeded"
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+        self._changed.set()
+
+    async def wait(self, timeout: float) -> None:
+        """Waits until the job finishes or `timeout` seconds have passed."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self._changed.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobManager:
+    """Starts extraction jobs one at a time and keeps the recent ones."""
+
+    def __init__(self, run: Callable[..., Awaitable[Any]]):
+        """Initializes the manager.
+
+        Args:
+            run: The extraction coroutine function. It is called with a
+                 `progress` keyword argument.
+        """
+        self._run = run
+        self._jobs = OrderedDict()
+        self._current = None
+
+    @property
+    def current(self) -> Optional[Job]:
+        """The running job, if any."""
+        return self._current if self._current is not None and not self._current.finished else None
+
+    def start(self) -> Job:
+        """Starts a new job, or returns the running one.
+
+        Returns:
+            The job running the extraction. Callers can tell whether it was
+            just started from `current` before the call.
+        """
+        if self.current is not None:
+            return self.current
+        job = Job()
+        self._current = job
+        self._jobs[job.job_id] = job
+        self._forget_old_jobs()
+        job.task = asyncio.create_task(self._execute(job))
+        return job
+
+    async def _execute(self, job: Job) -> None:
+        error = None
+        try:
+            await self._run(progress=job.progress)
+        except Exception as e:
+            logging.exception(f"Extraction job {job.job_id} failed")
+            error = str(e) or type(e).__name__
+        finally:
+            job._finish(error)
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Returns a job by ID, or None if it is unknown or was forgotten."""
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """Returns the known jobs, newest first."""
+        return list(reversed(self._jobs.values()))
@@ -1,11 +1,40 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import json
+import logging
+import threading
 import uvicorn
-from zendesk_extractor.core.main import main as run_extraction
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional
+from zendesk_extractor.core.async_main import main_async as run_extraction
+from zendesk_extractor.core import metrics, serializers
+from zendesk_extractor.core.accounts import Account, get_accounts, get_default_account
+from zendesk_extractor.core.bodies import BodyStore, BODY_DIRECTORY
+from zendesk_extractor.core.compression import compression_of, decompress, find_file, read_file
+from zendesk_extractor.core.main import get_env_int
+from zendesk_extractor.core.exceptions import ZendeskExtractorError
+from zendesk_extractor.core.output import OUTPUT_DIRECTORY
+from zendesk_extractor.core.shards import SHARD_DIRECTORY, load_index, read_record
+from zendesk_extractor.core.ticket_index import TicketIndex, INDEX_PATH, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from zendesk_extractor.web.archive import ARCHIVE_FORMATS, iter_archive
+from zendesk_extractor.web.jobs import JobManager
+from zendesk_extractor.web.xml_cache import XmlCache, RenderedXml, DEFAULT_MAX_ENTRIES
+
+PROGRESS_INTERVAL = 1.0
+MEDIA_TYPES = {"json": "application/json", "xml": "application/xml"}
+CONTENT_ENCODINGS = {"gzip": "gzip", "zstd": "zstd"}
 
 app = FastAPI()
+ticket_index = TicketIndex(os.getenv("ZENDESK_INDEX_PATH") or INDEX_PATH)
+xml_cache = XmlCache(os.path.join(OUTPUT_DIRECTORY, BODY_DIRECTORY), get_env_int("ZENDESK_XML_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+# Looked up on every call so that tests can patch run_extraction.
+jobs = JobManager(lambda **kwargs: run_extraction(**kwargs))
+# The indexes and XML caches of the named accounts, opened on first use.
+account_indexes: Dict[str, TicketIndex] = {}
+account_xml_caches: Dict[str, XmlCache] = {}
+_accounts_lock = threading.Lock()
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="zendesk_extractor/web/static"), name="static")
@@ -14,27 +43,280 @@ app.mount("/static", StaticFiles(directory="zendesk_extractor/web/static"), name
 async def read_root():
     return FileResponse('zendesk_extractor/web/static/index.html')
 
-@app.post("/extract")
+@app.post("/extract", status_code=202)
 async def extract():
+    running = jobs.current
+    job = jobs.start()
+    message = "An extraction is already running." if running is not None else "Extraction process started."
+    return {"message": message, "job_id": job.job_id, "status": job.status}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """Returns the extraction metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"jobs": [job.to_dict() for job in jobs.list()]}
+
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return get_job(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Streams the job's progress as server-sent events until it finishes."""
+    job = get_job(job_id)
+
+    async def events():
+        while True:
+            finished = job.finished
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if finished:
+                yield "event: end\ndata: {}\n\n"
+                return
+            await job.wait(PROGRESS_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def get_account(name: Optional[str]) -> Account:
+    """Returns the account a request is for.
+
+    Without an `account` parameter, requests are for the default account,
+    whose files are in the working directory. Otherwise the name must be one
+    of ZENDESK_ACCOUNTS.
+    """
+    if name is None:
+        return get_default_account()
     try:
-        run_extraction()
-        return {"message": "Extraction process started."}
-    except Exception as e:
+        accounts = get_accounts()
+    except ZendeskExtractorError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    for account in accounts:
+        if account.name == name.strip().lower():
+            return account
+    raise HTTPException(status_code=404, detail=f"Unknown account {name!r}.")
+
+def output_directory(account: Account) -> str:
+    """Returns the directory an account's ticket files are saved in."""
+    return account.path(OUTPUT_DIRECTORY)
+
+def index_of(account: Account) -> TicketIndex:
+    """Returns the ticket index of an account."""
+    if account.name is None:
+        return ticket_index
+    with _accounts_lock:
+        if account.name not in account_indexes:
+            account_indexes[account.name] = TicketIndex(account.path(INDEX_PATH))
+        return account_indexes[account.name]
+
+def xml_cache_of(account: Account) -> XmlCache:
+    """Returns the cache of the XML rendered for an account's tickets."""
+    if account.name is None:
+        return xml_cache
+    with _accounts_lock:
+        if account.name not in account_xml_caches:
+            account_xml_caches[account.name] = XmlCache(os.path.join(output_directory(account), BODY_DIRECTORY), get_env_int("ZENDESK_XML_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+        return account_xml_caches[account.name]
+
+def list_directory(kind: str, directory: str = OUTPUT_DIRECTORY) -> List[str]:
+    try:
+        return os.listdir(os.path.join(directory, kind))
+    except FileNotFoundError:
+        return []
 
 @app.get("/files")
-async def list_files():
-    json_files = os.listdir("output/json")
-    xml_files = os.listdir("output/xml")
+async def list_files(account: Optional[str] = None):
+    directory = output_directory(get_account(account))
+    json_files = list_directory("json", directory)
+    xml_files = list_directory("xml", directory)
+    # Tickets without an XML file have theirs rendered on request.
+    saved_xml = {name.split(".")[0] for name in xml_files}
+    xml_files += [f"{ticket_id}.xml" for ticket_id in sorted({name.split(".")[0] for name in json_files} - saved_xml)]
     return {"json_files": json_files, "xml_files": xml_files}
 
+# The index endpoints are plain functions so FastAPI runs their SQLite queries
+# in its thread pool instead of on the event loop.
+@app.get("/tickets")
+def list_tickets(
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    assignee_id: Optional[int] = None,
+    requester_id: Optional[int] = None,
+    sort: str = "-updated_at",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    updated_before: Optional[str] = None,
+    account: Optional[str] = None,
+):
+    try:
+        return index_of(get_account(account)).list_tickets(status=status, tag=tag, assignee_id=assignee_id, requester_id=requester_id, sort=sort, limit=limit, cursor=cursor,
+                                         updated_since=updated_since, updated_before=updated_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def parse_ticket_ids(ids: Optional[str]) -> Optional[List[int]]:
+    """Parses a comma-separated list of ticket IDs."""
+    if ids is None:
+        return None
+    try:
+        return [int(ticket_id) for ticket_id in ids.split(",") if ticket_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid ticket IDs {ids!r}. Use comma-separated numbers.")
+
+def iter_exported_tickets(account: Account, **filters: Any) -> Iterator[Dict[str, Any]]:
+    """Yields the saved tickets of an account matching the index filters, in the order of their IDs.
+
+    The index is read one page at a time, and each ticket is read from its
+    JSON file, or from the shards if it has none, just before it is yielded.
+    """
+    directory = output_directory(account)
+    shard_directory = account.path(SHARD_DIRECTORY)
+    index = index_of(account)
+    bodies = BodyStore(os.path.join(directory, BODY_DIRECTORY))
+    shard_locations = None
+    cursor = None
+    while True:
+        page = index.list_tickets(sort="ticket_id", limit=MAX_PAGE_SIZE, cursor=cursor, **filters)
+        for row in page["tickets"]:
+            ticket_id = row["ticket_id"]
+            try:
+                path = find_file(os.path.join(directory, "json", f"{ticket_id}.json"))
+                if path is not None:
+                    yield bodies.restore(serializers.loads(read_file(path)))
+                    continue
+                if shard_locations is None:
+                    shard_locations = load_index(shard_directory)
+                if ticket_id in shard_locations:
+                    yield read_record(shard_locations[ticket_id], shard_directory)
+                    continue
+                logging.warning(f"Ticket {ticket_id} is indexed but has not been saved. Leaving it out of the export.")
+            except (OSError, ValueError, ZendeskExtractorError) as e:
+                logging.warning(f"Could not read ticket {ticket_id}: {e}. Leaving it out of the export.")
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+@app.get("/tickets/export")
+def export_tickets(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    updated_before: Optional[str] = None,
+    ids: Optional[str] = None,
+    account: Optional[str] = None,
+):
+    """Streams the saved tickets matching the filters as one NDJSON, tar or zip download."""
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format!r}. Use one of: {', '.join(ARCHIVE_FORMATS)}.")
+    tickets = iter_exported_tickets(get_account(account), status=status, tag=tag, updated_since=updated_since, updated_before=updated_before, ticket_ids=parse_ticket_ids(ids))
+    media_type, filename = ARCHIVE_FORMATS[format]
+    # A plain generator, so Starlette reads the tickets in its thread pool
+    # instead of on the event loop.
+    return StreamingResponse(iter_archive(tickets, format), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/tickets/search")
+def search_tickets(q: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, account: Optional[str] = None):
+    try:
+        return index_of(get_account(account)).search(q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Returns whether an Accept-Encoding header allows a content coding."""
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def is_not_modified(rendered: RenderedXml, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Returns whether a conditional request can be answered with 304 Not Modified.
+
+    As in RFC 9110, If-Modified-Since is only looked at when the request has
+    no If-None-Match header.
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == rendered.etag for tag in tags)
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(rendered.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def serve_lazy_xml(filename: str, if_none_match: Optional[str], if_modified_since: Optional[str], account: Optional[Account] = None) -> Response:
+    """Serves the XML of a ticket that has none saved, rendered from its JSON file.
+
+    The response carries an ETag and a Last-Modified date taken from the JSON
+    file, and conditional requests for an unchanged ticket get a 304.
+    """
+    account = account or get_default_account()
+    ticket_id = os.path.basename(filename).removesuffix(".xml")
+    try:
+        rendered = xml_cache_of(account).get(os.path.join(output_directory(account), "json", f"{ticket_id}.json"))
+    except (OSError, ValueError, ZendeskExtractorError) as e:
+        raise HTTPException(status_code=500, detail=f"Could not render the XML of ticket {ticket_id}: {e}")
+    if rendered is None:
+        raise HTTPException(status_code=404, detail=f"File {filename} not found.")
+    headers = {"ETag": rendered.etag, "Last-Modified": rendered.last_modified, "Cache-Control": "no-cache"}
+    if is_not_modified(rendered, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    return Response(rendered.content, media_type=MEDIA_TYPES["xml"], headers=headers)
+
+def serve_ticket_file(kind: str, filename: str, accept_encoding: Optional[str], directory: str = OUTPUT_DIRECTORY) -> Response:
+    """Serves a ticket's JSON or XML file, however it was compressed and deduplicated.
+
+    A request for `1.json` is answered from `1.json.gz` or `1.json.zst` if the
+    file was compressed. A compressed file is sent as is, with a
+    Content-Encoding header, to clients that accept the codec, and
+    decompressed for the others. Deduplicated comment bodies are put back, so
+    clients always get the complete ticket.
+    """
+    path = find_file(os.path.join(directory, kind, os.path.basename(filename)))
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"File {filename} not found.")
+    media_type = MEDIA_TYPES[kind]
+    bodies_directory = os.path.join(directory, BODY_DIRECTORY)
+    compression = compression_of(path)
+    if compression is None and not os.path.isdir(bodies_directory):
+        return FileResponse(path, media_type=media_type)
+
+    with open(path, "rb") as f:
+        data = f.read()
+    content = decompress(data, path)
+    if (b'"body_ref"' if kind == "json" else b"<body_ref>") in content:
+        bodies = BodyStore(bodies_directory)
+        if kind == "json":
+            content = serializers.dumps(bodies.restore(serializers.loads(content)))
+        else:
+            content = bodies.restore_xml(content.decode("utf-8")).encode("utf-8")
+    elif compression is not None and accepts_encoding(accept_encoding, CONTENT_ENCODINGS[compression]):
+        return Response(data, media_type=media_type, headers={"Content-Encoding": CONTENT_ENCODINGS[compression], "Vary": "Accept-Encoding"})
+    return Response(content, media_type=media_type, headers={"Vary": "Accept-Encoding"})
+
+# Plain functions, so the files are read in FastAPI's thread pool.
 @app.get("/files/json/{filename}")
-async def get_json_file(filename: str):
-    return FileResponse(f"output/json/{filename}")
+def get_json_file(filename: str, accept_encoding: Optional[str] = Header(None), account: Optional[str] = None):
+    return serve_ticket_file("json", filename, accept_encoding, output_directory(get_account(account)))
 
 @app.get("/files/xml/{filename}")
-async def get_xml_file(filename: str):
-    return FileResponse(f"output/xml/{filename}")
+def get_xml_file(filename: str, accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None),
+                 account: Optional[str] = None):
+    selected = get_account(account)
+    directory = output_directory(selected)
+    if filename.endswith(".xml") and find_file(os.path.join(directory, "xml", os.path.basename(filename))) is not None:
+        return serve_ticket_file("xml", filename, accept_encoding, directory)
+    return serve_lazy_xml(filename, if_none_match, if_modified_since, selected)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
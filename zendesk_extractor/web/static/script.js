@@ -1,40 +1,97 @@
 document.addEventListener("DOMContentLoaded", () => {
     const extractBtn = document.getElementById("extract-btn");
-    const jsonFilesList = document.getElementById("json-files");
-    const xmlFilesList = document.getElementById("xml-files");
-    const fileContent = document.getElementById("file-content");
-
-    const fetchFiles = async () => {
-        const response = await fetch("/files");
-        const files = await response.json();
-        jsonFilesList.innerHTML = "";
-        xmlFilesList.innerHTML = "";
-        files.json_files.forEach(file => {
-            const li = document.createElement("li");
-            const a = document.createElement("a");
-            a.href = `/files/json/${file}`;
-            a.textContent = file;
-            a.target = "_blank";
-            li.appendChild(a);
-            jsonFilesList.appendChild(li);
+    const searchForm = document.getElementById("search-form");
+    const searchInput = document.getElementById("search-input");
+    const statusFilter = document.getElementById("status-filter");
+    const ticketRows = document.querySelector("#tickets tbody");
+    const moreBtn = document.getElementById("more-btn");
+    const jobStatus = document.getElementById("job-status");
+
+    let nextCursor = null;
+
+    const fileLink = (ticketId, extension) => {
+        const a = document.createElement("a");
+        a.href = `/files/${extension}/${ticketId}.${extension}`;
+        a.textContent = extension.toUpperCase();
+        a.target = "_blank";
+        return a;
+    };
+
+    const addRow = (ticket) => {
+        const tr = document.createElement("tr");
+        [ticket.ticket_id, ticket.subject || "", ticket.status || "", ticket.updated_at || ""].forEach(value => {
+            const td = document.createElement("td");
+            td.textContent = value;
+            tr.appendChild(td);
         });
-        files.xml_files.forEach(file => {
-            const li = document.createElement("li");
-            const a = document.createElement("a");
-            a.href = `/files/xml/${file}`;
-            a.textContent = file;
-            a.target = "_blank";
-            li.appendChild(a);
-            xmlFilesList.appendChild(li);
+        const files = document.createElement("td");
+        files.appendChild(fileLink(ticket.ticket_id, "json"));
+        files.append(" ");
+        files.appendChild(fileLink(ticket.ticket_id, "xml"));
+        tr.appendChild(files);
+        ticketRows.appendChild(tr);
+    };
+
+    const fetchTickets = async (reset) => {
+        const params = new URLSearchParams();
+        const query = searchInput.value.trim();
+        if (query) {
+            params.set("q", query);
+        } else if (statusFilter.value) {
+            params.set("status", statusFilter.value);
+        }
+        if (!reset && nextCursor) {
+            params.set("cursor", nextCursor);
+        }
+        const response = await fetch(`${query ? "/tickets/search" : "/tickets"}?${params}`);
+        const page = await response.json();
+        if (reset) {
+            ticketRows.innerHTML = "";
+        }
+        page.tickets.forEach(addRow);
+        nextCursor = page.next_cursor;
+        moreBtn.hidden = !nextCursor;
+    };
+
+    searchForm.addEventListener("submit", (event) => {
+        event.preventDefault();
+        fetchTickets(true);
+    });
+
+    moreBtn.addEventListener("click", () => fetchTickets(false));
+
+    const showJob = (job) => {
+        const progress = job.progress;
+        if (job.status === "running") {
+            jobStatus.textContent = `Running: ${progress.processed} processed, ${progress.failed} failed, ${progress.current_tickets_per_second} tickets/s`;
+        } else if (job.status === "succeeded") {
+            jobStatus.textContent = `Finished: ${progress.processed} processed, ${progress.failed} failed in ${Math.round(progress.elapsed_seconds)} s`;
+        } else {
+            jobStatus.textContent = `Failed: ${job.error}`;
+        }
+    };
+
+    const followJob = (jobId) => {
+        extractBtn.disabled = true;
+        const events = new EventSource(`/jobs/${jobId}/events`);
+        events.onmessage = (event) => showJob(JSON.parse(event.data));
+        events.addEventListener("end", () => {
+            events.close();
+            extractBtn.disabled = false;
+            fetchTickets(true);
         });
+        events.onerror = () => {
+            events.close();
+            extractBtn.disabled = false;
+        };
     };
 
     extractBtn.addEventListener("click", async () => {
         const response = await fetch("/extract", { method: "POST" });
         const data = await response.json();
-        alert(data.message);
-        fetchFiles();
+        jobStatus.textContent = data.message;
+        followJob(data.job_id);
     });
 
-    fetchFiles();
+    fetchTickets(true);
 });
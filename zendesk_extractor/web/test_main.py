@@ -1,8 +1,20 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from zendesk_extractor.web.main import app
+from zendesk_extractor.core.ticket_index import TicketIndex
+from zendesk_extractor.core.models import Ticket, Comment
+from zendesk_extractor.core.bodies import BodyStore, apply_body_refs
+from zendesk_extractor.core.transformation import convert_to_xml
+from zendesk_extractor.core import serializers
+from zendesk_extractor.web.xml_cache import XmlCache
 import os
+import io
+import gzip
+import json
+import asyncio
+import tarfile
+import zipfile
 
 client = TestClient(app)
 
@@ -23,12 +35,56 @@ def test_read_root():
     assert response.status_code == 200
     assert "text/html" in response.headers['content-type']
 
-@patch('zendesk_extractor.web.main.run_extraction')
+@patch('zendesk_extractor.web.main.run_extraction', new_callable=AsyncMock)
 def test_extract(mock_run_extraction):
-    response = client.post("/extract")
+    with TestClient(app) as client:
+        response = client.post("/extract")
+        assert response.status_code == 202
+        body = response.json()
+        assert body["message"] == "Extraction process started."
+        job_id = body["job_id"]
+
+        events = client.get(f"/jobs/{job_id}/events")
+        assert events.headers["content-type"].startswith("text/event-stream")
+        assert events.text.endswith("event: end\ndata: {}\n\n")
+
+        status = client.get(f"/jobs/{job_id}").json()
+        assert status["status"] == "succeeded"
+        assert "processed" in status["progress"]
+        assert job_id in [job["job_id"] for job in client.get("/jobs").json()["jobs"]]
+    mock_run_extraction.assert_awaited_once()
+    assert "progress" in mock_run_extraction.await_args.kwargs
+
+def test_extract_runs_one_job_at_a_time():
+    started = []
+
+    async def run_extraction(progress):
+        started.append(progress)
+        await asyncio.sleep(0.2)
+        progress.finish(error="Export failed")
+
+    with patch('zendesk_extractor.web.main.run_extraction', new=run_extraction), TestClient(app) as client:
+        first = client.post("/extract").json()
+        second = client.post("/extract").json()
+        assert second["job_id"] == first["job_id"]
+        assert second["message"] == "An extraction is already running."
+
+        client.get(f"/jobs/{first['job_id']}/events")
+        status = client.get(f"/jobs/{first['job_id']}").json()
+    assert len(started) == 1
+    assert status["status"] == "failed"
+    assert status["error"] == "Export failed"
+
+def test_metrics():
+    response = client.get("/metrics")
     assert response.status_code == 200
-    assert response.json() == {"message": "Extraction process started."}
-    mock_run_extraction.assert_called_once()
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE zendesk_stage_seconds histogram" in response.text
+    assert "# TYPE zendesk_http_retries_total counter" in response.text
+
+def test_unknown_job():
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/events").status_code == 404
 
 def test_list_files():
     response = client.get("/files")
@@ -45,3 +101,193 @@ def test_get_xml_file():
     response = client.get("/files/xml/test.xml")
     assert response.status_code == 200
     assert response.headers['content-type'] == 'application/xml'
+
+def test_get_compressed_and_deduplicated_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ticket = Ticket(ticket_id=7, created_at="c", updated_at="u", subject="Toner", status="open", requester_id=1, assignee_id=2, tags=[],
+                    conversation=[Comment(comment_id=1, author_id=1, body="> quoted " * 100, created_at="c")])
+    bodies = BodyStore("output/bodies", compression="gzip", min_bytes=100)
+    refs = bodies.dedup(ticket)
+    os.makedirs("output/json")
+    os.makedirs("output/xml")
+    with open("output/json/7.json.gz", "wb") as f:
+        f.write(gzip.compress(serializers.dumps(apply_body_refs(ticket.to_dict(), refs))))
+    with open("output/xml/7.xml.gz", "wb") as f:
+        f.write(gzip.compress(convert_to_xml(ticket, refs).encode("utf-8")))
+    with open("output/json/8.json.gz", "wb") as f:
+        f.write(gzip.compress(b'{"ticket_id": 8}'))
+
+    response = client.get("/files/json/7.json")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == ticket.to_dict()
+    assert client.get("/files/xml/7.xml").text == convert_to_xml(ticket)
+
+    # Files without deduplicated bodies are sent compressed to clients that accept it.
+    response = client.get("/files/json/8.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == {"ticket_id": 8}
+    response = client.get("/files/json/8.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ticket_id": 8}
+
+    assert client.get("/files/json/9.json").status_code == 404
+
+def test_get_lazy_xml_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("zendesk_extractor.web.main.xml_cache", XmlCache("output/bodies", max_entries=1))
+    ticket = Ticket(ticket_id=7, created_at="c", updated_at="u", subject="Toner & ink", status="open", requester_id=1, assignee_id=2, tags=["a"],
+                    conversation=[Comment(comment_id=1, author_id=1, body="Hello", created_at="c")])
+    os.makedirs("output/json")
+    with open("output/json/7.json", "wb") as f:
+        f.write(serializers.dumps(ticket.to_dict()))
+
+    response = client.get("/files/xml/7.xml")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/xml"
+    assert response.text == convert_to_xml(ticket)
+    assert client.get("/files/xml/7").text == convert_to_xml(ticket)
+    assert "7.xml" in client.get("/files").json()["xml_files"]
+
+    etag = response.headers["etag"]
+    assert client.get("/files/xml/7.xml", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/files/xml/7.xml", headers={"If-None-Match": f'W/{etag}'}).status_code == 304
+    assert client.get("/files/xml/7.xml", headers={"If-Modified-Since": response.headers["last-modified"]}).status_code == 304
+    assert client.get("/files/xml/7.xml", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Extracting the ticket again invalidates the cached document.
+    ticket.subject = "Paper"
+    with open("output/json/7.json", "wb") as f:
+        f.write(serializers.dumps(ticket.to_dict(), compact=True))
+    os.utime("output/json/7.json", ns=(0, 10**18))
+    response = client.get("/files/xml/7.xml", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "<subject>Paper</subject>" in response.text
+
+    assert client.get("/files/xml/8.xml").status_code == 404
+
+def test_xml_cache_evicts_least_recently_used(tmp_path):
+    os.makedirs(tmp_path / "json")
+    for ticket_id in (1, 2, 3):
+        ticket = Ticket(ticket_id=ticket_id, created_at="c", updated_at="u", subject="s", status="open", requester_id=1, assignee_id=2, tags=[])
+        with open(tmp_path / "json" / f"{ticket_id}.json", "wb") as f:
+            f.write(serializers.dumps(ticket.to_dict()))
+    cache = XmlCache(str(tmp_path / "bodies"), max_entries=2)
+    paths = [str(tmp_path / "json" / f"{ticket_id}.json") for ticket_id in (1, 2, 3)]
+    first = cache.get(paths[0])
+    cache.get(paths[1])
+    assert cache.get(paths[0]) is first
+    cache.get(paths[2])
+    assert len(cache) == 2
+    assert cache.get(paths[0]) is first
+    assert cache.get(paths[1]) is not None
+    assert cache.get(str(tmp_path / "json" / "4.json")) is None
+
+@pytest.fixture
+def indexed_tickets(tmp_path):
+    index = TicketIndex(str(tmp_path / "index.db"))
+    for ticket_id in range(1, 6):
+        index.add(Ticket(
+            ticket_id=ticket_id, created_at="2023-10-27T10:30:00Z", updated_at=f"2023-10-2{ticket_id}T10:35:00Z",
+            subject=f"Printer issue {ticket_id}" if ticket_id % 2 else f"Login problem {ticket_id}",
+            status="open" if ticket_id < 4 else "solved", requester_id=10, assignee_id=20 + ticket_id % 2, tags=["vip"] if ticket_id == 2 else [],
+            conversation=[Comment(comment_id=ticket_id, author_id=10, body="The toner is empty" if ticket_id == 5 else "Please help", created_at="2023-10-27T10:35:00Z")],
+        ))
+    with patch('zendesk_extractor.web.main.ticket_index', index):
+        yield
+    index.close()
+
+def test_list_tickets_paginates_newest_first(indexed_tickets):
+    first = client.get("/tickets", params={"limit": 2}).json()
+    assert [ticket["ticket_id"] for ticket in first["tickets"]] == [5, 4]
+    second = client.get("/tickets", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [ticket["ticket_id"] for ticket in second["tickets"]] == [3, 2]
+    third = client.get("/tickets", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+    assert [ticket["ticket_id"] for ticket in third["tickets"]] == [1]
+    assert third["next_cursor"] is None
+
+def test_list_tickets_filters_and_sorts(indexed_tickets):
+    response = client.get("/tickets", params={"status": "open", "sort": "ticket_id"}).json()
+    assert [ticket["ticket_id"] for ticket in response["tickets"]] == [1, 2, 3]
+    response = client.get("/tickets", params={"tag": "vip"}).json()
+    assert [ticket["ticket_id"] for ticket in response["tickets"]] == [2]
+    assert response["tickets"][0]["tags"] == ["vip"]
+    response = client.get("/tickets", params={"assignee_id": 21, "sort": "ticket_id"}).json()
+    assert [ticket["ticket_id"] for ticket in response["tickets"]] == [1, 3, 5]
+
+def test_list_tickets_rejects_bad_parameters(indexed_tickets):
+    assert client.get("/tickets", params={"sort": "subject"}).status_code == 400
+    assert client.get("/tickets", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/tickets", params={"limit": 0}).status_code == 422
+
+def test_search_tickets(indexed_tickets):
+    response = client.get("/tickets/search", params={"q": "printer"}).json()
+    assert sorted(ticket["ticket_id"] for ticket in response["tickets"]) == [1, 3, 5]
+    response = client.get("/tickets/search", params={"q": "toner"}).json()
+    assert [ticket["ticket_id"] for ticket in response["tickets"]] == [5]
+    response = client.get("/tickets/search", params={"q": "printer", "limit": 2}).json()
+    rest = client.get("/tickets/search", params={"q": "printer", "limit": 2, "cursor": response["next_cursor"]}).json()
+    assert len(response["tickets"]) == 2 and len(rest["tickets"]) == 1 and rest["next_cursor"] is None
+    assert client.get("/tickets/search", params={"q": 'AND "("'}).status_code == 200
+
+def test_list_tickets_filters_by_update_time(indexed_tickets):
+    response = client.get("/tickets", params={"updated_since": "2023-10-22", "updated_before": "2023-10-24T10:35:00Z", "sort": "ticket_id"}).json()
+    assert [ticket["ticket_id"] for ticket in response["tickets"]] == [2, 3]
+
+def test_export_tickets(indexed_tickets, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("output/json")
+    for ticket_id in (1, 2, 3, 5):
+        with open(f"output/json/{ticket_id}.json", "wb") as f:
+            f.write(serializers.dumps({"ticket_id": ticket_id, "subject": f"Ticket {ticket_id}", "conversation": []}))
+    with gzip.open("output/json/4.json.gz", "wb") as f:
+        f.write(serializers.dumps({"ticket_id": 4, "subject": "Ticket 4", "conversation": []}))
+
+    response = client.get("/tickets/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["ticket_id"] for line in response.text.splitlines()] == [1, 2, 3, 4, 5]
+
+    response = client.get("/tickets/export", params={"format": "tar", "status": "open"})
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        assert archive.getnames() == ["1.json", "2.json", "3.json"]
+        assert json.load(archive.extractfile("2.json"))["subject"] == "Ticket 2"
+
+    response = client.get("/tickets/export", params={"format": "zip", "ids": "4,5,6", "updated_since": "2023-10-25"})
+    assert response.headers["content-disposition"] == 'attachment; filename="tickets.zip"'
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == ["5.json"]
+
+    # Tickets that are indexed but whose files are gone are left out.
+    os.remove("output/json/1.json")
+    response = client.get("/tickets/export", params={"ids": "1,2"})
+    assert [json.loads(line)["ticket_id"] for line in response.text.splitlines()] == [2]
+
+    assert client.get("/tickets/export", params={"format": "rar"}).status_code == 400
+    assert client.get("/tickets/export", params={"ids": "1,x"}).status_code == 400
+
+def test_account_parameter_reads_the_accounts_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ZENDESK_ACCOUNTS", "acme,globex")
+    monkeypatch.setattr("zendesk_extractor.web.main.account_indexes", {})
+    monkeypatch.setattr("zendesk_extractor.web.main.account_xml_caches", {})
+    directory = tmp_path / "accounts" / "acme" / "output"
+    os.makedirs(directory / "json")
+    ticket = Ticket(ticket_id=7, created_at="2023-10-27T10:30:00Z", updated_at="2023-10-27T10:35:00Z", subject="Acme printer", status="open",
+                    requester_id=1, assignee_id=None, tags=[], conversation=[])
+    with open(directory / "json" / "7.json", "wb") as f:
+        f.write(serializers.dumps(ticket.to_dict()))
+    index = TicketIndex(str(directory / "index.db"))
+    index.add(ticket)
+    index.close()
+
+    assert client.get("/files", params={"account": "acme"}).json() == {"json_files": ["7.json"], "xml_files": ["7.xml"]}
+    assert client.get("/files", params={"account": "globex"}).json() == {"json_files": [], "xml_files": []}
+    assert client.get("/files/json/7.json", params={"account": "acme"}).json()["subject"] == "Acme printer"
+    assert client.get("/files/json/7.json").status_code == 404
+    assert b"Acme printer" in client.get("/files/xml/7.xml", params={"account": "acme"}).content
+    assert [row["ticket_id"] for row in client.get("/tickets", params={"account": "acme"}).json()["tickets"]] == [7]
+    assert [row["ticket_id"] for row in client.get("/tickets/search", params={"q": "printer", "account": "acme"}).json()["tickets"]] == [7]
+    assert [json.loads(line)["ticket_id"] for line in client.get("/tickets/export", params={"account": "acme"}).text.splitlines()] == [7]
+    assert client.get("/tickets", params={"account": "initech"}).status_code == 404
@@ -0,0 +1,114 @@
+"""XML documents rendered on request from the tickets' JSON files.
+
+With ZENDESK_LAZY_XML enabled, extraction runs only write the JSON files, and
+`/files/xml/{id}.xml` renders a ticket's XML from its JSON file the first time
+it is requested. The rendered documents are kept in a bounded LRU cache. Each
+entry remembers the modification time and size of the JSON file it was
+rendered from, so a ticket extracted again is rendered again on its next
+request. The same validator is sent as the ETag and Last-Modified of the
+response, so browsers and proxies can revalidate with a conditional request.
+"""
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import NamedTuple, Optional, Tuple
+from zendesk_extractor.core import metrics, serializers
+from zendesk_extractor.core.bodies import BodyStore
+from zendesk_extractor.core.compression import find_file, read_file
+from zendesk_extractor.core.models import Ticket
+from zendesk_extractor.core.transformation import convert_to_xml
+
+DEFAULT_MAX_ENTRIES = 256
+
+class RenderedXml(NamedTuple):
+    """A ticket's XML document and the validators of the JSON file it was rendered from.
+
+    Attributes:
+        content: The XML document, encoded as UTF-8.
+        etag: The entity tag of the document, quoted.
+        last_modified: The modification time of the JSON file, as an HTTP date.
+    """
+    content: bytes
+    etag: str
+    last_modified: str
+
+
+class XmlCache:
+    """The most recently requested XML documents.
+
+    The cache is safe to share between threads. Documents are rendered outside
+    of its lock, so a slow ticket does not hold up requests for other tickets.
+    """
+
+    def __init__(self, bodies_directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Initializes the cache.
+
+        Args:
+            bodies_directory: The directory of the deduplicated comment bodies
+                              the JSON files may refer to.
+            max_entries: The number of documents kept. 0 disables caching.
+        """
+        self.bodies = BodyStore(bodies_directory)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[str, int, int], RenderedXml]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, json_path: str) -> Optional[RenderedXml]:
+        """Returns the XML document of a ticket, rendering it if needed.
+
+        Args:
+            json_path: The ticket's JSON file without a compression suffix,
+                       such as `output/json/1.json`.
+
+        Returns:
+            The rendered document, or None if the ticket has no JSON file.
+
+        Raises:
+            OSError: If the JSON file or a comment body cannot be read.
+            ValueError: If the JSON file is damaged, or holds characters that
+                        XML cannot represent.
+            ZendeskExtractorError: If the JSON file is compressed with zstd
+                                   and the zstandard package is not installed.
+        """
+        path = find_file(json_path)
+        if path is None:
+            self.invalidate(json_path)
+            return None
+        stat = os.stat(path)
+        validator = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(json_path)
+            if entry is not None and entry[0] == validator:
+                self._entries.move_to_end(json_path)
+                metrics.XML_CACHE_REQUESTS.inc(result="hit")
+                return entry[1]
+
+        metrics.XML_CACHE_REQUESTS.inc(result="miss")
+        ticket = Ticket.from_dict(self.bodies.restore(serializers.loads(read_file(path))))
+        rendered = RenderedXml(
+            convert_to_xml(ticket).encode("utf-8"),
+            f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            formatdate(stat.st_mtime, usegmt=True),
+        )
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[json_path] = (validator, rendered)
+                self._entries.move_to_end(json_path)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return rendered
+
+    def invalidate(self, json_path: str) -> None:
+        """Drops the cached document of a ticket."""
+        with self._lock:
+            self._entries.pop(json_path, None)
+
+    def clear(self) -> None:
+        """Drops every cached document."""
+        with self._lock:
+            self._entries.clear()